@@ -37,6 +37,7 @@ def init_admin_schema():
     except Exception as e:
         print(f"✗ 管理系统数据库初始化失败: {e}")
     finally:
+        conn.autocommit = False
         release_conn(conn)
 
 
@@ -8,7 +8,14 @@ from admin.routes import (
     question_routes,
     user_routes,
     audit_routes,
-    stats_routes
+    stats_routes,
+    rule_routes,
+    media_routes,
+    bulk_routes,
+    job_routes,
+    maintenance_routes,
+    export_routes,
+    kb_snapshot_routes
 )
 
 
@@ -23,6 +30,13 @@ admin_router.include_router(question_routes.router)
 admin_router.include_router(user_routes.router)
 admin_router.include_router(audit_routes.router)
 admin_router.include_router(stats_routes.router)
+admin_router.include_router(rule_routes.router)
+admin_router.include_router(media_routes.router)
+admin_router.include_router(bulk_routes.router)
+admin_router.include_router(job_routes.router)
+admin_router.include_router(maintenance_routes.router)
+admin_router.include_router(export_routes.router)
+admin_router.include_router(kb_snapshot_routes.router)
 
 
 # 健康检查（无需认证）
@@ -1,9 +1,13 @@
 """审计日志路由"""
+from datetime import datetime
 from typing import Optional
 from fastapi import APIRouter, Query, Depends
 
 from admin.auth_simple import require_admin
-from admin.services.audit_service import list_audit_logs, get_user_activity, get_action_stats
+from admin.services.audit_service import (
+    list_audit_logs, get_user_activity, get_action_stats,
+    list_audit_partitions, maintain_audit_partitions
+)
 
 
 router = APIRouter(prefix="/audit", tags=["审计日志"])
@@ -14,6 +18,8 @@ async def get_audit_logs(
     user_id: Optional[int] = Query(None),
     action: Optional[str] = Query(None),
     resource_type: Optional[str] = Query(None),
+    date_from: Optional[datetime] = Query(None, alias="from", description="起始时间（含）"),
+    date_to: Optional[datetime] = Query(None, alias="to", description="结束时间（不含）"),
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
     current_user: dict = Depends(require_admin)
@@ -23,6 +29,8 @@ async def get_audit_logs(
         user_id=user_id,
         action=action,
         resource_type=resource_type,
+        date_from=date_from,
+        date_to=date_to,
         limit=limit,
         offset=offset
     )
@@ -55,3 +63,15 @@ async def action_statistics(
     stats = get_action_stats(days=days)
     return {"ok": True, "stats": stats}
 
+
+@router.get("/partitions")
+async def audit_partitions(current_user: dict = Depends(require_admin)):
+    """查看审计日志月分区"""
+    return {"ok": True, "data": list_audit_partitions()}
+
+
+@router.post("/partitions/maintain")
+async def audit_partitions_maintain(current_user: dict = Depends(require_admin)):
+    """立即创建后续月分区并按保留策略删除过期分区"""
+    result = maintain_audit_partitions()
+    return {"ok": True, **result}
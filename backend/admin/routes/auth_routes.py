@@ -1,5 +1,6 @@
 """认证路由"""
 from fastapi import APIRouter, HTTPException, status, Request
+from fastapi.concurrency import run_in_threadpool
 from datetime import timedelta
 
 from admin.models.user import UserLogin, UserResponse, UserPasswordChange
@@ -17,7 +18,8 @@ router = APIRouter(prefix="/auth", tags=["认证"])
 @router.post("/login")
 async def login(credentials: UserLogin, request: Request):
     """管理员登录"""
-    user = authenticate_user(credentials.username, credentials.password)
+    # bcrypt 校验约几十毫秒 CPU，放到线程池，避免阻塞事件循环
+    user = await run_in_threadpool(authenticate_user, credentials.username, credentials.password)
     
     if not user:
         raise HTTPException(
@@ -36,16 +38,13 @@ async def login(credentials: UserLogin, request: Request):
     )
     
     # 记录登录日志
-    try:
-        create_audit_log(AuditLogCreate(
-            user_id=user["user_id"],
-            username=user["username"],
-            action="login",
-            ip_address=request.client.host if request.client else None,
-            user_agent=request.headers.get("user-agent")
-        ))
-    except:
-        pass  # 日志记录失败不影响登录
+    create_audit_log(AuditLogCreate(
+        user_id=user["user_id"],
+        username=user["username"],
+        action="login",
+        ip_address=request.client.host if request.client else None,
+        user_agent=request.headers.get("user-agent")
+    ))
     
     return {
         "ok": True,
@@ -67,15 +66,12 @@ async def logout(
     current_user: dict = Depends(get_current_user)
 ):
     """管理员登出"""
-    try:
-        create_audit_log(AuditLogCreate(
-            user_id=current_user["user_id"],
-            username=current_user["username"],
-            action="logout",
-            ip_address=request.client.host if request.client else None
-        ))
-    except:
-        pass
+    create_audit_log(AuditLogCreate(
+        user_id=current_user["user_id"],
+        username=current_user["username"],
+        action="logout",
+        ip_address=request.client.host if request.client else None
+    ))
     
     return {"ok": True, "message": "登出成功"}
 
@@ -96,7 +92,8 @@ async def change_password_route(
     current_user: dict = Depends(get_current_user)
 ):
     """修改密码"""
-    success = change_password(
+    success = await run_in_threadpool(
+        change_password,
         current_user["user_id"],
         password_data.old_password,
         password_data.new_password
@@ -109,16 +106,13 @@ async def change_password_route(
         )
     
     # 记录日志
-    try:
-        create_audit_log(AuditLogCreate(
-            user_id=current_user["user_id"],
-            username=current_user["username"],
-            action="change_password",
-            resource_type="user",
-            resource_id=current_user["user_id"]
-        ))
-    except:
-        pass
+    create_audit_log(AuditLogCreate(
+        user_id=current_user["user_id"],
+        username=current_user["username"],
+        action="change_password",
+        resource_type="user",
+        resource_id=current_user["user_id"]
+    ))
     
     return {"ok": True, "message": "密码修改成功"}
 
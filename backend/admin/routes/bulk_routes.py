@@ -0,0 +1,75 @@
+"""批量操作路由"""
+from typing import Optional, List, Dict, Any
+from fastapi import APIRouter, HTTPException, Depends, Request
+from pydantic import BaseModel
+
+from admin.auth_simple import require_editor
+from admin.services.bulk_service import (
+    BULK_BATCH_SIZE, build_target, count_targets, submit_bulk
+)
+from admin.services.audit_service import create_audit_log
+from admin.models.audit import AuditLogCreate
+
+
+router = APIRouter(prefix="/bulk", tags=["批量操作"])
+
+
+class BulkRequest(BaseModel):
+    """批量操作请求：ids 与 filter 至少给出一个，同时给出时取交集"""
+    resource: str                       # chunk / doc / question
+    action: str                         # verify（分片）/ publish（文档、题目）/ delete
+    ids: Optional[List[int]] = None
+    filter: Optional[Dict[str, Any]] = None
+    value: bool = True                  # verify / publish 的目标值
+    hard_delete: bool = False
+    batch_size: int = BULK_BATCH_SIZE
+    dry_run: bool = False               # 只返回命中行数，不执行
+
+
+@router.post("")
+async def bulk_operation(
+    bulk_request: BulkRequest,
+    request: Request,
+    current_user: dict = Depends(require_editor)
+):
+    """按 id 列表或过滤条件批量审核/发布/删除；目标较多时转为后台任务"""
+    try:
+        if bulk_request.dry_run:
+            where_sql, params = build_target(
+                bulk_request.resource, bulk_request.ids, bulk_request.filter,
+                include_deleted=bulk_request.hard_delete
+            )
+            return {"ok": True, "dry_run": True, "matched": count_targets(bulk_request.resource, where_sql, params)}
+
+        result = submit_bulk(
+            bulk_request.resource,
+            bulk_request.action,
+            ids=bulk_request.ids,
+            filters=bulk_request.filter,
+            value=bulk_request.value,
+            hard_delete=bulk_request.hard_delete,
+            batch_size=bulk_request.batch_size,
+            created_by=current_user["user_id"],
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # 记录审计日志
+    create_audit_log(AuditLogCreate(
+        user_id=current_user["user_id"],
+        username=current_user["username"],
+        action=f"bulk_{bulk_request.action}",
+        resource_type=bulk_request.resource,
+        details={
+            "ids_count": len(bulk_request.ids or []),
+            "filter": bulk_request.filter,
+            "value": bulk_request.value,
+            "hard_delete": bulk_request.hard_delete,
+            **result
+        },
+        ip_address=request.client.host if request.client else None
+    ))
+
+    if result["job_id"] is not None:
+        return {"ok": True, "job_id": result["job_id"], "message": "已转为后台任务执行"}
+    return {"ok": True, "job_id": None, "matched": result["matched"], "affected": result["affected"]}
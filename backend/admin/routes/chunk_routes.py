@@ -3,13 +3,15 @@ from typing import Optional, List
 from fastapi import APIRouter, HTTPException, Query, Depends, Request
 from pydantic import BaseModel
 
-from admin.auth_simple import require_editor
+from admin.auth_simple import require_editor, require_admin
 from admin.services.chunk_service import (
     list_chunks, get_chunk_detail, update_chunk, delete_chunk,
-    batch_verify_chunks, batch_delete_chunks, get_chunk_stats
+    batch_verify_chunks, batch_delete_chunks, get_chunk_stats,
+    submit_quality_backfill
 )
 from admin.services.audit_service import create_audit_log
 from admin.models.audit import AuditLogCreate
+from utils.tagfilter import parse_tags
 
 
 router = APIRouter(prefix="/chunks", tags=["分片管理"])
@@ -18,7 +20,7 @@ router = APIRouter(prefix="/chunks", tags=["分片管理"])
 class ChunkUpdate(BaseModel):
     """分片更新请求"""
     content_md: Optional[str] = None
-    content_plain: Optional[str] = None
+    content_plain: Optional[str] = None     # 已忽略：由 content_md 在服务端重算
     kind: Optional[str] = None
     heading_h1: Optional[str] = None
     heading_h2: Optional[str] = None
@@ -38,25 +40,42 @@ class BatchDeleteRequest(BaseModel):
     hard_delete: bool = False
 
 
+class QualityBackfillRequest(BaseModel):
+    """质量评分补算请求"""
+    doc_id: Optional[int] = None
+    only_unscored: bool = True          # false 时对全部分片重新评分
+    batch_size: int = 500
+
+
 @router.get("")
 async def list_chunk_items(
     doc_id: Optional[int] = Query(None),
     kind: Optional[str] = Query(None),
     search: Optional[str] = Query(None),
+    tags: Optional[str] = Query(None, description="逗号分隔的标签"),
+    tag_mode: str = Query("any", description="any: 含任一标签; all: 含全部标签"),
     verified_only: Optional[bool] = Query(None),
+    category: Optional[int] = Query(None, description="分类 id（含子分类）"),
     limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
     current_user: dict = Depends(require_editor)
 ):
     """获取分片列表"""
-    chunks, total = list_chunks(
-        doc_id=doc_id,
-        kind=kind,
-        search=search,
-        verified_only=verified_only,
-        limit=limit,
-        offset=offset
-    )
+    try:
+        tag_list = parse_tags(tags)
+        chunks, total = list_chunks(
+            doc_id=doc_id,
+            kind=kind,
+            search=search,
+            tags=tag_list,
+            tag_mode=tag_mode,
+            verified_only=verified_only,
+            category=category,
+            limit=limit,
+            offset=offset
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {
         "ok": True,
         "data": chunks,
@@ -101,18 +120,15 @@ async def update_chunk_route(
         raise HTTPException(status_code=404, detail="分片不存在")
     
     # 记录审计日志
-    try:
-        create_audit_log(AuditLogCreate(
-            user_id=current_user["user_id"],
-            username=current_user["username"],
-            action="update",
-            resource_type="chunk",
-            resource_id=chunk_id,
-            details={"updates": updates},
-            ip_address=request.client.host if request.client else None
-        ))
-    except:
-        pass
+    create_audit_log(AuditLogCreate(
+        user_id=current_user["user_id"],
+        username=current_user["username"],
+        action="update",
+        resource_type="chunk",
+        resource_id=chunk_id,
+        details={"updates": updates},
+        ip_address=request.client.host if request.client else None
+    ))
     
     return {"ok": True, "data": chunk}
 
@@ -131,18 +147,15 @@ async def delete_chunk_route(
         raise HTTPException(status_code=404, detail="分片不存在")
     
     # 记录审计日志
-    try:
-        create_audit_log(AuditLogCreate(
-            user_id=current_user["user_id"],
-            username=current_user["username"],
-            action="delete",
-            resource_type="chunk",
-            resource_id=chunk_id,
-            details={"hard_delete": hard_delete},
-            ip_address=request.client.host if request.client else None
-        ))
-    except:
-        pass
+    create_audit_log(AuditLogCreate(
+        user_id=current_user["user_id"],
+        username=current_user["username"],
+        action="delete",
+        resource_type="chunk",
+        resource_id=chunk_id,
+        details={"hard_delete": hard_delete},
+        ip_address=request.client.host if request.client else None
+    ))
     
     return {"ok": True, "message": "删除成功"}
 
@@ -160,21 +173,18 @@ async def batch_verify(
     )
     
     # 记录审计日志
-    try:
-        create_audit_log(AuditLogCreate(
-            user_id=current_user["user_id"],
-            username=current_user["username"],
-            action="batch_verify",
-            resource_type="chunk",
-            details={
-                "chunk_ids": verify_request.chunk_ids,
-                "count": count,
-                "verified": verify_request.verified
-            },
-            ip_address=request.client.host if request.client else None
-        ))
-    except:
-        pass
+    create_audit_log(AuditLogCreate(
+        user_id=current_user["user_id"],
+        username=current_user["username"],
+        action="batch_verify",
+        resource_type="chunk",
+        details={
+            "chunk_ids": verify_request.chunk_ids,
+            "count": count,
+            "verified": verify_request.verified
+        },
+        ip_address=request.client.host if request.client else None
+    ))
     
     return {"ok": True, "verified_count": count}
 
@@ -192,21 +202,47 @@ async def batch_delete(
     )
     
     # 记录审计日志
-    try:
-        create_audit_log(AuditLogCreate(
-            user_id=current_user["user_id"],
-            username=current_user["username"],
-            action="batch_delete",
-            resource_type="chunk",
-            details={
-                "chunk_ids": delete_request.chunk_ids,
-                "count": count,
-                "hard_delete": delete_request.hard_delete
-            },
-            ip_address=request.client.host if request.client else None
-        ))
-    except:
-        pass
+    create_audit_log(AuditLogCreate(
+        user_id=current_user["user_id"],
+        username=current_user["username"],
+        action="batch_delete",
+        resource_type="chunk",
+        details={
+            "chunk_ids": delete_request.chunk_ids,
+            "count": count,
+            "hard_delete": delete_request.hard_delete
+        },
+        ip_address=request.client.host if request.client else None
+    ))
     
     return {"ok": True, "deleted_count": count}
 
+
+@router.post("/quality/backfill")
+async def quality_backfill(
+    backfill_request: QualityBackfillRequest,
+    request: Request,
+    current_user: dict = Depends(require_admin)
+):
+    """在后台按批并行计算分片质量评分，进度通过 /admin/jobs/{job_id} 查询"""
+    try:
+        job_id = submit_quality_backfill(
+            doc_id=backfill_request.doc_id,
+            only_unscored=backfill_request.only_unscored,
+            batch_size=backfill_request.batch_size,
+            created_by=current_user["user_id"],
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # 记录审计日志
+    create_audit_log(AuditLogCreate(
+        user_id=current_user["user_id"],
+        username=current_user["username"],
+        action="quality_backfill",
+        resource_type="chunk",
+        details={**backfill_request.dict(), "job_id": job_id},
+        ip_address=request.client.host if request.client else None
+    ))
+
+    return {"ok": True, "job_id": job_id, "message": "已转为后台任务执行"}
@@ -3,10 +3,10 @@ from typing import Optional, List
 from fastapi import APIRouter, HTTPException, Query, Depends, Request
 from pydantic import BaseModel
 
-from admin.auth_simple import require_editor
+from admin.auth_simple import require_editor, require_admin
 from admin.services.doc_service import (
     list_docs, get_doc_detail, update_doc, delete_doc,
-    batch_delete_docs, get_doc_stats
+    batch_delete_docs, get_doc_stats, rebuild_doc_rollups
 )
 from admin.services.audit_service import create_audit_log
 from admin.models.audit import AuditLogCreate
@@ -29,16 +29,22 @@ class BatchDeleteRequest(BaseModel):
     hard_delete: bool = False
 
 
+class RollupRebuildRequest(BaseModel):
+    """文档汇总重算请求（doc_ids 为空时重算全部）"""
+    doc_ids: Optional[List[int]] = None
+
+
 @router.get("")
 async def list_documents(
     source: Optional[str] = Query(None),
     search: Optional[str] = Query(None),
+    category: Optional[int] = Query(None, description="分类 id（含子分类）"),
     limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
     current_user: dict = Depends(require_editor)
 ):
     """获取文档列表"""
-    docs, total = list_docs(source=source, search=search, limit=limit, offset=offset)
+    docs, total = list_docs(source=source, search=search, category=category, limit=limit, offset=offset)
     return {
         "ok": True,
         "data": docs,
@@ -55,6 +61,28 @@ async def get_stats(current_user: dict = Depends(require_editor)):
     return {"ok": True, "stats": stats}
 
 
+@router.post("/rollups/rebuild")
+async def rebuild_rollups(
+    rebuild_request: RollupRebuildRequest,
+    request: Request,
+    current_user: dict = Depends(require_admin)
+):
+    """按分片重算文档的分片数 / token 总数 / 平均质量分"""
+    fixed = rebuild_doc_rollups(rebuild_request.doc_ids)
+    
+    # 记录审计日志
+    create_audit_log(AuditLogCreate(
+        user_id=current_user["user_id"],
+        username=current_user["username"],
+        action="rebuild_rollups",
+        resource_type="doc",
+        details={"doc_ids": rebuild_request.doc_ids, "fixed": fixed},
+        ip_address=request.client.host if request.client else None
+    ))
+    
+    return {"ok": True, "fixed": fixed}
+
+
 @router.get("/{doc_id}")
 async def get_document(
     doc_id: int,
@@ -83,18 +111,15 @@ async def update_document(
         raise HTTPException(status_code=404, detail="文档不存在")
     
     # 记录审计日志
-    try:
-        create_audit_log(AuditLogCreate(
-            user_id=current_user["user_id"],
-            username=current_user["username"],
-            action="update",
-            resource_type="doc",
-            resource_id=doc_id,
-            details={"updates": updates},
-            ip_address=request.client.host if request.client else None
-        ))
-    except:
-        pass
+    create_audit_log(AuditLogCreate(
+        user_id=current_user["user_id"],
+        username=current_user["username"],
+        action="update",
+        resource_type="doc",
+        resource_id=doc_id,
+        details={"updates": updates},
+        ip_address=request.client.host if request.client else None
+    ))
     
     return {"ok": True, "data": doc}
 
@@ -113,18 +138,15 @@ async def delete_document(
         raise HTTPException(status_code=404, detail="文档不存在")
     
     # 记录审计日志
-    try:
-        create_audit_log(AuditLogCreate(
-            user_id=current_user["user_id"],
-            username=current_user["username"],
-            action="delete",
-            resource_type="doc",
-            resource_id=doc_id,
-            details={"hard_delete": hard_delete},
-            ip_address=request.client.host if request.client else None
-        ))
-    except:
-        pass
+    create_audit_log(AuditLogCreate(
+        user_id=current_user["user_id"],
+        username=current_user["username"],
+        action="delete",
+        resource_type="doc",
+        resource_id=doc_id,
+        details={"hard_delete": hard_delete},
+        ip_address=request.client.host if request.client else None
+    ))
     
     return {"ok": True, "message": "删除成功"}
 
@@ -142,21 +164,18 @@ async def batch_delete(
     )
     
     # 记录审计日志
-    try:
-        create_audit_log(AuditLogCreate(
-            user_id=current_user["user_id"],
-            username=current_user["username"],
-            action="batch_delete",
-            resource_type="doc",
-            details={
-                "doc_ids": delete_request.doc_ids,
-                "count": count,
-                "hard_delete": delete_request.hard_delete
-            },
-            ip_address=request.client.host if request.client else None
-        ))
-    except:
-        pass
+    create_audit_log(AuditLogCreate(
+        user_id=current_user["user_id"],
+        username=current_user["username"],
+        action="batch_delete",
+        resource_type="doc",
+        details={
+            "doc_ids": delete_request.doc_ids,
+            "count": count,
+            "hard_delete": delete_request.hard_delete
+        },
+        ip_address=request.client.host if request.client else None
+    ))
     
     return {"ok": True, "deleted_count": count}
 
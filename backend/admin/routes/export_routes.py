@@ -0,0 +1,83 @@
+"""数据导出路由"""
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Depends, Request
+from fastapi.responses import StreamingResponse
+
+from admin.auth_simple import require_editor, require_admin
+from admin.services.export_service import build_export_query, stream_resource
+from admin.services.audit_service import create_audit_log
+from admin.models.audit import AuditLogCreate
+from utils.export import EXPORT_BATCH_SIZE, check_export_options, export_filename, export_media_type
+
+
+router = APIRouter(prefix="/export", tags=["数据导出"])
+
+
+def _export_response(
+    resource: str,
+    fmt: str,
+    compression: str,
+    batch_size: int,
+    request: Request,
+    current_user: dict,
+    **filters
+) -> StreamingResponse:
+    try:
+        check_export_options(fmt, compression)
+        sql, params = build_export_query(resource, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    filename = export_filename(f"{resource}_{datetime.now():%Y%m%d_%H%M%S}", fmt, compression)
+
+    # 记录审计日志
+    create_audit_log(AuditLogCreate(
+        user_id=current_user["user_id"],
+        username=current_user["username"],
+        action="export",
+        resource_type=resource,
+        details={"format": fmt, "compression": compression, **filters},
+        ip_address=request.client.host if request.client else None
+    ))
+
+    return StreamingResponse(
+        stream_resource(sql, params, fmt, compression, batch_size),
+        media_type=export_media_type(fmt, compression),
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.get("/audit")
+async def export_audit_logs(
+    request: Request,
+    format: str = Query("csv", description="csv / jsonl / parquet"),
+    compression: str = Query("none", description="none / gzip / zstd"),
+    batch_size: int = Query(EXPORT_BATCH_SIZE, ge=1, le=10000),
+    date_from: Optional[datetime] = Query(None, alias="from", description="起始时间（含）"),
+    date_to: Optional[datetime] = Query(None, alias="to", description="结束时间（不含）"),
+    current_user: dict = Depends(require_admin)
+):
+    """流式导出审计日志"""
+    return _export_response(
+        "audit", format, compression, batch_size, request, current_user,
+        date_from=date_from, date_to=date_to
+    )
+
+
+@router.get("/{resource}")
+async def export_resource(
+    resource: str,
+    request: Request,
+    format: str = Query("csv", description="csv / jsonl / parquet"),
+    compression: str = Query("none", description="none / gzip / zstd"),
+    batch_size: int = Query(EXPORT_BATCH_SIZE, ge=1, le=10000),
+    include_deleted: bool = Query(False),
+    doc_id: Optional[int] = Query(None, description="仅导出该文档（docs / chunks）"),
+    current_user: dict = Depends(require_editor)
+):
+    """流式导出文档 / 分片 / 题目（resource 为 docs / chunks / questions）"""
+    return _export_response(
+        resource, format, compression, batch_size, request, current_user,
+        include_deleted=include_deleted, doc_id=doc_id
+    )
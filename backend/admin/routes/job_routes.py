@@ -0,0 +1,32 @@
+"""后台任务路由"""
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Depends
+
+from admin.auth_simple import require_editor
+from admin.services.job_service import get_job, list_jobs
+
+
+router = APIRouter(prefix="/jobs", tags=["后台任务"])
+
+
+@router.get("")
+async def get_jobs(
+    kind: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(require_editor)
+):
+    """最近的后台任务"""
+    jobs = list_jobs(kind=kind, limit=limit)
+    return {"ok": True, "data": jobs, "total": len(jobs)}
+
+
+@router.get("/{job_id}")
+async def get_job_status(
+    job_id: int,
+    current_user: dict = Depends(require_editor)
+):
+    """查询任务状态与进度（total / processed / affected）"""
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return {"ok": True, "data": job}
@@ -0,0 +1,75 @@
+"""知识库快照路由"""
+import os
+import tarfile
+import tempfile
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Request, UploadFile, File, Query
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
+
+from admin.auth_simple import require_admin
+from admin.services.audit_service import create_audit_log
+from admin.models.audit import AuditLogCreate
+from kb_snapshot import export_snapshot, import_snapshot
+
+
+router = APIRouter(prefix="/kb-snapshot", tags=["知识库快照"])
+
+
+@router.get("/export")
+def export_kb_snapshot(
+    request: Request,
+    current_user: dict = Depends(require_admin)
+):
+    """导出知识库快照（tar.gz：文档、分片、标签、题目与题目图片）"""
+    fd, path = tempfile.mkstemp(suffix=".tar.gz")
+    os.close(fd)
+    try:
+        result = export_snapshot(path)
+    except Exception:
+        os.unlink(path)
+        raise
+
+    # 记录审计日志
+    create_audit_log(AuditLogCreate(
+        user_id=current_user["user_id"],
+        username=current_user["username"],
+        action="export",
+        resource_type="kb_snapshot",
+        details=result,
+        ip_address=request.client.host if request.client else None
+    ))
+
+    return FileResponse(
+        path,
+        media_type="application/gzip",
+        filename=f"kb_snapshot_{datetime.now():%Y%m%d_%H%M%S}.tar.gz",
+        background=BackgroundTask(os.unlink, path)
+    )
+
+
+@router.post("/import")
+def import_kb_snapshot(
+    request: Request,
+    file: UploadFile = File(...),
+    rebuild_indexes: Optional[bool] = Query(None, description="是否先删除再重建 trigram 索引，默认按导入行数决定"),
+    current_user: dict = Depends(require_admin)
+):
+    """导入知识库快照：按 sha256 去重合并，全部数据在一个事务内写入"""
+    try:
+        result = import_snapshot(file.file, rebuild_indexes=rebuild_indexes)
+    except (ValueError, tarfile.TarError) as e:
+        raise HTTPException(status_code=400, detail=f"快照无效: {e}")
+
+    # 记录审计日志
+    create_audit_log(AuditLogCreate(
+        user_id=current_user["user_id"],
+        username=current_user["username"],
+        action="import",
+        resource_type="kb_snapshot",
+        details={"filename": file.filename, **result},
+        ip_address=request.client.host if request.client else None
+    ))
+
+    return {"ok": True, "data": result}
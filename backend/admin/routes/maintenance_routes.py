@@ -0,0 +1,57 @@
+"""数据维护路由"""
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Request
+from pydantic import BaseModel
+
+from admin.auth_simple import require_admin
+from admin.services.purge_service import (
+    SOFT_DELETE_RETENTION_DAYS, PURGE_BATCH_SIZE, count_purgeable, purge_soft_deleted
+)
+from admin.services.audit_service import create_audit_log
+from admin.models.audit import AuditLogCreate
+
+
+router = APIRouter(prefix="/maintenance", tags=["数据维护"])
+
+
+class PurgeRequest(BaseModel):
+    """软删除清理请求"""
+    older_than_days: Optional[int] = None   # 默认使用 SOFT_DELETE_RETENTION_DAYS（为 0 时取 30）
+    batch_size: int = PURGE_BATCH_SIZE
+    vacuum: bool = True
+    dry_run: bool = False
+
+
+@router.post("/purge")
+async def purge(
+    purge_request: PurgeRequest,
+    request: Request,
+    current_user: dict = Depends(require_admin)
+):
+    """硬删除软删除超过指定天数的分片、文档、题目，并回收图片与表空间"""
+    days = purge_request.older_than_days
+    if days is None:
+        days = SOFT_DELETE_RETENTION_DAYS if SOFT_DELETE_RETENTION_DAYS > 0 else 30
+    if days < 0:
+        raise HTTPException(status_code=400, detail="older_than_days 不能为负数")
+
+    if purge_request.dry_run:
+        return {"ok": True, "dry_run": True, "older_than_days": days, "purgeable": count_purgeable(days)}
+
+    result = purge_soft_deleted(
+        older_than_days=days,
+        batch_size=purge_request.batch_size,
+        vacuum=purge_request.vacuum
+    )
+
+    # 记录审计日志
+    create_audit_log(AuditLogCreate(
+        user_id=current_user["user_id"],
+        username=current_user["username"],
+        action="purge",
+        resource_type="soft_deleted",
+        details={"older_than_days": days, "purged": result["purged"]},
+        ip_address=request.client.host if request.client else None
+    ))
+
+    return {"ok": True, "older_than_days": days, "data": result}
@@ -0,0 +1,54 @@
+"""题库图片存储路由"""
+from typing import Optional
+from fastapi import APIRouter, Depends, Request
+from pydantic import BaseModel
+
+from admin.auth_simple import require_admin
+from admin.services.media_service import get_image_store_stats, run_image_gc, rebuild_image_refs
+from admin.services.audit_service import create_audit_log
+from admin.models.audit import AuditLogCreate
+
+
+router = APIRouter(prefix="/media", tags=["图片存储"])
+
+
+class ImageGCRequest(BaseModel):
+    """图片清理请求"""
+    dry_run: bool = False
+    grace_seconds: Optional[int] = None
+
+
+@router.get("/stats")
+async def image_stats(current_user: dict = Depends(require_admin)):
+    """图片存储概况"""
+    return {"ok": True, "data": get_image_store_stats()}
+
+
+@router.post("/gc")
+async def image_gc(
+    gc_request: ImageGCRequest,
+    request: Request,
+    current_user: dict = Depends(require_admin)
+):
+    """清理没有题目引用的图片"""
+    result = run_image_gc(dry_run=gc_request.dry_run, grace_seconds=gc_request.grace_seconds)
+
+    # 记录审计日志
+    if not gc_request.dry_run:
+        create_audit_log(AuditLogCreate(
+            user_id=current_user["user_id"],
+            username=current_user["username"],
+            action="gc",
+            resource_type="qimg",
+            details=result,
+            ip_address=request.client.host if request.client else None
+        ))
+
+    return {"ok": True, "data": result}
+
+
+@router.post("/rebuild-refs")
+async def image_rebuild_refs(current_user: dict = Depends(require_admin)):
+    """按题目内容重算图片引用计数"""
+    referenced = rebuild_image_refs()
+    return {"ok": True, "referenced": referenced}
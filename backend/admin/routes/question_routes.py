@@ -10,6 +10,7 @@ from admin.services.question_service import (
 )
 from admin.services.audit_service import create_audit_log
 from admin.models.audit import AuditLogCreate
+from utils.tagfilter import parse_tags
 
 
 router = APIRouter(prefix="/questions", tags=["题库管理"])
@@ -38,18 +39,26 @@ async def list_question_items(
     qtype: Optional[str] = Query(None),
     difficulty: Optional[int] = Query(None),
     search: Optional[str] = Query(None),
+    tags: Optional[str] = Query(None, description="逗号分隔的标签"),
+    tag_mode: str = Query("any", description="any: 含任一标签; all: 含全部标签"),
     limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
     current_user: dict = Depends(require_editor)
 ):
     """获取题目列表"""
-    questions, total = list_questions(
-        qtype=qtype,
-        difficulty=difficulty,
-        search=search,
-        limit=limit,
-        offset=offset
-    )
+    try:
+        tag_list = parse_tags(tags)
+        questions, total = list_questions(
+            qtype=qtype,
+            difficulty=difficulty,
+            search=search,
+            tags=tag_list,
+            tag_mode=tag_mode,
+            limit=limit,
+            offset=offset
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {
         "ok": True,
         "data": questions,
@@ -88,24 +97,24 @@ async def update_question_route(
 ):
     """更新题目"""
     updates = question_update.dict(exclude_unset=True)
-    question = update_question(qid, updates)
+    try:
+        question = update_question(qid, updates)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     if not question:
         raise HTTPException(status_code=404, detail="题目不存在")
     
     # 记录审计日志
-    try:
-        create_audit_log(AuditLogCreate(
-            user_id=current_user["user_id"],
-            username=current_user["username"],
-            action="update",
-            resource_type="question",
-            resource_id=qid,
-            details={"updates": updates},
-            ip_address=request.client.host if request.client else None
-        ))
-    except:
-        pass
+    create_audit_log(AuditLogCreate(
+        user_id=current_user["user_id"],
+        username=current_user["username"],
+        action="update",
+        resource_type="question",
+        resource_id=qid,
+        details={"updates": updates},
+        ip_address=request.client.host if request.client else None
+    ))
     
     return {"ok": True, "data": question}
 
@@ -124,18 +133,15 @@ async def delete_question_route(
         raise HTTPException(status_code=404, detail="题目不存在")
     
     # 记录审计日志
-    try:
-        create_audit_log(AuditLogCreate(
-            user_id=current_user["user_id"],
-            username=current_user["username"],
-            action="delete",
-            resource_type="question",
-            resource_id=qid,
-            details={"hard_delete": hard_delete},
-            ip_address=request.client.host if request.client else None
-        ))
-    except:
-        pass
+    create_audit_log(AuditLogCreate(
+        user_id=current_user["user_id"],
+        username=current_user["username"],
+        action="delete",
+        resource_type="question",
+        resource_id=qid,
+        details={"hard_delete": hard_delete},
+        ip_address=request.client.host if request.client else None
+    ))
     
     return {"ok": True, "message": "删除成功"}
 
@@ -153,21 +159,18 @@ async def batch_delete(
     )
     
     # 记录审计日志
-    try:
-        create_audit_log(AuditLogCreate(
-            user_id=current_user["user_id"],
-            username=current_user["username"],
-            action="batch_delete",
-            resource_type="question",
-            details={
-                "qids": delete_request.qids,
-                "count": count,
-                "hard_delete": delete_request.hard_delete
-            },
-            ip_address=request.client.host if request.client else None
-        ))
-    except:
-        pass
+    create_audit_log(AuditLogCreate(
+        user_id=current_user["user_id"],
+        username=current_user["username"],
+        action="batch_delete",
+        resource_type="question",
+        details={
+            "qids": delete_request.qids,
+            "count": count,
+            "hard_delete": delete_request.hard_delete
+        },
+        ip_address=request.client.host if request.client else None
+    ))
     
     return {"ok": True, "deleted_count": count}
 
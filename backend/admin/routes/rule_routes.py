@@ -0,0 +1,143 @@
+"""分类规则路由"""
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Request, BackgroundTasks
+from pydantic import BaseModel
+
+from admin.auth_simple import require_admin
+from admin.services.rule_service import (
+    list_kind_rules, create_kind_rule, update_kind_rule, delete_kind_rule
+)
+from admin.services.audit_service import create_audit_log
+from admin.models.audit import AuditLogCreate
+from ingest import reclassify_chunks
+
+
+router = APIRouter(prefix="/kind-rules", tags=["分类规则"])
+
+
+class KindRuleCreate(BaseModel):
+    """新增分类规则请求"""
+    keyword: str
+    kind: str
+    priority: int = 0
+
+
+class KindRuleUpdate(BaseModel):
+    """更新分类规则请求"""
+    priority: Optional[int] = None
+    is_active: Optional[bool] = None
+
+
+class ReclassifyRequest(BaseModel):
+    """批量重新分类请求"""
+    doc_id: Optional[int] = None
+    batch_size: int = 1000
+
+
+@router.get("")
+async def list_rules(current_user: dict = Depends(require_admin)):
+    """获取分类规则列表"""
+    rules = list_kind_rules()
+    return {"ok": True, "data": rules, "total": len(rules)}
+
+
+@router.post("")
+async def create_rule(
+    rule_data: KindRuleCreate,
+    request: Request,
+    current_user: dict = Depends(require_admin)
+):
+    """新增分类规则"""
+    try:
+        rule = create_kind_rule(rule_data.keyword, rule_data.kind, rule_data.priority)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # 记录审计日志
+    create_audit_log(AuditLogCreate(
+        user_id=current_user["user_id"],
+        username=current_user["username"],
+        action="create",
+        resource_type="kind_rule",
+        resource_id=rule["rule_id"],
+        details=rule_data.dict(),
+        ip_address=request.client.host if request.client else None
+    ))
+
+    return {"ok": True, "data": rule}
+
+
+@router.put("/{rule_id}")
+async def update_rule(
+    rule_id: int,
+    rule_update: KindRuleUpdate,
+    request: Request,
+    current_user: dict = Depends(require_admin)
+):
+    """更新分类规则"""
+    updates = rule_update.dict(exclude_unset=True)
+    rule = update_kind_rule(rule_id, updates)
+    if not rule:
+        raise HTTPException(status_code=404, detail="规则不存在")
+
+    # 记录审计日志
+    create_audit_log(AuditLogCreate(
+        user_id=current_user["user_id"],
+        username=current_user["username"],
+        action="update",
+        resource_type="kind_rule",
+        resource_id=rule_id,
+        details={"updates": updates},
+        ip_address=request.client.host if request.client else None
+    ))
+
+    return {"ok": True, "data": rule}
+
+
+@router.delete("/{rule_id}")
+async def delete_rule(
+    rule_id: int,
+    request: Request,
+    current_user: dict = Depends(require_admin)
+):
+    """删除分类规则"""
+    delete_kind_rule(rule_id)
+
+    # 记录审计日志
+    create_audit_log(AuditLogCreate(
+        user_id=current_user["user_id"],
+        username=current_user["username"],
+        action="delete",
+        resource_type="kind_rule",
+        resource_id=rule_id,
+        ip_address=request.client.host if request.client else None
+    ))
+
+    return {"ok": True, "message": "删除成功"}
+
+
+@router.post("/reclassify")
+async def reclassify(
+    reclassify_request: ReclassifyRequest,
+    background_tasks: BackgroundTasks,
+    request: Request,
+    current_user: dict = Depends(require_admin)
+):
+    """按当前规则在后台批量重新分类已有分片"""
+    background_tasks.add_task(
+        reclassify_chunks,
+        batch_size=reclassify_request.batch_size,
+        doc_id=reclassify_request.doc_id
+    )
+
+    # 记录审计日志
+    create_audit_log(AuditLogCreate(
+        user_id=current_user["user_id"],
+        username=current_user["username"],
+        action="reclassify",
+        resource_type="chunk",
+        details=reclassify_request.dict(),
+        ip_address=request.client.host if request.client else None
+    ))
+
+    return {"ok": True, "message": "已开始重新分类"}
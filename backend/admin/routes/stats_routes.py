@@ -1,11 +1,12 @@
 """统计路由"""
-from fastapi import APIRouter, Query, Depends
+from fastapi import APIRouter, HTTPException, Query, Depends, BackgroundTasks
 
-from admin.auth_simple import require_editor
+from admin.auth_simple import require_editor, require_admin
 from admin.services.stats_service import (
-    get_system_stats, get_dashboard_data, get_content_distribution,
-    get_quality_report, get_usage_stats
+    get_system_stats, get_usage_stats, get_duplicate_report,
+    run_signature_backfill, run_search_rollup
 )
+from admin.services.snapshot_service import get_snapshot
 
 
 router = APIRouter(prefix="/stats", tags=["统计"])
@@ -18,25 +19,42 @@ async def system_stats(current_user: dict = Depends(require_editor)):
     return {"ok": True, "stats": stats}
 
 
+def _snapshot_response(name: str, refresh: bool) -> dict:
+    snap = get_snapshot(name, force_refresh=refresh)
+    return {
+        "ok": True,
+        **snap["data"],
+        "computed_at": snap["computed_at"],
+        "age_seconds": snap["age_seconds"],
+        "stale": snap["stale"]
+    }
+
+
 @router.get("/dashboard")
-async def dashboard(current_user: dict = Depends(require_editor)):
-    """获取仪表板数据"""
-    data = get_dashboard_data()
-    return {"ok": True, **data}
+async def dashboard(
+    refresh: bool = Query(False, description="忽略快照立即重算"),
+    current_user: dict = Depends(require_editor)
+):
+    """获取仪表板数据（快照）"""
+    return _snapshot_response("dashboard", refresh)
 
 
 @router.get("/content-distribution")
-async def content_distribution(current_user: dict = Depends(require_editor)):
-    """获取内容分布统计"""
-    data = get_content_distribution()
-    return {"ok": True, **data}
+async def content_distribution(
+    refresh: bool = Query(False, description="忽略快照立即重算"),
+    current_user: dict = Depends(require_editor)
+):
+    """获取内容分布统计（快照）"""
+    return _snapshot_response("content_distribution", refresh)
 
 
 @router.get("/quality-report")
-async def quality_report(current_user: dict = Depends(require_editor)):
-    """获取质量报告"""
-    data = get_quality_report()
-    return {"ok": True, **data}
+async def quality_report(
+    refresh: bool = Query(False, description="忽略快照立即重算"),
+    current_user: dict = Depends(require_editor)
+):
+    """获取质量报告（快照）"""
+    return _snapshot_response("quality_report", refresh)
 
 
 @router.get("/usage")
@@ -48,3 +66,36 @@ async def usage_stats(
     data = get_usage_stats(days=days)
     return {"ok": True, **data}
 
+
+@router.get("/duplicates")
+async def duplicates(
+    item_type: str = Query("chunk"),
+    limit: int = Query(50, ge=1, le=500),
+    current_user: dict = Depends(require_editor)
+):
+    """获取近重复分片 / 题目报告"""
+    try:
+        data = get_duplicate_report(item_type=item_type, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"ok": True, **data}
+
+
+@router.post("/duplicates/backfill")
+async def duplicates_backfill(
+    background_tasks: BackgroundTasks,
+    current_user: dict = Depends(require_admin)
+):
+    """在后台为已有数据补算近重复签名"""
+    background_tasks.add_task(run_signature_backfill)
+    return {"ok": True, "message": "已开始补算签名"}
+
+
+@router.post("/searches/rollup")
+async def searches_rollup(
+    days: int = Query(1, ge=0, le=365),
+    current_user: dict = Depends(require_admin)
+):
+    """立即重算最近 days 天的检索按日汇总（补算历史或调试时使用）"""
+    data = run_search_rollup(days=days)
+    return {"ok": True, **data}
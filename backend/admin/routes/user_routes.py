@@ -1,5 +1,6 @@
 """用户管理路由"""
 from fastapi import APIRouter, HTTPException, Query, Depends, Request
+from fastapi.concurrency import run_in_threadpool
 
 from admin.auth_simple import require_admin, require_superadmin
 from admin.models.user import UserCreate, UserUpdate
@@ -35,8 +36,8 @@ async def get_user(
     user_id: int,
     current_user: dict = Depends(require_admin)
 ):
-    """获取用户详情"""
-    user = get_user_by_id(user_id)
+    """获取用户详情（直接查库，不读进程内缓存）"""
+    user = get_user_by_id(user_id, use_cache=False)
     if not user:
         raise HTTPException(status_code=404, detail="用户不存在")
     
@@ -51,23 +52,20 @@ async def create_new_user(
 ):
     """创建新用户（仅超级管理员）"""
     try:
-        user = create_user(user_data)
+        user = await run_in_threadpool(create_user, user_data)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     
     # 记录审计日志
-    try:
-        create_audit_log(AuditLogCreate(
-            user_id=current_user["user_id"],
-            username=current_user["username"],
-            action="create",
-            resource_type="user",
-            resource_id=user["user_id"],
-            details={"username": user["username"], "role": user["role"]},
-            ip_address=request.client.host if request.client else None
-        ))
-    except:
-        pass
+    create_audit_log(AuditLogCreate(
+        user_id=current_user["user_id"],
+        username=current_user["username"],
+        action="create",
+        resource_type="user",
+        resource_id=user["user_id"],
+        details={"username": user["username"], "role": user["role"]},
+        ip_address=request.client.host if request.client else None
+    ))
     
     return {"ok": True, "data": user}
 
@@ -86,18 +84,15 @@ async def update_user_route(
         raise HTTPException(status_code=404, detail="用户不存在")
     
     # 记录审计日志
-    try:
-        create_audit_log(AuditLogCreate(
-            user_id=current_user["user_id"],
-            username=current_user["username"],
-            action="update",
-            resource_type="user",
-            resource_id=user_id,
-            details={"updates": user_data.dict(exclude_unset=True)},
-            ip_address=request.client.host if request.client else None
-        ))
-    except:
-        pass
+    create_audit_log(AuditLogCreate(
+        user_id=current_user["user_id"],
+        username=current_user["username"],
+        action="update",
+        resource_type="user",
+        resource_id=user_id,
+        details={"updates": user_data.dict(exclude_unset=True)},
+        ip_address=request.client.host if request.client else None
+    ))
     
     return {"ok": True, "data": user}
 
@@ -118,17 +113,14 @@ async def delete_user_route(
         raise HTTPException(status_code=404, detail="用户不存在")
     
     # 记录审计日志
-    try:
-        create_audit_log(AuditLogCreate(
-            user_id=current_user["user_id"],
-            username=current_user["username"],
-            action="delete",
-            resource_type="user",
-            resource_id=user_id,
-            ip_address=request.client.host if request.client else None
-        ))
-    except:
-        pass
+    create_audit_log(AuditLogCreate(
+        user_id=current_user["user_id"],
+        username=current_user["username"],
+        action="delete",
+        resource_type="user",
+        resource_id=user_id,
+        ip_address=request.client.host if request.client else None
+    ))
     
     return {"ok": True, "message": "用户已删除"}
 
@@ -1,49 +1,35 @@
 """审计日志服务"""
+import os
+from datetime import date, datetime
 from typing import Optional, List, Dict, Any
 
 from db import get_conn, release_conn, _query, _query_one, _execute
 from admin.models.audit import AuditLogCreate
+from admin.services.audit_writer import audit_writer
+from utils.background import PeriodicWorker
 
 
-def create_audit_log(log_data: AuditLogCreate) -> int:
-    """创建审计日志"""
-    conn = get_conn()
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO public.audit_log 
-                (user_id, username, action, resource_type, resource_id, details, ip_address, user_agent)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING log_id
-                """,
-                (
-                    log_data.user_id,
-                    log_data.username,
-                    log_data.action,
-                    log_data.resource_type,
-                    log_data.resource_id,
-                    log_data.details,
-                    log_data.ip_address,
-                    log_data.user_agent
-                )
-            )
-            log_id = cur.fetchone()[0]
-        
-        conn.commit()
-        return log_id
-    finally:
-        release_conn(conn)
+# 审计日志保留的整月数（另加当月），0 表示不清理
+AUDIT_RETENTION_MONTHS = int(os.getenv("AUDIT_RETENTION_MONTHS", "0"))
+# 提前创建的月分区数
+AUDIT_PARTITIONS_AHEAD = int(os.getenv("AUDIT_PARTITIONS_AHEAD", "2"))
+
+
+def create_audit_log(log_data: AuditLogCreate) -> None:
+    """记录审计日志：放入后台写入队列后立即返回，批量落库见 audit_writer"""
+    audit_writer.submit(log_data)
 
 
 def list_audit_logs(
     user_id: Optional[int] = None,
     action: Optional[str] = None,
     resource_type: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
     limit: int = 50,
     offset: int = 0
 ) -> tuple[List[Dict[str, Any]], int]:
-    """获取审计日志列表"""
+    """获取审计日志列表；date_from / date_to 限定时间窗口（含起点不含终点），只扫描对应月分区"""
     conn = get_conn()
     try:
         where_clauses = ["1=1"]
@@ -61,6 +47,14 @@ def list_audit_logs(
             where_clauses.append("resource_type = %s")
             params.append(resource_type)
         
+        if date_from:
+            where_clauses.append("created_at >= %s")
+            params.append(date_from)
+        
+        if date_to:
+            where_clauses.append("created_at < %s")
+            params.append(date_to)
+        
         where_sql = " AND ".join(where_clauses)
         
         logs = _query(
@@ -70,7 +64,7 @@ def list_audit_logs(
                    details, ip_address, created_at
             FROM public.audit_log
             WHERE {where_sql}
-            ORDER BY created_at DESC
+            ORDER BY created_at DESC, log_id DESC
             LIMIT %s OFFSET %s
             """,
             params + [limit, offset]
@@ -134,3 +128,57 @@ def get_action_stats(days: int = 30) -> List[Dict[str, Any]]:
     finally:
         release_conn(conn)
 
+
+def maintain_audit_partitions(
+    months_ahead: int = AUDIT_PARTITIONS_AHEAD,
+    retention_months: int = AUDIT_RETENTION_MONTHS
+) -> Dict[str, Any]:
+    """创建未来的月分区，并按保留策略整体删除过期月分区（不逐行 DELETE）"""
+    conn = get_conn()
+    try:
+        today = date.today()
+        last = date(today.year + (today.month - 1 + months_ahead) // 12, (today.month - 1 + months_ahead) % 12 + 1, 1)
+        created = _query_one(
+            conn,
+            "SELECT public.audit_log_ensure_partitions(%s, %s) AS created",
+            (today, last)
+        )
+        dropped = _query(
+            conn,
+            "SELECT public.audit_log_drop_partitions(%s) AS name",
+            (retention_months,)
+        )
+        conn.commit()
+        return {
+            "created": int(created["created"]) if created else 0,
+            "dropped": [r["name"] for r in dropped]
+        }
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        release_conn(conn)
+
+
+def list_audit_partitions() -> List[Dict[str, Any]]:
+    """列出审计日志分区及其估计行数与占用空间"""
+    conn = get_conn()
+    try:
+        return _query(
+            conn,
+            """
+            SELECT c.relname AS name,
+                   pg_get_expr(c.relpartbound, c.oid) AS bounds,
+                   c.reltuples::bigint AS estimated_rows,
+                   pg_total_relation_size(c.oid) AS total_bytes
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'public.audit_log'::regclass
+            ORDER BY c.relname
+            """
+        )
+    finally:
+        release_conn(conn)
+
+
+audit_partition_worker = PeriodicWorker("audit-partitions", 86400, maintain_audit_partitions, initial_delay=60)
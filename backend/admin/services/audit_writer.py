@@ -0,0 +1,236 @@
+"""审计日志异步批量写入
+
+请求路径中的 create_audit_log 只把事件放入有界内存队列，由后台线程每 AUDIT_FLUSH_MS 毫秒
+或攒满 AUDIT_BATCH_SIZE 条时用一条多行 INSERT 写入 audit_log。
+
+- 队列满时入队最多等待 AUDIT_ENQUEUE_TIMEOUT 秒（反压），仍满则追加写入溢出文件；
+- 数据库不可用时整批写入溢出文件，之后每次成功写入前先回放溢出文件；
+- 个别行违反约束（如用户已被删除）时逐行重试，只丢弃出错的行并打印；
+- 应用关闭时 stop() 会把队列中剩余事件全部落库（失败则落盘）；
+- submit() 不向调用方抛出异常，入队或落盘失败时记录日志，路由无需自行捕获。
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from db import get_conn, release_conn
+from admin.models.audit import AuditLogCreate
+
+
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_MS = int(os.getenv("AUDIT_FLUSH_MS", "200"))
+AUDIT_ENQUEUE_TIMEOUT = float(os.getenv("AUDIT_ENQUEUE_TIMEOUT", "0.05"))
+AUDIT_SPILL_FILE = os.getenv("AUDIT_SPILL_FILE", "./audit_spill.jsonl")
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = (
+    "user_id", "username", "action", "resource_type", "resource_id",
+    "details", "ip_address", "user_agent", "created_at",
+)
+_INSERT_SQL = f"INSERT INTO public.audit_log ({', '.join(_COLUMNS)}) VALUES %s"
+_TEMPLATE = "(%s, %s, %s, %s, %s, %s::jsonb, %s, %s, %s)"
+
+_Row = Tuple
+
+
+def _to_row(log_data: AuditLogCreate) -> _Row:
+    details = None
+    if log_data.details is not None:
+        details = json.dumps(log_data.details, ensure_ascii=False, default=str)
+    return (
+        log_data.user_id,
+        log_data.username,
+        log_data.action,
+        log_data.resource_type,
+        log_data.resource_id,
+        details,
+        log_data.ip_address,
+        log_data.user_agent,
+        datetime.now(),
+    )
+
+
+class AuditBatchWriter:
+    """有界队列 + 后台批量写入线程"""
+
+    def __init__(
+        self,
+        maxsize: int = AUDIT_QUEUE_SIZE,
+        batch_size: int = AUDIT_BATCH_SIZE,
+        flush_ms: int = AUDIT_FLUSH_MS,
+        spill_file: str = AUDIT_SPILL_FILE,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000.0
+        self.spill_file = spill_file
+        self._queue: "queue.Queue[_Row]" = queue.Queue(maxsize=maxsize)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+
+    # ---- 入队 ----
+
+    def submit(self, log_data: AuditLogCreate) -> None:
+        """放入写入队列；失败时记录日志而不抛出，审计日志不影响业务请求"""
+        try:
+            row = _to_row(log_data)
+            if self._stop.is_set():
+                # 已停止（应用关闭过程中）：同步写入
+                self._write([row])
+                return
+            if not self.running:
+                self.start()
+            try:
+                self._queue.put(row, timeout=AUDIT_ENQUEUE_TIMEOUT)
+            except queue.Full:
+                logger.warning("[audit-writer] 队列已满，审计日志 %s/%s 写入溢出文件",
+                               log_data.action, log_data.resource_type)
+                self._spill([row])
+        except Exception:
+            logger.exception("[audit-writer] 审计日志入队失败，已丢弃 %s/%s",
+                             log_data.action, log_data.resource_type)
+
+    # ---- 后台线程 ----
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 10.0) -> None:
+        """停止后台线程并写入队列中剩余的事件"""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+            self._stop.set()
+        if thread is not None:
+            thread.join(timeout)
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                break
+            self._write(batch)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _drain(self, limit: int) -> List[_Row]:
+        batch: List[_Row] = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    # ---- 写入 ----
+
+    def _write(self, batch: List[_Row]) -> None:
+        conn = None
+        try:
+            conn = get_conn()
+            self._replay_spill(conn)
+            self._insert(conn, batch)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            logger.warning("[audit-writer] 数据库不可用，%d 条审计日志写入溢出文件: %s", len(batch), e)
+            self._spill(batch)
+        except Exception:
+            logger.exception("[audit-writer] 审计日志写入失败，%d 条写入溢出文件", len(batch))
+            self._spill(batch)
+        finally:
+            if conn is not None:
+                release_conn(conn)
+
+    def _insert(self, conn, batch: List[_Row]) -> None:
+        try:
+            with conn.cursor() as cur:
+                execute_values(cur, _INSERT_SQL, batch, template=_TEMPLATE, page_size=len(batch))
+            conn.commit()
+            return
+        except (psycopg2.IntegrityError, psycopg2.DataError):
+            conn.rollback()
+        # 整批中有违反约束的行：逐行写入，丢弃出错的行
+        for row in batch:
+            try:
+                with conn.cursor() as cur:
+                    execute_values(cur, _INSERT_SQL, [row], template=_TEMPLATE)
+                conn.commit()
+            except (psycopg2.IntegrityError, psycopg2.DataError) as e:
+                conn.rollback()
+                logger.error("[audit-writer] 丢弃无法写入的审计日志 %s/%s: %s", row[2], row[3], e)
+
+    # ---- 溢出文件 ----
+
+    def _spill(self, rows: List[_Row]) -> None:
+        """追加写入溢出文件；文件不可写时记录日志，这些事件丢失"""
+        try:
+            with self._spill_lock:
+                with open(self.spill_file, "a", encoding="utf-8") as f:
+                    for row in rows:
+                        rec = dict(zip(_COLUMNS, row))
+                        rec["created_at"] = rec["created_at"].isoformat()
+                        f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        except OSError:
+            logger.exception("[audit-writer] 写入溢出文件 %s 失败，丢弃 %d 条审计日志", self.spill_file, len(rows))
+
+    def _replay_spill(self, conn) -> None:
+        """把溢出文件中的事件补写入库；中途失败时文件保留，下次整体重放（至少写入一次）"""
+        replaying = self.spill_file + ".replay"
+        with self._spill_lock:
+            if not os.path.exists(replaying):
+                if not os.path.exists(self.spill_file):
+                    return
+                os.replace(self.spill_file, replaying)
+        rows: List[_Row] = []
+        with open(replaying, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                    rec["created_at"] = datetime.fromisoformat(rec["created_at"])
+                    rows.append(tuple(rec[c] for c in _COLUMNS))
+                except (ValueError, KeyError):
+                    # 进程在写入中途退出时可能留下不完整的末行
+                    logger.warning("[audit-writer] 跳过损坏的溢出记录: %s", line[:80])
+        for i in range(0, len(rows), self.batch_size):
+            self._insert(conn, rows[i:i + self.batch_size])
+        os.remove(replaying)
+        logger.info("[audit-writer] 已从溢出文件补写 %d 条审计日志", len(rows))
+
+
+audit_writer = AuditBatchWriter()
@@ -0,0 +1,244 @@
+"""批量操作服务
+
+目标行既可以是 id 数组（绑定为 = ANY(%s)），也可以是过滤条件（如某文档下全部未审核分片）。
+按主键游标分批选取 BULK_BATCH_SIZE 行执行并逐批提交，返回实际受影响的行数；
+目标较多时作为后台任务执行（见 job_service），可随时查询进度。
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from db import get_conn, release_conn, _query, _query_one
+from utils.tagfilter import chunk_tag_clause, question_tag_clause, parse_tags
+from admin.services.job_service import JobProgress, create_job, start_job
+from utils.events import publish
+
+
+BULK_BATCH_SIZE = 1000
+MAX_BULK_BATCH_SIZE = 10000
+
+# 资源 -> (表, 主键)
+BULK_TARGETS = {
+    "chunk": ("public.chunk", "chunk_id"),
+    "doc": ("public.doc", "doc_id"),
+    "question": ("public.question", "qid"),
+}
+
+# 各资源可用的过滤字段，与对应列表接口的查询参数一致
+BULK_FILTER_FIELDS = {
+    "chunk": {"doc_id", "kind", "is_verified", "search", "quality_below", "tags", "tag_mode"},
+    "doc": {"source", "is_published", "search"},
+    "question": {"qtype", "difficulty", "source_file", "is_published", "search", "tags", "tag_mode"},
+}
+
+BULK_ACTIONS = {
+    "chunk": {"verify", "delete"},
+    "doc": {"publish", "delete"},
+    "question": {"publish", "delete"},
+}
+
+
+def _filter_clause(resource: str, filters: Dict[str, Any]) -> Tuple[List[str], List[Any]]:
+    """把过滤条件转换为 WHERE 子句；拼错的字段直接报错，避免被忽略后误伤更多行"""
+    unknown = set(filters) - BULK_FILTER_FIELDS[resource]
+    if unknown:
+        raise ValueError(f"{resource} 不支持的过滤字段: {', '.join(sorted(unknown))}")
+    where: List[str] = []
+    params: List[Any] = []
+    tags = filters.get("tags")
+    if isinstance(tags, str):
+        tags = parse_tags(tags)
+
+    def eq(column: str, key: str) -> None:
+        if filters.get(key) is not None:
+            where.append(f"{column} = %s")
+            params.append(filters[key])
+
+    if resource == "chunk":
+        eq("doc_id", "doc_id")
+        eq("kind", "kind")
+        eq("is_verified", "is_verified")
+        if filters.get("search"):
+            where.append("content_plain ILIKE %s")
+            params.append(f"%{filters['search']}%")
+        if filters.get("quality_below") is not None:
+            where.append("quality_score < %s")
+            params.append(filters["quality_below"])
+        if tags:
+            sql, p = chunk_tag_clause(tags, filters.get("tag_mode", "any"), chunk_col="chunk_id")
+            where.append(sql)
+            params.extend(p)
+    elif resource == "doc":
+        eq("source", "source")
+        eq("is_published", "is_published")
+        if filters.get("search"):
+            where.append("title ILIKE %s")
+            params.append(f"%{filters['search']}%")
+    elif resource == "question":
+        eq("qtype", "qtype")
+        eq("difficulty", "difficulty")
+        eq("source_file", "source_file")
+        eq("is_published", "is_published")
+        if filters.get("search"):
+            where.append("stem_md ILIKE %s")
+            params.append(f"%{filters['search']}%")
+        if tags:
+            sql, p = question_tag_clause(tags, filters.get("tag_mode", "any"))
+            where.append(sql)
+            params.extend(p)
+    return where, params
+
+
+def build_target(
+    resource: str,
+    ids: Optional[List[int]] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    include_deleted: bool = False,
+) -> Tuple[str, List[Any]]:
+    """返回选取目标行的 WHERE 条件与参数；ids 与 filters 至少给出一个"""
+    if resource not in BULK_TARGETS:
+        raise ValueError(f"resource 仅支持: {', '.join(BULK_TARGETS)}")
+    _, key = BULK_TARGETS[resource]
+    where: List[str] = []
+    params: List[Any] = []
+    if ids:
+        where.append(f"{key} = ANY(%s)")
+        params.append(list(ids))
+    if filters:
+        f_where, f_params = _filter_clause(resource, filters)
+        where.extend(f_where)
+        params.extend(f_params)
+    if not where:
+        raise ValueError("必须提供 ids 或至少一个过滤条件")
+    if not include_deleted:
+        where.append("deleted_at IS NULL")
+    return " AND ".join(where), params
+
+
+def _apply_sql(resource: str, action: str, value: bool, hard_delete: bool) -> List[Tuple[str, Callable[[List[int]], List[Any]]]]:
+    """
+    对一批主键执行的语句及其参数构造函数；第一条语句的 rowcount 计为实际影响数。
+    更新只改动状态确实变化的行，重复执行不会重复计数。
+    """
+    table, key = BULK_TARGETS[resource]
+    if action == "delete":
+        if hard_delete:
+            return [(f"DELETE FROM {table} WHERE {key} = ANY(%s)", lambda keys: [keys])]
+        stmts = [(f"UPDATE {table} SET deleted_at = now() WHERE {key} = ANY(%s) AND deleted_at IS NULL", lambda keys: [keys])]
+        if resource == "doc":
+            # 软删除文档时同时软删除其分片
+            stmts.append(("UPDATE public.chunk SET deleted_at = now() WHERE doc_id = ANY(%s) AND deleted_at IS NULL", lambda keys: [keys]))
+        return stmts
+    column = "is_verified" if action == "verify" else "is_published"
+    return [(
+        f"UPDATE {table} SET {column} = %s WHERE {key} = ANY(%s) AND {column} IS DISTINCT FROM %s",
+        lambda keys: [value, keys, value],
+    )]
+
+
+def count_targets(resource: str, where_sql: str, params: List[Any]) -> int:
+    table, _ = BULK_TARGETS[resource]
+    conn = get_conn()
+    try:
+        row = _query_one(conn, f"SELECT COUNT(*) AS total FROM {table} WHERE {where_sql}", params)
+        return int(row["total"]) if row else 0
+    finally:
+        release_conn(conn)
+
+
+def run_bulk(
+    resource: str,
+    action: str,
+    where_sql: str,
+    params: List[Any],
+    value: bool = True,
+    hard_delete: bool = False,
+    batch_size: int = BULK_BATCH_SIZE,
+    progress=None,
+) -> Dict[str, int]:
+    """
+    按主键游标分批执行批量操作，每批单独提交，有实际影响的批次提交后发布 <resource>.bulk_changed。
+    progress 为 JobProgress 时逐批上报进度。返回 {"matched", "affected"}。
+    """
+    if action not in BULK_ACTIONS.get(resource, ()):
+        raise ValueError(f"{resource} 仅支持操作: {', '.join(sorted(BULK_ACTIONS.get(resource, ())))}")
+    table, key = BULK_TARGETS[resource]
+    stmts = _apply_sql(resource, action, value, hard_delete)
+    matched = 0
+    affected = 0
+    last_key = 0
+    conn = get_conn()
+    try:
+        while True:
+            rows = _query(
+                conn,
+                f"""
+                SELECT {key} AS k FROM {table}
+                WHERE {key} > %s AND {where_sql}
+                ORDER BY {key}
+                LIMIT %s
+                """,
+                [last_key] + params + [batch_size]
+            )
+            if not rows:
+                break
+            keys = [r["k"] for r in rows]
+            last_key = keys[-1]
+            batch_affected = 0
+            with conn.cursor() as cur:
+                for i, (sql, build_params) in enumerate(stmts):
+                    cur.execute(sql, build_params(keys))
+                    if i == 0:
+                        batch_affected = cur.rowcount
+            conn.commit()
+            matched += len(keys)
+            affected += batch_affected
+            if batch_affected:
+                publish(f"{resource}.bulk_changed", {
+                    "action": action, "ids": keys, "value": value, "hard_delete": hard_delete,
+                })
+            if progress is not None:
+                progress.advance(len(keys), batch_affected)
+        return {"matched": matched, "affected": affected}
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        release_conn(conn)
+
+
+def submit_bulk(
+    resource: str,
+    action: str,
+    ids: Optional[List[int]] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    value: bool = True,
+    hard_delete: bool = False,
+    batch_size: int = BULK_BATCH_SIZE,
+    created_by: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    执行批量操作：只给出不超过一批的 ids 时同步执行并返回计数；
+    否则登记为后台任务，返回 job_id，进度通过 /admin/jobs/{job_id} 查询。
+    """
+    if action not in BULK_ACTIONS.get(resource, ()):
+        raise ValueError(f"{resource} 仅支持操作: {', '.join(sorted(BULK_ACTIONS.get(resource, ())))}")
+    batch_size = max(1, min(int(batch_size), MAX_BULK_BATCH_SIZE))
+    # 硬删除也要能清理已软删除的行
+    where_sql, params = build_target(resource, ids, filters, include_deleted=hard_delete)
+
+    if ids and not filters and len(ids) <= batch_size:
+        result = run_bulk(resource, action, where_sql, params, value, hard_delete, batch_size)
+        return {"job_id": None, **result}
+
+    job_id = create_job(
+        f"bulk_{action}_{resource}",
+        {"ids_count": len(ids or []), "filters": filters or {}, "value": value,
+         "hard_delete": hard_delete, "batch_size": batch_size},
+        created_by,
+    )
+
+    def task(progress: JobProgress) -> Dict[str, int]:
+        progress.set_total(count_targets(resource, where_sql, params))
+        return run_bulk(resource, action, where_sql, params, value, hard_delete, batch_size, progress=progress)
+
+    start_job(job_id, task)
+    return {"job_id": job_id}
@@ -1,18 +1,29 @@
 """分片管理服务"""
 from typing import Optional, List, Dict, Any
 
-from db import get_conn, release_conn, _query, _query_one, _execute
+from db import get_conn, release_conn, _query, _query_one
+from utils.tagfilter import chunk_tag_clause
+from utils.categoryfilter import doc_category_clause
+from admin.services.bulk_service import build_target, run_bulk
+from admin.services.job_service import JobProgress, create_job, start_job
+from dedup import index_signatures
+from ingest import classify_kind, derive_chunk_fields, get_kind_matcher, load_kind_rules
+from quality import QUALITY_BATCH_SIZE, rescore_chunks, score_batch
+from utils.events import publish
 
 
 def list_chunks(
     doc_id: Optional[int] = None,
     kind: Optional[str] = None,
     search: Optional[str] = None,
+    tags: Optional[List[str]] = None,
+    tag_mode: str = "any",
     verified_only: Optional[bool] = None,
+    category: Optional[int] = None,
     limit: int = 20,
     offset: int = 0
 ) -> tuple[List[Dict[str, Any]], int]:
-    """获取分片列表"""
+    """获取分片列表；category 为分类 id，包含其全部子分类"""
     conn = get_conn()
     try:
         where_clauses = ["c.deleted_at IS NULL"]
@@ -34,6 +45,16 @@ def list_chunks(
             where_clauses.append("c.is_verified = %s")
             params.append(verified_only)
         
+        if tags:
+            tag_sql, tag_params = chunk_tag_clause(tags, tag_mode)
+            where_clauses.append(tag_sql)
+            params.extend(tag_params)
+        
+        if category is not None:
+            cat_sql, cat_params = doc_category_clause(category, "c.doc_id")
+            where_clauses.append(cat_sql)
+            params.extend(cat_params)
+        
         where_sql = " AND ".join(where_clauses)
         
         chunks = _query(
@@ -84,113 +105,114 @@ def get_chunk_detail(chunk_id: int) -> Optional[Dict[str, Any]]:
 
 
 def update_chunk(chunk_id: int, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    """更新分片"""
+    """
+    更新分片。content_md 变化时在服务端重算派生列（content_plain / canonical / tokens / simhash），
+    并在未显式指定时按新内容重新分类与评分；同一事务内更新该行的 LSH 签名并清空过期的向量。
+    提交后发布 chunk.updated 事件。
+    """
     conn = get_conn()
     try:
-        update_fields = []
-        params = []
-        
+        # content_plain 由 content_md 派生，不接受客户端直接写入
         allowed_fields = [
-            "content_md", "content_plain", "kind", "heading_h1", "heading_h2",
+            "content_md", "kind", "heading_h1", "heading_h2",
             "is_verified", "quality_score"
         ]
-        
-        for field in allowed_fields:
-            if field in updates:
-                update_fields.append(f"{field} = %s")
-                params.append(updates[field])
-        
-        if not update_fields:
+        values = {f: updates[f] for f in allowed_fields if f in updates}
+        if not values:
             return get_chunk_detail(chunk_id)
-        
-        params.append(chunk_id)
-        
+
+        current = _query_one(
+            conn,
+            "SELECT * FROM public.chunk WHERE chunk_id = %s AND deleted_at IS NULL FOR UPDATE",
+            (chunk_id,)
+        )
+        if not current:
+            conn.rollback()
+            return None
+
+        content_changed = "content_md" in values and values["content_md"] != current["content_md"]
+        if content_changed:
+            values.update(derive_chunk_fields(values["content_md"]))
+            if "kind" not in updates:
+                values["kind"] = classify_kind(values["content_md"])
+            if "embedding" in current:
+                values["embedding"] = None
+        if (content_changed or "heading_h2" in values) and "quality_score" not in updates:
+            values["quality_score"] = score_batch([(
+                values.get("content_md", current["content_md"]),
+                values.get("content_plain", current["content_plain"]),
+                values.get("heading_h2", current["heading_h2"]),
+            )], get_kind_matcher())[0]
+
         with conn.cursor() as cur:
             cur.execute(
                 f"""
                 UPDATE public.chunk
-                SET {', '.join(update_fields)}
-                WHERE chunk_id = %s AND deleted_at IS NULL
+                SET {', '.join(f"{f} = %s" for f in values)}
+                WHERE chunk_id = %s
                 RETURNING *
                 """,
-                params
+                list(values.values()) + [chunk_id]
             )
             row = cur.fetchone()
-            if not row:
-                return None
             cols = [d[0] for d in cur.description]
             chunk = dict(zip(cols, row))
-        
+            if content_changed:
+                if values["simhash"] is None:
+                    cur.execute(
+                        "DELETE FROM public.lsh_bucket WHERE item_type = 'chunk' AND item_id = %s",
+                        (chunk_id,)
+                    )
+                else:
+                    index_signatures(cur, "chunk", [(chunk_id, values["simhash"])])
+
         conn.commit()
-        return chunk
+    except Exception:
+        conn.rollback()
+        raise
     finally:
         release_conn(conn)
 
+    publish("chunk.updated", {"chunk_id": chunk_id, "doc_id": chunk["doc_id"], "fields": sorted(values)})
+    return chunk
+
 
 def delete_chunk(chunk_id: int, hard_delete: bool = False) -> bool:
     """删除分片"""
     conn = get_conn()
     try:
         if hard_delete:
-            _execute(conn, "DELETE FROM public.chunk WHERE chunk_id = %s", (chunk_id,))
+            row = _query_one(conn, "DELETE FROM public.chunk WHERE chunk_id = %s RETURNING doc_id", (chunk_id,))
         else:
-            _execute(
+            row = _query_one(
                 conn,
-                "UPDATE public.chunk SET deleted_at = now() WHERE chunk_id = %s",
+                "UPDATE public.chunk SET deleted_at = now() WHERE chunk_id = %s RETURNING doc_id",
                 (chunk_id,)
             )
         
         conn.commit()
-        return True
     finally:
         release_conn(conn)
 
+    if row:
+        publish("chunk.deleted", {"chunk_id": chunk_id, "doc_id": row["doc_id"], "hard_delete": hard_delete})
+    return True
+
 
 def batch_verify_chunks(chunk_ids: List[int], verified: bool = True) -> int:
-    """批量审核分片"""
+    """批量审核分片，返回审核状态实际发生变化的分片数"""
     if not chunk_ids:
         return 0
-    
-    conn = get_conn()
-    try:
-        placeholders = ','.join(['%s'] * len(chunk_ids))
-        _execute(
-            conn,
-            f"UPDATE public.chunk SET is_verified = %s WHERE chunk_id IN ({placeholders})",
-            [verified] + chunk_ids
-        )
-        conn.commit()
-        return len(chunk_ids)
-    finally:
-        release_conn(conn)
+    where_sql, params = build_target("chunk", chunk_ids)
+    return run_bulk("chunk", "verify", where_sql, params, value=verified)["affected"]
 
 
 def batch_delete_chunks(chunk_ids: List[int], hard_delete: bool = False) -> int:
-    """批量删除分片"""
+    """批量删除分片，返回实际删除的分片数"""
     if not chunk_ids:
         return 0
-    
-    conn = get_conn()
-    try:
-        placeholders = ','.join(['%s'] * len(chunk_ids))
-        
-        if hard_delete:
-            _execute(
-                conn,
-                f"DELETE FROM public.chunk WHERE chunk_id IN ({placeholders})",
-                chunk_ids
-            )
-        else:
-            _execute(
-                conn,
-                f"UPDATE public.chunk SET deleted_at = now() WHERE chunk_id IN ({placeholders})",
-                chunk_ids
-            )
-        
-        conn.commit()
-        return len(chunk_ids)
-    finally:
-        release_conn(conn)
+    where_sql, params = build_target("chunk", chunk_ids, include_deleted=hard_delete)
+    return run_bulk("chunk", "delete", where_sql, params, hard_delete=hard_delete)["affected"]
 
 
 def get_chunk_stats() -> Dict[str, Any]:
@@ -217,3 +239,41 @@ def get_chunk_stats() -> Dict[str, Any]:
     finally:
         release_conn(conn)
 
+
+def submit_quality_backfill(
+    doc_id: Optional[int] = None,
+    only_unscored: bool = True,
+    batch_size: int = QUALITY_BATCH_SIZE,
+    created_by: Optional[int] = None,
+) -> int:
+    """登记并启动分片质量评分补算任务，返回 job_id"""
+    if batch_size < 1:
+        raise ValueError("batch_size 必须大于 0")
+    job_id = create_job(
+        "quality_backfill",
+        {"doc_id": doc_id, "only_unscored": only_unscored, "batch_size": batch_size},
+        created_by,
+    )
+
+    def task(progress: JobProgress) -> Dict[str, int]:
+        where = ["deleted_at IS NULL"]
+        params: List[Any] = []
+        if doc_id is not None:
+            where.append("doc_id = %s")
+            params.append(doc_id)
+        if only_unscored:
+            where.append("COALESCE(quality_score, 0) = 0")
+        conn = get_conn()
+        try:
+            rules = load_kind_rules(conn)
+            row = _query_one(
+                conn, f"SELECT COUNT(*) AS total FROM public.chunk WHERE {' AND '.join(where)}", params
+            )
+        finally:
+            release_conn(conn)
+        progress.set_total(int(row["total"]) if row else 0)
+        return rescore_chunks(rules, doc_id=doc_id, only_unscored=only_unscored,
+                              batch_size=batch_size, progress=progress)
+
+    start_job(job_id, task)
+    return job_id
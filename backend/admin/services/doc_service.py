@@ -2,15 +2,18 @@
 from typing import Optional, List, Dict, Any
 
 from db import get_conn, release_conn, _query, _query_one, _execute
+from utils.categoryfilter import doc_category_clause
+from admin.services.bulk_service import build_target, run_bulk
 
 
 def list_docs(
     source: Optional[str] = None,
     search: Optional[str] = None,
+    category: Optional[int] = None,
     limit: int = 20,
     offset: int = 0
 ) -> tuple[List[Dict[str, Any]], int]:
-    """获取文档列表"""
+    """获取文档列表；category 为分类 id，包含其全部子分类"""
     conn = get_conn()
     try:
         where_clauses = ["d.deleted_at IS NULL"]
@@ -24,6 +27,11 @@ def list_docs(
             where_clauses.append("d.title ILIKE %s")
             params.append(f"%{search}%")
         
+        if category is not None:
+            cat_sql, cat_params = doc_category_clause(category)
+            where_clauses.append(cat_sql)
+            params.extend(cat_params)
+        
         where_sql = " AND ".join(where_clauses)
         
         docs = _query(
@@ -31,11 +39,9 @@ def list_docs(
             f"""
             SELECT d.doc_id, d.title, d.chapter, d.section_number, d.source,
                    d.source_filename, d.is_published, d.created_at, d.updated_at,
-                   COUNT(c.chunk_id) as chunk_count
+                   d.chunk_count, d.total_tokens, d.avg_quality
             FROM public.doc d
-            LEFT JOIN public.chunk c ON d.doc_id = c.doc_id AND c.deleted_at IS NULL
             WHERE {where_sql}
-            GROUP BY d.doc_id
             ORDER BY d.created_at DESC
             LIMIT %s OFFSET %s
             """,
@@ -61,14 +67,9 @@ def get_doc_detail(doc_id: int) -> Optional[Dict[str, Any]]:
         doc = _query_one(
             conn,
             """
-            SELECT d.*, 
-                   COUNT(c.chunk_id) as chunk_count,
-                   SUM(c.tokens) as total_tokens,
-                   AVG(c.quality_score) as avg_quality
+            SELECT d.*
             FROM public.doc d
-            LEFT JOIN public.chunk c ON d.doc_id = c.doc_id AND c.deleted_at IS NULL
             WHERE d.doc_id = %s AND d.deleted_at IS NULL
-            GROUP BY d.doc_id
             """,
             (doc_id,)
         )
@@ -145,34 +146,24 @@ def delete_doc(doc_id: int, hard_delete: bool = False) -> bool:
 
 
 def batch_delete_docs(doc_ids: List[int], hard_delete: bool = False) -> int:
-    """批量删除文档"""
+    """批量删除文档（软删除时同时软删除其分片），返回实际删除的文档数"""
     if not doc_ids:
         return 0
-    
+    where_sql, params = build_target("doc", doc_ids, include_deleted=hard_delete)
+    return run_bulk("doc", "delete", where_sql, params, hard_delete=hard_delete)["affected"]
+
+
+def rebuild_doc_rollups(doc_ids: Optional[List[int]] = None) -> int:
+    """按分片重算文档汇总列（chunk_count / total_tokens / avg_quality），返回被修正的文档数"""
     conn = get_conn()
     try:
-        placeholders = ','.join(['%s'] * len(doc_ids))
-        
-        if hard_delete:
-            _execute(
-                conn,
-                f"DELETE FROM public.doc WHERE doc_id IN ({placeholders})",
-                doc_ids
-            )
-        else:
-            _execute(
-                conn,
-                f"UPDATE public.doc SET deleted_at = now() WHERE doc_id IN ({placeholders})",
-                doc_ids
-            )
-            _execute(
-                conn,
-                f"UPDATE public.chunk SET deleted_at = now() WHERE doc_id IN ({placeholders}) AND deleted_at IS NULL",
-                doc_ids
-            )
-        
+        row = _query_one(
+            conn,
+            "SELECT public.doc_rollup_recompute(%s::bigint[]) AS fixed",
+            (doc_ids or None,)
+        )
         conn.commit()
-        return len(doc_ids)
+        return int(row["fixed"]) if row else 0
     finally:
         release_conn(conn)
 
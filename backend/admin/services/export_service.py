@@ -0,0 +1,87 @@
+"""数据导出服务
+
+整表导出经服务端命名游标按批读取、逐批编码与压缩（见 utils/export.py），
+不在内存中构造完整结果，导出任意大小的表占用的内存都只与批大小有关。
+"""
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from db import get_conn, release_conn
+from utils.export import EXPORT_BATCH_SIZE, iter_cursor_batches, stream_export
+
+
+MAX_EXPORT_BATCH_SIZE = 10000
+
+# 资源 -> (表, 排序列, 导出列)
+EXPORT_RESOURCES: Dict[str, Tuple[str, str, List[str]]] = {
+    "docs": ("public.doc", "doc_id", [
+        "doc_id", "title", "chapter", "section_number", "source_filename", "source", "sha256",
+        "is_published", "chunk_count", "total_tokens", "avg_quality",
+        "created_at", "updated_at", "deleted_at",
+    ]),
+    "chunks": ("public.chunk", "chunk_id", [
+        "chunk_id", "doc_id", "kind", "heading_h1", "heading_h2", "anchor",
+        "content_md", "content_plain", "tokens", "quality_score", "is_verified",
+        "created_at", "updated_at", "deleted_at",
+    ]),
+    "questions": ("public.question", "qid", [
+        "qid", "qtype", "stem_md", "options_json", "answer_text", "explanation_md",
+        "tags", "difficulty", "source_file", "is_published", "usage_count",
+        "created_at", "updated_at", "deleted_at",
+    ]),
+    "audit": ("public.audit_log", "created_at, log_id", [
+        "log_id", "user_id", "username", "action", "resource_type", "resource_id",
+        "details", "ip_address", "user_agent", "created_at",
+    ]),
+}
+
+
+def build_export_query(
+    resource: str,
+    include_deleted: bool = False,
+    doc_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+) -> Tuple[str, List[Any]]:
+    """生成导出查询；审计日志按时间范围过滤（可裁剪月分区），其余资源默认不含已软删除的行"""
+    if resource not in EXPORT_RESOURCES:
+        raise ValueError(f"仅支持导出: {', '.join(EXPORT_RESOURCES)}")
+    table, order_by, columns = EXPORT_RESOURCES[resource]
+    where: List[str] = []
+    params: List[Any] = []
+    if resource == "audit":
+        if date_from is not None:
+            where.append("created_at >= %s")
+            params.append(date_from)
+        if date_to is not None:
+            where.append("created_at < %s")
+            params.append(date_to)
+    else:
+        if not include_deleted:
+            where.append("deleted_at IS NULL")
+        if doc_id is not None and resource in ("docs", "chunks"):
+            where.append("doc_id = %s")
+            params.append(doc_id)
+    sql = f"SELECT {', '.join(columns)} FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {order_by}"
+    return sql, params
+
+
+def stream_resource(
+    sql: str,
+    params: List[Any],
+    fmt: str,
+    compression: str = "none",
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> Iterator[bytes]:
+    """流式产出导出文件内容；连接在迭代结束（或客户端断开）时归还"""
+    batch_size = max(1, min(batch_size, MAX_EXPORT_BATCH_SIZE))
+    conn = get_conn()
+    try:
+        yield from stream_export(iter_cursor_batches(conn, sql, params, batch_size), fmt, compression)
+    finally:
+        # 只读事务，结束命名游标
+        conn.rollback()
+        release_conn(conn)
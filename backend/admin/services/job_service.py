@@ -0,0 +1,104 @@
+"""后台任务服务
+
+批量操作等长任务在后台线程中执行，状态与进度记录在 admin_job 表中，
+任一工作进程都能查询。进程重启时仍为 running 的任务不会自动恢复。
+"""
+import json
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from db import get_conn, release_conn, _query, _query_one, _execute
+
+
+class JobProgress:
+    """任务函数用来上报总数与进度"""
+
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+        self.processed = 0
+        self.affected = 0
+
+    def set_total(self, total: int) -> None:
+        _update_job(self.job_id, total=total)
+
+    def advance(self, processed: int, affected: int) -> None:
+        self.processed += processed
+        self.affected += affected
+        _update_job(self.job_id, processed=self.processed, affected=self.affected)
+
+
+def _update_job(job_id: int, **fields: Any) -> None:
+    if not fields:
+        return
+    sets = ", ".join(f"{k} = %s" for k in fields)
+    conn = get_conn()
+    try:
+        _execute(conn, f"UPDATE public.admin_job SET {sets} WHERE job_id = %s", list(fields.values()) + [job_id])
+        conn.commit()
+    finally:
+        release_conn(conn)
+
+
+def create_job(kind: str, params: Dict[str, Any], created_by: Optional[int] = None) -> int:
+    """登记任务，返回 job_id"""
+    conn = get_conn()
+    try:
+        row = _query_one(
+            conn,
+            """
+            INSERT INTO public.admin_job (kind, params, created_by)
+            VALUES (%s, %s::jsonb, %s)
+            RETURNING job_id
+            """,
+            (kind, json.dumps(params, ensure_ascii=False, default=str), created_by)
+        )
+        conn.commit()
+        return int(row["job_id"])
+    finally:
+        release_conn(conn)
+
+
+def start_job(job_id: int, fn: Callable[[JobProgress], Optional[Dict[str, Any]]]) -> None:
+    """在后台线程中执行 fn(progress)，返回值写入 result"""
+
+    def run():
+        progress = JobProgress(job_id)
+        _update_job(job_id, status="running", started_at=datetime.now())
+        try:
+            result = fn(progress)
+            _update_job(
+                job_id,
+                status="succeeded",
+                result=json.dumps(result or {}, ensure_ascii=False, default=str),
+                finished_at=datetime.now(),
+            )
+        except Exception as e:
+            print(f"[admin-job] 任务 {job_id} 失败: {e}")
+            _update_job(job_id, status="failed", error=str(e)[:2000], finished_at=datetime.now())
+
+    threading.Thread(target=run, name=f"admin-job-{job_id}", daemon=True).start()
+
+
+def get_job(job_id: int) -> Optional[Dict[str, Any]]:
+    """获取任务状态"""
+    conn = get_conn()
+    try:
+        return _query_one(conn, "SELECT * FROM public.admin_job WHERE job_id = %s", (job_id,))
+    finally:
+        release_conn(conn)
+
+
+def list_jobs(kind: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+    """最近的任务列表"""
+    conn = get_conn()
+    try:
+        if kind:
+            return _query(
+                conn,
+                "SELECT * FROM public.admin_job WHERE kind = %s ORDER BY job_id DESC LIMIT %s",
+                (kind, limit)
+            )
+        return _query(conn, "SELECT * FROM public.admin_job ORDER BY job_id DESC LIMIT %s", (limit,))
+    finally:
+        release_conn(conn)
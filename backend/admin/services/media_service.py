@@ -0,0 +1,58 @@
+"""题库图片存储服务"""
+import os
+from typing import Dict, Any, Optional
+
+from db import get_conn, release_conn, _query_one
+from media_store import GC_GRACE_SECONDS, iter_stored_images, collect_garbage, rebuild_refcounts
+
+
+def get_image_store_stats() -> Dict[str, Any]:
+    """图片存储概况：磁盘文件数与大小、引用计数情况"""
+    files = 0
+    total_bytes = 0
+    for _sha, path in iter_stored_images():
+        try:
+            total_bytes += os.path.getsize(path)
+        except OSError:
+            continue
+        files += 1
+
+    conn = get_conn()
+    try:
+        refs = _query_one(
+            conn,
+            """
+            SELECT
+              COUNT(*) AS tracked,
+              COUNT(*) FILTER (WHERE ref_count > 0) AS referenced,
+              COUNT(*) FILTER (WHERE ref_count <= 0) AS orphaned,
+              COALESCE(SUM(ref_count), 0) AS total_refs
+            FROM public.qimg
+            """
+        )
+    finally:
+        release_conn(conn)
+
+    return {"files": files, "bytes": total_bytes, **(refs or {})}
+
+
+def run_image_gc(dry_run: bool = False, grace_seconds: Optional[int] = None) -> Dict[str, Any]:
+    """清理无引用的图片文件"""
+    conn = get_conn()
+    try:
+        return collect_garbage(
+            conn,
+            grace_seconds=GC_GRACE_SECONDS if grace_seconds is None else grace_seconds,
+            dry_run=dry_run,
+        )
+    finally:
+        release_conn(conn)
+
+
+def rebuild_image_refs() -> int:
+    """按题目内容重算图片引用计数"""
+    conn = get_conn()
+    try:
+        return rebuild_refcounts(conn)
+    finally:
+        release_conn(conn)
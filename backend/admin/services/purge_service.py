@@ -0,0 +1,169 @@
+"""软删除清理服务
+
+软删除只设置 deleted_at，行及其 trigram 索引项会一直保留。本服务把软删除超过
+SOFT_DELETE_RETENTION_DAYS 天的分片、文档、题目分批（每批 PURGE_BATCH_SIZE 行，逐批提交）硬删除：
+
+- chunk_tag 随分片经外键级联删除，lsh_bucket 中对应的签名同步删除；
+- 题目删除后由触发器减少图片引用计数，随后回收无引用的图片文件；
+- 最后对有删除的表执行 VACUUM (ANALYZE)，回收空间并更新统计信息。
+
+硬删除不可恢复，默认不自动清理（SOFT_DELETE_RETENTION_DAYS=0）；设为正数后，周期任务在启动
+约一分钟后执行一次，此后每天执行一次。
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from db import get_conn, release_conn, _query_one
+from media_store import collect_garbage
+from utils.background import PeriodicWorker
+
+
+SOFT_DELETE_RETENTION_DAYS = int(os.getenv("SOFT_DELETE_RETENTION_DAYS", "0"))
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "500"))
+
+# 清理顺序：先分片（含已删除文档下的分片），再文档，最后题目
+PURGE_TARGETS = [
+    ("chunk", "public.chunk", "chunk_id"),
+    ("doc", "public.doc", "doc_id"),
+    ("question", "public.question", "qid"),
+]
+
+
+def count_purgeable(older_than_days: int = SOFT_DELETE_RETENTION_DAYS) -> Dict[str, int]:
+    """统计各表中可清理（软删除超过 older_than_days 天）的行数"""
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+    conn = get_conn()
+    try:
+        counts = {}
+        for name, table, _key in PURGE_TARGETS:
+            row = _query_one(
+                conn,
+                f"SELECT COUNT(*) AS total FROM {table} WHERE deleted_at IS NOT NULL AND deleted_at < %s",
+                (cutoff,)
+            )
+            counts[name] = int(row["total"]) if row else 0
+        return counts
+    finally:
+        release_conn(conn)
+
+
+def _purge_batch(conn, name: str, table: str, key: str, cutoff: datetime, batch_size: int) -> int:
+    """硬删除一批过期的软删除行并提交，返回删除的行数"""
+    with conn.cursor() as cur:
+        if name == "doc":
+            # 文档下残留的分片会被外键级联删除，先显式删除以便清理其 LSH 签名
+            cur.execute(
+                """
+                DELETE FROM public.chunk
+                WHERE doc_id IN (
+                    SELECT doc_id FROM public.doc
+                    WHERE deleted_at IS NOT NULL AND deleted_at < %s
+                    ORDER BY doc_id
+                    LIMIT %s
+                )
+                RETURNING chunk_id
+                """,
+                (cutoff, batch_size)
+            )
+            chunk_ids = [r[0] for r in cur.fetchall()]
+            if chunk_ids:
+                cur.execute(
+                    "DELETE FROM public.lsh_bucket WHERE item_type = 'chunk' AND item_id = ANY(%s)",
+                    (chunk_ids,)
+                )
+        cur.execute(
+            f"""
+            DELETE FROM {table}
+            WHERE {key} IN (
+                SELECT {key} FROM {table}
+                WHERE deleted_at IS NOT NULL AND deleted_at < %s
+                ORDER BY {key}
+                LIMIT %s
+            )
+            RETURNING {key}
+            """,
+            (cutoff, batch_size)
+        )
+        ids = [r[0] for r in cur.fetchall()]
+        if ids and name != "doc":
+            cur.execute(
+                "DELETE FROM public.lsh_bucket WHERE item_type = %s AND item_id = ANY(%s)",
+                (name, ids)
+            )
+    conn.commit()
+    return len(ids)
+
+
+def vacuum_tables(tables: List[str]) -> None:
+    """VACUUM (ANALYZE) 指定的表；VACUUM 不能在事务中执行，需临时切换为自动提交"""
+    conn = get_conn()
+    previous = conn.autocommit
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            for table in tables:
+                cur.execute(f"VACUUM (ANALYZE) {table}")
+    finally:
+        conn.autocommit = previous
+        release_conn(conn)
+
+
+def purge_soft_deleted(
+    older_than_days: int = SOFT_DELETE_RETENTION_DAYS,
+    batch_size: int = PURGE_BATCH_SIZE,
+    vacuum: bool = True,
+) -> Dict[str, Any]:
+    """
+    硬删除软删除超过 older_than_days 天的分片、文档、题目。
+    返回各表删除行数、图片回收结果与执行了 VACUUM 的表。
+    """
+    if older_than_days < 0:
+        raise ValueError("older_than_days 不能为负数")
+    batch_size = max(1, batch_size)
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+
+    purged: Dict[str, int] = {}
+    conn = get_conn()
+    try:
+        for name, table, key in PURGE_TARGETS:
+            total = 0
+            while True:
+                n = _purge_batch(conn, name, table, key, cutoff, batch_size)
+                total += n
+                if n < batch_size:
+                    break
+            purged[name] = total
+
+        images = None
+        if purged["question"]:
+            images = collect_garbage(conn)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        release_conn(conn)
+
+    vacuumed: List[str] = []
+    if vacuum:
+        if purged["chunk"] or purged["doc"]:
+            vacuumed += ["public.chunk", "public.chunk_tag", "public.doc"]
+        if purged["question"]:
+            vacuumed += ["public.question", "public.qimg"]
+        if purged["chunk"] or purged["doc"] or purged["question"]:
+            vacuumed.append("public.lsh_bucket")
+        if vacuumed:
+            vacuum_tables(vacuumed)
+
+    return {"purged": purged, "images": images, "vacuumed": vacuumed, "cutoff": cutoff}
+
+
+def _scheduled_purge() -> None:
+    if SOFT_DELETE_RETENTION_DAYS <= 0:
+        return
+    result = purge_soft_deleted()
+    if any(result["purged"].values()):
+        print(f"[soft-delete-purge] 已清理 {result['purged']}")
+
+
+purge_worker = PeriodicWorker("soft-delete-purge", 86400, _scheduled_purge, initial_delay=60)
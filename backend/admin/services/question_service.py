@@ -1,13 +1,21 @@
 """题库管理服务"""
+import json
 from typing import Optional, List, Dict, Any
 
-from db import get_conn, release_conn, _query, _query_one, _execute
+from db import get_conn, release_conn, _query, _query_one
+from utils.tagfilter import question_tag_clause
+from admin.services.bulk_service import build_target, run_bulk
+from dedup import index_signatures, question_signature_text, simhash
+from ingest_qbank import question_sha256
+from utils.events import publish
 
 
 def list_questions(
     qtype: Optional[str] = None,
     difficulty: Optional[int] = None,
     search: Optional[str] = None,
+    tags: Optional[List[str]] = None,
+    tag_mode: str = "any",
     limit: int = 20,
     offset: int = 0
 ) -> tuple[List[Dict[str, Any]], int]:
@@ -29,6 +37,11 @@ def list_questions(
             where_clauses.append("stem_md ILIKE %s")
             params.append(f"%{search}%")
         
+        if tags:
+            tag_sql, tag_params = question_tag_clause(tags, tag_mode)
+            where_clauses.append(tag_sql)
+            params.extend(tag_params)
+        
         where_sql = " AND ".join(where_clauses)
         
         questions = _query(
@@ -74,95 +87,114 @@ def get_question_detail(qid: int) -> Optional[Dict[str, Any]]:
         release_conn(conn)
 
 
+# 参与去重哈希 / 近重复签名的内容列
+_CONTENT_FIELDS = ("stem_md", "options_json", "answer_text", "explanation_md")
+
+
 def update_question(qid: int, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    """更新题目"""
+    """
+    更新题目。内容列变化时在服务端重算 sha256 与 simhash，同一事务内更新该题的 LSH 签名；
+    与其他题目内容完全相同时抛出 ValueError。提交后发布 question.updated 事件。
+    """
     conn = get_conn()
     try:
-        update_fields = []
-        params = []
-        
         allowed_fields = [
             "qtype", "stem_md", "options_json", "answer_text",
             "explanation_md", "tags", "difficulty", "is_published"
         ]
-        
-        for field in allowed_fields:
-            if field in updates:
-                update_fields.append(f"{field} = %s")
-                params.append(updates[field])
-        
-        if not update_fields:
+        values = {f: updates[f] for f in allowed_fields if f in updates}
+        if not values:
             return get_question_detail(qid)
-        
-        params.append(qid)
-        
+
+        current = _query_one(
+            conn,
+            "SELECT * FROM public.question WHERE qid = %s AND deleted_at IS NULL FOR UPDATE",
+            (qid,)
+        )
+        if not current:
+            conn.rollback()
+            return None
+
+        content = {f: values.get(f, current[f]) for f in _CONTENT_FIELDS}
+        content_changed = any(content[f] != current[f] for f in _CONTENT_FIELDS)
+        if content_changed:
+            sha = question_sha256(content["stem_md"], content["options_json"],
+                                  content["answer_text"], content["explanation_md"])
+            other = _query_one(
+                conn,
+                "SELECT qid FROM public.question WHERE sha256 = %s AND qid <> %s",
+                (sha, qid)
+            )
+            if other:
+                raise ValueError(f"修改后与题目 {other['qid']} 内容相同")
+            values["sha256"] = sha
+            values["simhash"] = simhash(question_signature_text(content["stem_md"], content["options_json"]))
+
+        params = [
+            json.dumps(v, ensure_ascii=False) if f == "options_json" and v is not None else v
+            for f, v in values.items()
+        ]
         with conn.cursor() as cur:
             cur.execute(
                 f"""
                 UPDATE public.question
-                SET {', '.join(update_fields)}
-                WHERE qid = %s AND deleted_at IS NULL
+                SET {', '.join(f"{f} = %s" for f in values)}
+                WHERE qid = %s
                 RETURNING *
                 """,
-                params
+                params + [qid]
             )
             row = cur.fetchone()
-            if not row:
-                return None
             cols = [d[0] for d in cur.description]
             question = dict(zip(cols, row))
-        
+            if content_changed:
+                if values["simhash"] is None:
+                    cur.execute(
+                        "DELETE FROM public.lsh_bucket WHERE item_type = 'question' AND item_id = %s",
+                        (qid,)
+                    )
+                else:
+                    index_signatures(cur, "question", [(qid, values["simhash"])])
+
         conn.commit()
-        return question
+    except Exception:
+        conn.rollback()
+        raise
     finally:
         release_conn(conn)
 
+    publish("question.updated", {"qid": qid, "fields": sorted(values)})
+    return question
+
 
 def delete_question(qid: int, hard_delete: bool = False) -> bool:
     """删除题目"""
     conn = get_conn()
     try:
         if hard_delete:
-            _execute(conn, "DELETE FROM public.question WHERE qid = %s", (qid,))
+            row = _query_one(conn, "DELETE FROM public.question WHERE qid = %s RETURNING qid", (qid,))
         else:
-            _execute(
+            row = _query_one(
                 conn,
-                "UPDATE public.question SET deleted_at = now() WHERE qid = %s",
+                "UPDATE public.question SET deleted_at = now() WHERE qid = %s RETURNING qid",
                 (qid,)
             )
         
         conn.commit()
-        return True
     finally:
         release_conn(conn)
 
+    if row:
+        publish("question.deleted", {"qid": qid, "hard_delete": hard_delete})
+    return True
+
 
 def batch_delete_questions(qids: List[int], hard_delete: bool = False) -> int:
-    """批量删除题目"""
+    """批量删除题目，返回实际删除的题目数"""
     if not qids:
         return 0
-    
-    conn = get_conn()
-    try:
-        placeholders = ','.join(['%s'] * len(qids))
-        
-        if hard_delete:
-            _execute(
-                conn,
-                f"DELETE FROM public.question WHERE qid IN ({placeholders})",
-                qids
-            )
-        else:
-            _execute(
-                conn,
-                f"UPDATE public.question SET deleted_at = now() WHERE qid IN ({placeholders})",
-                qids
-            )
-        
-        conn.commit()
-        return len(qids)
-    finally:
-        release_conn(conn)
+    where_sql, params = build_target("question", qids, include_deleted=hard_delete)
+    return run_bulk("question", "delete", where_sql, params, hard_delete=hard_delete)["affected"]
 
 
 def get_question_stats() -> Dict[str, Any]:
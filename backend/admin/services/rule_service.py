@@ -0,0 +1,95 @@
+"""分类规则服务"""
+from typing import Optional, List, Dict, Any
+
+from db import get_conn, release_conn, _query, _query_one, _execute
+from ingest import reload_kind_rules
+from search import ALLOWED_KINDS
+
+
+def list_kind_rules() -> List[Dict[str, Any]]:
+    """获取全部分类规则"""
+    conn = get_conn()
+    try:
+        return _query(
+            conn,
+            """
+            SELECT rule_id, keyword, kind, priority, is_active, created_at
+            FROM public.kind_rule
+            ORDER BY priority DESC, rule_id
+            """
+        )
+    finally:
+        release_conn(conn)
+
+
+def create_kind_rule(keyword: str, kind: str, priority: int = 0) -> Dict[str, Any]:
+    """新增分类规则"""
+    keyword = (keyword or "").strip()
+    if not keyword:
+        raise ValueError("关键字不能为空")
+    if kind not in ALLOWED_KINDS:
+        raise ValueError(f"kind 仅支持: {', '.join(sorted(ALLOWED_KINDS))}")
+
+    conn = get_conn()
+    try:
+        rule = _query_one(
+            conn,
+            """
+            INSERT INTO public.kind_rule (keyword, kind, priority)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (keyword, kind) DO UPDATE
+              SET priority = EXCLUDED.priority, is_active = true
+            RETURNING rule_id, keyword, kind, priority, is_active, created_at
+            """,
+            (keyword, kind, priority)
+        )
+        conn.commit()
+    finally:
+        release_conn(conn)
+
+    reload_kind_rules()
+    return rule
+
+
+def update_kind_rule(rule_id: int, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """更新分类规则（优先级 / 启用状态）"""
+    update_fields = []
+    params = []
+    for field in ["priority", "is_active"]:
+        if field in updates:
+            update_fields.append(f"{field} = %s")
+            params.append(updates[field])
+    if not update_fields:
+        return None
+
+    conn = get_conn()
+    try:
+        rule = _query_one(
+            conn,
+            f"""
+            UPDATE public.kind_rule
+            SET {', '.join(update_fields)}
+            WHERE rule_id = %s
+            RETURNING rule_id, keyword, kind, priority, is_active, created_at
+            """,
+            params + [rule_id]
+        )
+        conn.commit()
+    finally:
+        release_conn(conn)
+
+    reload_kind_rules()
+    return rule
+
+
+def delete_kind_rule(rule_id: int) -> bool:
+    """删除分类规则"""
+    conn = get_conn()
+    try:
+        _execute(conn, "DELETE FROM public.kind_rule WHERE rule_id = %s", (rule_id,))
+        conn.commit()
+    finally:
+        release_conn(conn)
+
+    reload_kind_rules()
+    return True
@@ -0,0 +1,154 @@
+"""统计快照服务
+
+仪表板等汇总结果计算一次后存入 stats_snapshot 表。读取时直接返回快照及其计算时间；
+超过 STATS_SNAPSHOT_TTL 秒的快照照常返回（标记 stale），同时在后台线程重算
+（stale-while-revalidate）。多个工作进程同时发现过期时，由会话级 advisory lock 保证只有一个在重算。
+本进程内编辑 / 删除分片、题目或执行批量操作后（utils/events 事件），全部快照立即视为过期，
+下次读取即触发重算；其他进程仍按 TTL 判断。
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from db import get_conn, release_conn, _query_one
+from admin.services.stats_service import get_dashboard_data, get_content_distribution, get_quality_report
+from utils.events import subscribe
+
+
+STATS_SNAPSHOT_TTL = float(os.getenv("STATS_SNAPSHOT_TTL", "300"))
+
+SNAPSHOT_BUILDERS: Dict[str, Callable[[], Dict[str, Any]]] = {
+    "dashboard": get_dashboard_data,
+    "content_distribution": get_content_distribution,
+    "quality_report": get_quality_report,
+}
+
+_refreshing: set = set()
+_refreshing_lock = threading.Lock()
+
+# 内容变更后待重算的快照（进程内）
+_dirty: set = set()
+
+INVALIDATING_TOPICS = (
+    "chunk.updated", "chunk.deleted", "question.updated", "question.deleted",
+    "doc.bulk_changed", "chunk.bulk_changed", "question.bulk_changed",
+)
+
+
+def mark_snapshots_stale(payload: Optional[Dict[str, Any]] = None) -> None:
+    """标记全部快照过期；作为内容变更事件的处理函数"""
+    with _refreshing_lock:
+        _dirty.update(SNAPSHOT_BUILDERS)
+
+
+for _topic in INVALIDATING_TOPICS:
+    subscribe(_topic, mark_snapshots_stale)
+
+
+def refresh_snapshot(name: str, skip_if_busy: bool = False) -> Optional[Dict[str, Any]]:
+    """重算并写入快照；skip_if_busy 时若其他进程正在重算则直接返回 None"""
+    builder = SNAPSHOT_BUILDERS[name]
+    lock_key = f"stats_snapshot:{name}"
+    locked = False
+    conn = get_conn()
+    try:
+        if skip_if_busy:
+            # 会话级锁与连接的事务模式无关，覆盖重算与写入的全过程，在 finally 中显式释放
+            row = _query_one(conn, "SELECT pg_try_advisory_lock(hashtext(%s)) AS locked", (lock_key,))
+            conn.commit()
+            if not row or not row["locked"]:
+                return None
+            locked = True
+
+        with _refreshing_lock:
+            # 取得锁后、计算前清除标记：计算期间再有变更会重新标记，不会丢失
+            _dirty.discard(name)
+        started = time.monotonic()
+        # 经 JSON 往返一次，保证新算出的结果与从快照表读出的格式一致（日期、Decimal 转为字符串）
+        data = json.loads(json.dumps(builder(), ensure_ascii=False, default=str))
+        duration_ms = int((time.monotonic() - started) * 1000)
+
+        row = _query_one(
+            conn,
+            """
+            INSERT INTO public.stats_snapshot (name, data, computed_at, duration_ms)
+            VALUES (%s, %s::jsonb, now(), %s)
+            ON CONFLICT (name) DO UPDATE
+              SET data = EXCLUDED.data, computed_at = EXCLUDED.computed_at, duration_ms = EXCLUDED.duration_ms
+            RETURNING data, computed_at, duration_ms
+            """,
+            (name, json.dumps(data, ensure_ascii=False), duration_ms)
+        )
+        conn.commit()
+        return row
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if locked:
+            try:
+                _query_one(conn, "SELECT pg_advisory_unlock(hashtext(%s))", (lock_key,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+        release_conn(conn)
+
+
+def _revalidate_in_background(name: str) -> None:
+    with _refreshing_lock:
+        if name in _refreshing:
+            return
+        _refreshing.add(name)
+
+    def run():
+        try:
+            refresh_snapshot(name, skip_if_busy=True)
+        except Exception as e:
+            print(f"[stats-snapshot] 重算 {name} 失败: {e}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(name)
+
+    threading.Thread(target=run, name=f"stats-snapshot-{name}", daemon=True).start()
+
+
+def get_snapshot(name: str, force_refresh: bool = False) -> Dict[str, Any]:
+    """
+    读取快照，返回 {"data", "computed_at", "age_seconds", "stale"}。
+    快照不存在或 force_refresh 时同步计算；已过期时返回旧值并在后台重算。
+    """
+    if name not in SNAPSHOT_BUILDERS:
+        raise ValueError(f"未知的统计快照: {name}")
+
+    if not force_refresh:
+        conn = get_conn()
+        try:
+            row = _query_one(
+                conn,
+                """
+                SELECT data, computed_at, EXTRACT(EPOCH FROM now() - computed_at)::float AS age
+                FROM public.stats_snapshot
+                WHERE name = %s
+                """,
+                (name,)
+            )
+        finally:
+            release_conn(conn)
+        if row:
+            age = max(float(row["age"] or 0.0), 0.0)
+            with _refreshing_lock:
+                dirty = name in _dirty
+            stale = dirty or age > STATS_SNAPSHOT_TTL
+            if stale:
+                _revalidate_in_background(name)
+            return {
+                "data": row["data"],
+                "computed_at": row["computed_at"],
+                "age_seconds": round(age, 1),
+                "stale": stale,
+            }
+
+    row = refresh_snapshot(name)
+    return {"data": row["data"], "computed_at": row["computed_at"], "age_seconds": 0.0, "stale": False}
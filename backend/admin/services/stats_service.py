@@ -1,8 +1,10 @@
 """统计服务"""
 from typing import Dict, Any, List
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
 from db import get_conn, release_conn, _query, _query_one
+from dedup import ITEM_TABLES, find_duplicate_groups, backfill_signatures
+from search_log import flush_search_events, rollup_search_daily
 
 
 def get_system_stats() -> Dict[str, Any]:
@@ -39,18 +41,14 @@ def get_dashboard_data() -> Dict[str, Any]:
             """
         )
         
-        # 热门搜索（从审计日志分析）
+        # 热门搜索（从检索按日汇总表统计）
         top_searches = _query(
             conn,
             """
-            SELECT 
-                details->>'query' as query,
-                COUNT(*) as count
-            FROM public.audit_log
-            WHERE action = 'search' 
-                AND created_at > now() - interval '7 days'
-                AND details->>'query' IS NOT NULL
-            GROUP BY details->>'query'
+            SELECT query, SUM(count) as count
+            FROM public.search_daily
+            WHERE day > current_date - 7
+            GROUP BY query
             ORDER BY count DESC
             LIMIT 10
             """
@@ -61,13 +59,12 @@ def get_dashboard_data() -> Dict[str, Any]:
             conn,
             """
             SELECT 
-                COUNT(DISTINCT d.doc_id) as doc_count,
-                COUNT(c.chunk_id) as chunk_count,
-                SUM(c.tokens) as total_tokens,
+                COUNT(*) as doc_count,
+                SUM(d.chunk_count) as chunk_count,
+                SUM(d.total_tokens) as total_tokens,
                 pg_database_size(current_database()) as db_size
             FROM public.doc d
-            LEFT JOIN public.chunk c ON d.doc_id = c.doc_id
-            WHERE d.deleted_at IS NULL AND c.deleted_at IS NULL
+            WHERE d.deleted_at IS NULL
             """
         )
         
@@ -119,10 +116,9 @@ def get_content_distribution() -> Dict[str, Any]:
             """
             SELECT 
                 d.section_number,
-                COUNT(DISTINCT d.doc_id) as doc_count,
-                COUNT(c.chunk_id) as chunk_count
+                COUNT(*) as doc_count,
+                SUM(d.chunk_count) as chunk_count
             FROM public.doc d
-            LEFT JOIN public.chunk c ON d.doc_id = c.doc_id AND c.deleted_at IS NULL
             WHERE d.deleted_at IS NULL
             GROUP BY d.section_number
             ORDER BY d.section_number
@@ -190,14 +186,11 @@ def get_quality_report() -> Dict[str, Any]:
             SELECT 
                 d.doc_id,
                 d.title,
-                AVG(c.quality_score) as avg_quality,
-                COUNT(c.chunk_id) as chunk_count
+                d.avg_quality,
+                d.chunk_count
             FROM public.doc d
-            JOIN public.chunk c ON d.doc_id = c.doc_id
-            WHERE d.deleted_at IS NULL AND c.deleted_at IS NULL
-            GROUP BY d.doc_id, d.title
-            HAVING AVG(c.quality_score) < 50
-            ORDER BY avg_quality ASC
+            WHERE d.deleted_at IS NULL AND d.chunk_count > 0 AND d.avg_quality < 50
+            ORDER BY d.avg_quality ASC
             LIMIT 10
             """
         )
@@ -220,17 +213,31 @@ def get_usage_stats(days: int = 30) -> Dict[str, Any]:
             conn,
             """
             SELECT 
-                DATE(created_at) as date,
-                COUNT(*) as count
-            FROM public.audit_log
-            WHERE action = 'search'
-                AND created_at > now() - interval '%s days'
-            GROUP BY DATE(created_at)
+                day as date,
+                SUM(count) as count,
+                SUM(zero_count) as zero_count
+            FROM public.search_daily
+            WHERE day > current_date - %s
+            GROUP BY day
             ORDER BY date DESC
             """,
             (days,)
         )
         
+        # 无结果的高频查询（内容缺口）
+        zero_result_queries = _query(
+            conn,
+            """
+            SELECT query, SUM(zero_count) as count
+            FROM public.search_daily
+            WHERE day > current_date - %s AND zero_count > 0
+            GROUP BY query
+            ORDER BY count DESC
+            LIMIT 20
+            """,
+            (days,)
+        )
+        
         # 活跃用户
         active_users = _query(
             conn,
@@ -251,8 +258,71 @@ def get_usage_stats(days: int = 30) -> Dict[str, Any]:
         
         return {
             "search_trend": search_trend,
+            "zero_result_queries": zero_result_queries,
             "active_users": active_users
         }
     finally:
         release_conn(conn)
 
+
+def get_duplicate_report(item_type: str = "chunk", limit: int = 50) -> Dict[str, Any]:
+    """获取近重复内容报告（基于 SimHash + LSH 桶）"""
+    if item_type not in ITEM_TABLES:
+        raise ValueError(f"item_type 仅支持: {', '.join(ITEM_TABLES)}")
+
+    conn = get_conn()
+    try:
+        groups = find_duplicate_groups(conn, item_type, limit=limit)
+        ids = [i for g in groups for i in g]
+        items: Dict[int, Dict[str, Any]] = {}
+        if ids:
+            if item_type == "chunk":
+                rows = _query(
+                    conn,
+                    """
+                    SELECT c.chunk_id AS id, c.doc_id, d.title AS doc_title, c.kind,
+                           c.heading_h2, LEFT(c.content_plain, 120) AS preview
+                    FROM public.chunk c
+                    JOIN public.doc d ON d.doc_id = c.doc_id
+                    WHERE c.chunk_id = ANY(%s)
+                    """,
+                    (ids,)
+                )
+            else:
+                rows = _query(
+                    conn,
+                    """
+                    SELECT qid AS id, qtype, source_file, LEFT(stem_md, 120) AS preview
+                    FROM public.question
+                    WHERE qid = ANY(%s)
+                    """,
+                    (ids,)
+                )
+            items = {r["id"]: r for r in rows}
+
+        return {
+            "item_type": item_type,
+            "group_count": len(groups),
+            "groups": [[items[i] for i in g if i in items] for g in groups]
+        }
+    finally:
+        release_conn(conn)
+
+
+def run_signature_backfill(batch_size: int = 500) -> Dict[str, int]:
+    """为已有分片与题目补算近重复签名"""
+    conn = get_conn()
+    try:
+        return {
+            item_type: backfill_signatures(conn, item_type, batch_size=batch_size)
+            for item_type in ITEM_TABLES
+        }
+    finally:
+        release_conn(conn)
+
+
+def run_search_rollup(days: int = 1) -> Dict[str, int]:
+    """落库缓冲中的检索事件并重算最近 days 天的检索汇总"""
+    flushed = flush_search_events()
+    rows = rollup_search_daily(since=date.today() - timedelta(days=days))
+    return {"flushed": flushed, "rollup_rows": rows}
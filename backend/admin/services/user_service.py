@@ -1,14 +1,106 @@
-"""用户管理服务"""
-from typing import Optional, List, Dict, Any
+"""用户管理服务
+
+登录成功时只在进程内记录最后登录时间，后台线程每隔 LAST_LOGIN_FLUSH_INTERVAL 秒
+用一条 UPDATE ... FROM (VALUES ...) 批量写入 last_login_at；进程退出时再落库一次。
+用户信息按 user_id 缓存 USER_CACHE_TTL 秒（默认 5 秒，只用于 /auth/me 展示），本进程内修改用户时失效；
+缓存是进程级的，多 worker 部署时其他进程最多晚 USER_CACHE_TTL 秒看到 role / is_active 的变化，
+因此授权判断不读这份缓存，管理端查看 / 修改用户时也绕过缓存直接查库。
+"""
+import os
+import threading
+import time
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime
 
+from psycopg2.extras import execute_values
+
 from db import get_conn, release_conn, _query, _query_one, _execute
+from utils.background import PeriodicWorker
 from utils.password import hash_password, verify_password
 from admin.models.user import UserCreate, UserUpdate
 
 
+LAST_LOGIN_FLUSH_INTERVAL = float(os.getenv("LAST_LOGIN_FLUSH_INTERVAL", "30"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "5"))
+
+
+class LastLoginBuffer:
+    """线程安全的 {user_id: 最后登录时间}，同一用户多次登录只保留最新时间"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[int, datetime] = {}
+
+    def record(self, user_id: int, at: datetime) -> None:
+        with self._lock:
+            prev = self._pending.get(user_id)
+            if prev is None or at > prev:
+                self._pending[user_id] = at
+
+    def get(self, user_id: int) -> Optional[datetime]:
+        with self._lock:
+            return self._pending.get(user_id)
+
+    def drain(self) -> Dict[int, datetime]:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def restore(self, times: Dict[int, datetime]) -> None:
+        """落库失败时放回，下次一并写入"""
+        for user_id, at in times.items():
+            self.record(user_id, at)
+
+
+last_login_buffer = LastLoginBuffer()
+
+_user_cache: Dict[int, Tuple[float, Dict[str, Any]]] = {}
+_user_cache_lock = threading.Lock()
+
+
+def _invalidate_user(user_id: int) -> None:
+    with _user_cache_lock:
+        _user_cache.pop(user_id, None)
+
+
+def flush_last_login() -> int:
+    """把缓冲的最后登录时间批量写入 admin_user.last_login_at，返回更新的用户数"""
+    times = last_login_buffer.drain()
+    if not times:
+        return 0
+    values = list(times.items())
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            execute_values(
+                cur,
+                """
+                UPDATE public.admin_user AS u
+                SET last_login_at = v.at
+                FROM (VALUES %s) AS v(user_id, at)
+                WHERE u.user_id = v.user_id
+                  AND (u.last_login_at IS NULL OR u.last_login_at < v.at)
+                """,
+                values,
+                template="(%s::bigint, %s::timestamp)",
+                page_size=len(values),
+            )
+            updated = cur.rowcount
+        conn.commit()
+        return updated
+    except Exception:
+        conn.rollback()
+        last_login_buffer.restore(times)
+        raise
+    finally:
+        release_conn(conn)
+
+
+last_login_flusher = PeriodicWorker("last-login-flush", LAST_LOGIN_FLUSH_INTERVAL, flush_last_login)
+
+
 def authenticate_user(username: str, password: str) -> Optional[Dict[str, Any]]:
-    """验证用户登录"""
+    """验证用户登录（bcrypt 校验为 CPU 密集操作，异步路由中应放到线程池执行）"""
     conn = get_conn()
     try:
         user = _query_one(
@@ -30,13 +122,8 @@ def authenticate_user(username: str, password: str) -> Optional[Dict[str, Any]]:
         if not verify_password(password, user["password_hash"]):
             return None
         
-        # 更新最后登录时间
-        _execute(
-            conn,
-            "UPDATE public.admin_user SET last_login_at = %s WHERE user_id = %s",
-            (datetime.utcnow(), user["user_id"])
-        )
-        conn.commit()
+        # 记录最后登录时间，由 last_login_flusher 批量落库
+        last_login_buffer.record(user["user_id"], datetime.utcnow())
         
         # 不返回密码哈希
         del user["password_hash"]
@@ -46,8 +133,32 @@ def authenticate_user(username: str, password: str) -> Optional[Dict[str, Any]]:
         release_conn(conn)
 
 
-def get_user_by_id(user_id: int) -> Optional[Dict[str, Any]]:
-    """根据ID获取用户"""
+def get_user_by_id(user_id: int, use_cache: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    根据ID获取用户；尚未落库的最后登录时间以缓冲中的为准。
+    use_cache=True 时可能返回本进程 USER_CACHE_TTL 秒内的旧数据（role / is_active 可能滞后），
+    需要当前权限状态的调用方传 use_cache=False。
+    """
+    now = time.monotonic()
+    cached = None
+    if use_cache:
+        with _user_cache_lock:
+            cached = _user_cache.get(user_id)
+    if cached is not None and now - cached[0] < USER_CACHE_TTL:
+        user = dict(cached[1])
+    else:
+        user = _fetch_user(user_id)
+        if user is None:
+            return None
+        with _user_cache_lock:
+            _user_cache[user_id] = (now, dict(user))
+    pending = last_login_buffer.get(user_id)
+    if pending is not None and (user.get("last_login_at") is None or pending > user["last_login_at"]):
+        user["last_login_at"] = pending
+    return user
+
+
+def _fetch_user(user_id: int) -> Optional[Dict[str, Any]]:
     conn = get_conn()
     try:
         user = _query_one(
@@ -151,7 +262,7 @@ def update_user(user_id: int, user_data: UserUpdate) -> Optional[Dict[str, Any]]
             params.append(user_data.is_active)
         
         if not updates:
-            return get_user_by_id(user_id)
+            return get_user_by_id(user_id, use_cache=False)
         
         params.append(user_id)
         
@@ -172,6 +283,7 @@ def update_user(user_id: int, user_data: UserUpdate) -> Optional[Dict[str, Any]]
             user = dict(zip(cols, row))
         
         conn.commit()
+        _invalidate_user(user_id)
         return user
     finally:
         release_conn(conn)
@@ -202,6 +314,7 @@ def change_password(user_id: int, old_password: str, new_password: str) -> bool:
             (new_hash, user_id)
         )
         conn.commit()
+        _invalidate_user(user_id)
         return True
     finally:
         release_conn(conn)
@@ -217,6 +330,7 @@ def delete_user(user_id: int) -> bool:
             (user_id,)
         )
         conn.commit()
+        _invalidate_user(user_id)
         return True
     finally:
         release_conn(conn)
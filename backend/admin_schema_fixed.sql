@@ -22,19 +22,144 @@ INSERT INTO public.admin_user (username, password_hash, full_name, role)
 VALUES ('admin', '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewY5lE7X9fKJ5jO6', '系统管理员', 'superadmin')
 ON CONFLICT (username) DO NOTHING;
 
--- 2. 操作审计日志表
+-- 2. 操作审计日志表（按月范围分区，见 admin/services/audit_service.py 的分区维护）
+-- 旧版单表在此迁移：改名为 audit_log_legacy，建分区表后整体搬入再删除
+CREATE SEQUENCE IF NOT EXISTS public.audit_log_log_id_seq;
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND c.relname = 'audit_log' AND c.relkind = 'r'
+    ) THEN
+        -- v_admin_stats 引用 audit_log，随后按新表重建
+        DROP VIEW IF EXISTS v_admin_stats;
+        ALTER TABLE public.audit_log RENAME TO audit_log_legacy;
+        ALTER TABLE public.audit_log_legacy RENAME CONSTRAINT audit_log_pkey TO audit_log_legacy_pkey;
+        DROP INDEX IF EXISTS public.idx_audit_user;
+        DROP INDEX IF EXISTS public.idx_audit_action;
+        DROP INDEX IF EXISTS public.idx_audit_resource;
+        DROP INDEX IF EXISTS public.idx_audit_created;
+        ALTER SEQUENCE public.audit_log_log_id_seq OWNED BY NONE;
+    END IF;
+END $$;
+
 CREATE TABLE IF NOT EXISTS public.audit_log (
-    log_id        BIGSERIAL PRIMARY KEY,
+    log_id        BIGINT NOT NULL DEFAULT nextval('public.audit_log_log_id_seq'),
     user_id       BIGINT REFERENCES public.admin_user(user_id) ON DELETE SET NULL,
     username      VARCHAR(50),
-    action        VARCHAR(50) NOT NULL,
-    resource_type VARCHAR(50),
+    action        VARCHAR(50) NOT NULL,  -- create, update, delete, export, login, logout
+    resource_type VARCHAR(50),           -- doc, chunk, question, user
     resource_id   BIGINT,
-    details       JSONB,
+    details       JSONB,                 -- 操作详情
     ip_address    VARCHAR(50),
     user_agent    TEXT,
-    created_at    TIMESTAMP DEFAULT now()
-);
+    created_at    TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (log_id, created_at)
+) PARTITION BY RANGE (created_at);
+
+ALTER SEQUENCE public.audit_log_log_id_seq OWNED BY public.audit_log.log_id;
+
+-- 兜底分区：月分区未及时创建时写入不会失败
+CREATE TABLE IF NOT EXISTS public.audit_log_default PARTITION OF public.audit_log DEFAULT;
+
+-- 创建 [p_from, p_to] 覆盖的月分区 audit_log_YYYYMM，返回新建数。
+-- 兜底分区里已有该月的行时不能直接 CREATE ... PARTITION OF，先建独立表、把这些行移入，再 ATTACH；
+-- 单个分区失败只记 WARNING 并回滚该分区的改动，不影响其他月份与所在的建表脚本
+CREATE OR REPLACE FUNCTION public.audit_log_ensure_partitions(p_from DATE, p_to DATE)
+RETURNS INT AS $$
+DECLARE
+    m DATE := date_trunc('month', p_from)::date;
+    next_m DATE;
+    part TEXT;
+    created INT := 0;
+BEGIN
+    WHILE m <= p_to LOOP
+        part := 'audit_log_' || to_char(m, 'YYYYMM');
+        next_m := (m + interval '1 month')::date;
+        IF to_regclass('public.' || part) IS NULL THEN
+            BEGIN
+                IF EXISTS (SELECT 1 FROM public.audit_log_default WHERE created_at >= m AND created_at < next_m) THEN
+                    -- 移动期间阻止写入兜底分区，避免 ATTACH 校验时又出现该月的行
+                    LOCK TABLE public.audit_log_default IN EXCLUSIVE MODE;
+                    EXECUTE format(
+                        'CREATE TABLE public.%I (LIKE public.audit_log INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                        part
+                    );
+                    EXECUTE format(
+                        'WITH moved AS (DELETE FROM public.audit_log_default WHERE created_at >= %L AND created_at < %L RETURNING *) '
+                        'INSERT INTO public.%I SELECT * FROM moved',
+                        m, next_m, part
+                    );
+                    EXECUTE format(
+                        'ALTER TABLE public.audit_log ATTACH PARTITION public.%I FOR VALUES FROM (%L) TO (%L)',
+                        part, m, next_m
+                    );
+                ELSE
+                    EXECUTE format(
+                        'CREATE TABLE public.%I PARTITION OF public.audit_log FOR VALUES FROM (%L) TO (%L)',
+                        part, m, next_m
+                    );
+                END IF;
+                created := created + 1;
+            EXCEPTION WHEN OTHERS THEN
+                RAISE WARNING 'audit_log 分区 % 创建失败: %', part, SQLERRM;
+            END;
+        END IF;
+        m := next_m;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 保留最近 p_keep_months 个整月（另加当月），更早的月分区整体删除；p_keep_months <= 0 不删除
+CREATE OR REPLACE FUNCTION public.audit_log_drop_partitions(p_keep_months INT)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    cutoff DATE;
+    r RECORD;
+BEGIN
+    IF p_keep_months IS NULL OR p_keep_months <= 0 THEN
+        RETURN;
+    END IF;
+    cutoff := (date_trunc('month', now()) - make_interval(months => p_keep_months))::date;
+    FOR r IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'public.audit_log'::regclass
+          AND c.relname ~ '^audit_log_[0-9]{6}$'
+        ORDER BY c.relname
+    LOOP
+        IF to_date(substr(r.relname, 11), 'YYYYMM') < cutoff THEN
+            EXECUTE format('DROP TABLE public.%I', r.relname);
+            RETURN NEXT r.relname;
+        END IF;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT public.audit_log_ensure_partitions(current_date, (current_date + interval '2 months')::date);
+
+DO $$
+DECLARE
+    lo TIMESTAMP;
+    hi TIMESTAMP;
+BEGIN
+    IF to_regclass('public.audit_log_legacy') IS NOT NULL THEN
+        SELECT min(created_at), max(created_at) INTO lo, hi FROM public.audit_log_legacy;
+        IF lo IS NOT NULL THEN
+            PERFORM public.audit_log_ensure_partitions(lo::date, hi::date);
+        END IF;
+        INSERT INTO public.audit_log
+            (log_id, user_id, username, action, resource_type, resource_id,
+             details, ip_address, user_agent, created_at)
+        SELECT log_id, user_id, username, action, resource_type, resource_id,
+               details, ip_address, user_agent, COALESCE(created_at, now())
+        FROM public.audit_log_legacy;
+        DROP TABLE public.audit_log_legacy;
+    END IF;
+END $$;
 
 -- 3. 知识库分类表
 CREATE TABLE IF NOT EXISTS public.kb_category (
@@ -53,6 +178,100 @@ CREATE TABLE IF NOT EXISTS public.doc_category (
     PRIMARY KEY (doc_id, category_id)
 );
 
+-- 4.1 分类层级闭包表：每对 (祖先, 后代) 一行（含自身，depth = 0），由 kb_category 上的触发器维护；
+-- “某分类及其全部子分类”只需按 ancestor_id 走一次索引，无需递归查询（见 utils/categoryfilter.py）
+CREATE TABLE IF NOT EXISTS public.kb_category_closure (
+    ancestor_id   BIGINT NOT NULL REFERENCES public.kb_category(category_id) ON DELETE CASCADE,
+    descendant_id BIGINT NOT NULL REFERENCES public.kb_category(category_id) ON DELETE CASCADE,
+    depth         INT NOT NULL,
+    PRIMARY KEY (ancestor_id, descendant_id)
+);
+CREATE INDEX IF NOT EXISTS idx_kb_category_closure_desc ON public.kb_category_closure(descendant_id, ancestor_id);
+-- 按分类取文档：主键 (doc_id, category_id) 无法按 category_id 定位，补反向索引
+CREATE INDEX IF NOT EXISTS idx_doc_category_category ON public.doc_category(category_id, doc_id);
+
+-- 按 parent_id 全量重建闭包表，返回行数；直接改库后漂移时调用
+CREATE OR REPLACE FUNCTION public.kb_category_closure_rebuild()
+RETURNS INT AS $$
+DECLARE
+    n INT;
+BEGIN
+    DELETE FROM public.kb_category_closure;
+    INSERT INTO public.kb_category_closure (ancestor_id, descendant_id, depth)
+    WITH RECURSIVE t(ancestor_id, descendant_id, depth) AS (
+        SELECT category_id, category_id, 0 FROM public.kb_category
+        UNION ALL
+        SELECT t.ancestor_id, c.category_id, t.depth + 1
+        FROM t
+        JOIN public.kb_category c ON c.parent_id = t.descendant_id
+        WHERE t.depth < 64
+    )
+    SELECT ancestor_id, descendant_id, MIN(depth) FROM t GROUP BY ancestor_id, descendant_id;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 新分类：自身一行，加上父分类的每个祖先各一行
+CREATE OR REPLACE FUNCTION public.kb_category_closure_ins()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO public.kb_category_closure (ancestor_id, descendant_id, depth)
+    SELECT ancestor_id, NEW.category_id, depth + 1
+    FROM public.kb_category_closure
+    WHERE descendant_id = NEW.parent_id
+    UNION ALL
+    SELECT NEW.category_id, NEW.category_id, 0;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 移动分类：整棵子树与原祖先断开，再接到新父分类的祖先链上；删除分类时闭包行经外键级联删除
+CREATE OR REPLACE FUNCTION public.kb_category_closure_move()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.parent_id IS NOT NULL AND EXISTS (
+        SELECT 1 FROM public.kb_category_closure
+        WHERE ancestor_id = NEW.category_id AND descendant_id = NEW.parent_id
+    ) THEN
+        RAISE EXCEPTION '分类 % 不能移动到自身或其子分类 % 下', NEW.category_id, NEW.parent_id;
+    END IF;
+
+    DELETE FROM public.kb_category_closure cc
+    USING public.kb_category_closure sub, public.kb_category_closure anc
+    WHERE sub.ancestor_id = NEW.category_id
+      AND anc.descendant_id = NEW.category_id
+      AND anc.ancestor_id <> NEW.category_id
+      AND cc.ancestor_id = anc.ancestor_id
+      AND cc.descendant_id = sub.descendant_id;
+
+    INSERT INTO public.kb_category_closure (ancestor_id, descendant_id, depth)
+    SELECT anc.ancestor_id, sub.descendant_id, anc.depth + sub.depth + 1
+    FROM public.kb_category_closure anc
+    JOIN public.kb_category_closure sub ON sub.ancestor_id = NEW.category_id
+    WHERE anc.descendant_id = NEW.parent_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_kb_category_closure_ins ON public.kb_category;
+CREATE TRIGGER trg_kb_category_closure_ins AFTER INSERT ON public.kb_category
+    FOR EACH ROW EXECUTE FUNCTION public.kb_category_closure_ins();
+
+DROP TRIGGER IF EXISTS trg_kb_category_closure_move ON public.kb_category;
+CREATE TRIGGER trg_kb_category_closure_move AFTER UPDATE OF parent_id ON public.kb_category
+    FOR EACH ROW WHEN (OLD.parent_id IS DISTINCT FROM NEW.parent_id)
+    EXECUTE FUNCTION public.kb_category_closure_move();
+
+-- 首次启用时按现有分类回填
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM public.kb_category_closure)
+       AND EXISTS (SELECT 1 FROM public.kb_category) THEN
+        PERFORM public.kb_category_closure_rebuild();
+    END IF;
+END $$;
+
 -- 5. 标签表
 CREATE TABLE IF NOT EXISTS public.tag (
     tag_id        BIGSERIAL PRIMARY KEY,
@@ -109,6 +328,111 @@ EXCEPTION
     WHEN OTHERS THEN NULL;
 END $$;
 
+-- 9.1 文档分片汇总：chunk_count / total_tokens / avg_quality 存在 doc 行上
+-- 由 chunk 上的语句级触发器按迁移表增量维护（只计未删除分片），
+-- 文档列表与详情不再聚合 chunk；漂移时调用 doc_rollup_recompute() 修复
+CREATE OR REPLACE FUNCTION public.doc_rollup_recompute(p_doc_ids BIGINT[] DEFAULT NULL)
+RETURNS INT AS $$
+DECLARE
+    fixed INT;
+BEGIN
+    UPDATE public.doc d
+    SET chunk_count = s.cnt, total_tokens = s.tok, quality_sum = s.qsum
+    FROM (
+        SELECT d2.doc_id,
+               COUNT(c.chunk_id)::int AS cnt,
+               COALESCE(SUM(c.tokens), 0) AS tok,
+               COALESCE(SUM(c.quality_score), 0) AS qsum
+        FROM public.doc d2
+        LEFT JOIN public.chunk c ON c.doc_id = d2.doc_id AND c.deleted_at IS NULL
+        WHERE p_doc_ids IS NULL OR d2.doc_id = ANY(p_doc_ids)
+        GROUP BY d2.doc_id
+    ) s
+    WHERE d.doc_id = s.doc_id
+      AND (d.chunk_count, d.total_tokens, d.quality_sum) IS DISTINCT FROM (s.cnt, s.tok, s.qsum);
+    GET DIAGNOSTICS fixed = ROW_COUNT;
+    RETURN fixed;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = 'doc' AND column_name = 'chunk_count'
+    ) THEN
+        ALTER TABLE public.doc ADD COLUMN chunk_count INT NOT NULL DEFAULT 0;
+        ALTER TABLE public.doc ADD COLUMN total_tokens BIGINT NOT NULL DEFAULT 0;
+        ALTER TABLE public.doc ADD COLUMN quality_sum BIGINT NOT NULL DEFAULT 0;
+        ALTER TABLE public.doc ADD COLUMN avg_quality NUMERIC
+            GENERATED ALWAYS AS (quality_sum::numeric / NULLIF(chunk_count, 0)) STORED;
+        -- 首次启用时按现有分片回填
+        PERFORM public.doc_rollup_recompute();
+    END IF;
+END $$;
+
+CREATE OR REPLACE FUNCTION public.doc_rollup_apply()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE public.doc d
+        SET chunk_count = d.chunk_count + s.cnt, total_tokens = d.total_tokens + s.tok, quality_sum = d.quality_sum + s.qsum
+        FROM (
+            SELECT doc_id, COUNT(*)::int AS cnt, COALESCE(SUM(tokens), 0) AS tok, COALESCE(SUM(quality_score), 0) AS qsum
+            FROM new_rows WHERE deleted_at IS NULL
+            GROUP BY doc_id
+        ) s
+        WHERE d.doc_id = s.doc_id;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE public.doc d
+        SET chunk_count = d.chunk_count - s.cnt, total_tokens = d.total_tokens - s.tok, quality_sum = d.quality_sum - s.qsum
+        FROM (
+            SELECT doc_id, COUNT(*)::int AS cnt, COALESCE(SUM(tokens), 0) AS tok, COALESCE(SUM(quality_score), 0) AS qsum
+            FROM old_rows WHERE deleted_at IS NULL
+            GROUP BY doc_id
+        ) s
+        WHERE d.doc_id = s.doc_id;
+    ELSE
+        -- 更新：新值计正、旧值计负，净变化为零的文档不写
+        UPDATE public.doc d
+        SET chunk_count = d.chunk_count + s.cnt, total_tokens = d.total_tokens + s.tok, quality_sum = d.quality_sum + s.qsum
+        FROM (
+            SELECT doc_id, SUM(cnt)::int AS cnt, SUM(tok) AS tok, SUM(qsum) AS qsum
+            FROM (
+                SELECT doc_id, 1 AS cnt, COALESCE(tokens, 0)::bigint AS tok, COALESCE(quality_score, 0)::bigint AS qsum
+                FROM new_rows WHERE deleted_at IS NULL
+                UNION ALL
+                SELECT doc_id, -1, -COALESCE(tokens, 0)::bigint, -COALESCE(quality_score, 0)::bigint
+                FROM old_rows WHERE deleted_at IS NULL
+            ) x
+            GROUP BY doc_id
+            HAVING SUM(cnt) <> 0 OR SUM(tok) <> 0 OR SUM(qsum) <> 0
+        ) s
+        WHERE d.doc_id = s.doc_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 迁移表不能用于多事件触发器，按事件分别创建
+DROP TRIGGER IF EXISTS trg_chunk_doc_rollup_ins ON public.chunk;
+CREATE TRIGGER trg_chunk_doc_rollup_ins AFTER INSERT ON public.chunk
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.doc_rollup_apply();
+
+DROP TRIGGER IF EXISTS trg_chunk_doc_rollup_upd ON public.chunk;
+CREATE TRIGGER trg_chunk_doc_rollup_upd AFTER UPDATE ON public.chunk
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.doc_rollup_apply();
+
+DROP TRIGGER IF EXISTS trg_chunk_doc_rollup_del ON public.chunk;
+CREATE TRIGGER trg_chunk_doc_rollup_del AFTER DELETE ON public.chunk
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.doc_rollup_apply();
+
+-- 文档列表按创建时间倒序分页，汇总列就在 doc 行上，无需再连接 chunk
+CREATE INDEX IF NOT EXISTS idx_doc_created_live ON public.doc(created_at DESC) WHERE deleted_at IS NULL;
+
 -- 10. 创建更新时间触发器函数
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
@@ -120,16 +444,24 @@ $$ LANGUAGE plpgsql;
 
 -- 11. 创建触发器（先删除后创建，避免重复）
 DROP TRIGGER IF EXISTS update_doc_updated_at ON public.doc;
+-- 分片汇总列的维护不视为文档修改
 CREATE TRIGGER update_doc_updated_at BEFORE UPDATE ON public.doc
-    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+    FOR EACH ROW WHEN (
+        OLD.chunk_count IS NOT DISTINCT FROM NEW.chunk_count
+        AND OLD.total_tokens IS NOT DISTINCT FROM NEW.total_tokens
+        AND OLD.quality_sum IS NOT DISTINCT FROM NEW.quality_sum
+    )
+    EXECUTE FUNCTION update_updated_at_column();
 
 DROP TRIGGER IF EXISTS update_chunk_updated_at ON public.chunk;
 CREATE TRIGGER update_chunk_updated_at BEFORE UPDATE ON public.chunk
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- 使用计数的批量刷新（usage_count 变化）不视为内容修改
 DROP TRIGGER IF EXISTS update_question_updated_at ON public.question;
 CREATE TRIGGER update_question_updated_at BEFORE UPDATE ON public.question
-    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+    FOR EACH ROW WHEN (OLD.usage_count IS NOT DISTINCT FROM NEW.usage_count)
+    EXECUTE FUNCTION update_updated_at_column();
 
 DROP TRIGGER IF EXISTS update_admin_user_updated_at ON public.admin_user;
 CREATE TRIGGER update_admin_user_updated_at BEFORE UPDATE ON public.admin_user
@@ -139,7 +471,10 @@ CREATE TRIGGER update_admin_user_updated_at BEFORE UPDATE ON public.admin_user
 CREATE INDEX IF NOT EXISTS idx_audit_user ON public.audit_log(user_id);
 CREATE INDEX IF NOT EXISTS idx_audit_action ON public.audit_log(action);
 CREATE INDEX IF NOT EXISTS idx_audit_resource ON public.audit_log(resource_type, resource_id);
-CREATE INDEX IF NOT EXISTS idx_audit_created ON public.audit_log(created_at DESC);
+-- 按时间追加写入，BRIN 足以支持时间窗口查询（分区裁剪后只扫描窗口内的块）
+CREATE INDEX IF NOT EXISTS idx_audit_created_brin ON public.audit_log USING brin (created_at);
+-- 按标签取分片：主键 (chunk_id, tag_id) 无法按 tag_id 定位，补反向索引
+CREATE INDEX IF NOT EXISTS idx_chunk_tag_tag ON public.chunk_tag(tag_id, chunk_id);
 
 -- 13. 创建统计视图
 CREATE OR REPLACE VIEW v_admin_stats AS
@@ -157,11 +492,34 @@ SELECT
     d.title,
     d.source,
     d.created_at,
-    COUNT(c.chunk_id) as chunk_count,
-    AVG(c.quality_score) as avg_quality,
-    SUM(c.tokens) as total_tokens
+    d.chunk_count::bigint as chunk_count,
+    d.avg_quality as avg_quality,
+    d.total_tokens as total_tokens
 FROM public.doc d
-LEFT JOIN public.chunk c ON d.doc_id = c.doc_id AND c.deleted_at IS NULL
-WHERE d.deleted_at IS NULL
-GROUP BY d.doc_id, d.title, d.source, d.created_at;
+WHERE d.deleted_at IS NULL;
+
+-- 15. 统计快照表（仪表板等汇总结果的缓存，见 admin/services/snapshot_service.py）
+CREATE TABLE IF NOT EXISTS public.stats_snapshot (
+    name          VARCHAR(50) PRIMARY KEY,
+    data          JSONB NOT NULL,
+    computed_at   TIMESTAMP NOT NULL DEFAULT now(),
+    duration_ms   INT
+);
 
+-- 16. 后台任务表（批量操作等长任务的状态与进度，见 admin/services/job_service.py）
+CREATE TABLE IF NOT EXISTS public.admin_job (
+    job_id        BIGSERIAL PRIMARY KEY,
+    kind          VARCHAR(50) NOT NULL,
+    params        JSONB,
+    status        VARCHAR(20) NOT NULL DEFAULT 'pending',
+    total         BIGINT,
+    processed     BIGINT NOT NULL DEFAULT 0,
+    affected      BIGINT NOT NULL DEFAULT 0,
+    result        JSONB,
+    error         TEXT,
+    created_by    BIGINT,
+    created_at    TIMESTAMP NOT NULL DEFAULT now(),
+    started_at    TIMESTAMP,
+    finished_at   TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_admin_job_kind ON public.admin_job(kind, job_id DESC);
@@ -4,9 +4,11 @@ import shutil
 import subprocess
 import hashlib
 import tempfile
-from typing import Optional, Any, Dict
+import time
+from typing import Optional, Any, Dict, List
 
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Query, APIRouter
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Query, APIRouter, Request
+from fastapi.responses import FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
@@ -14,23 +16,41 @@ from pydantic import BaseModel
 from db import init_db, get_conn, release_conn, _query, _query_one
 from ingest import process_upload
 from search import perform_search, fetch_chunk_detail, fetch_sections_with_counts
-from ingest_qbank import parse_docx_questions, insert_questions
+from ingest_qbank import parse_docx_questions, parse_docx_questions_batch, insert_questions
+from dedup import collapse_page
+from media_store import resolve_image, IMMUTABLE_CACHE_CONTROL, FALLBACK_CACHE_CONTROL
+from paper import generate_paper
+from usage import record_question_usage, usage_flusher
+from search_log import record_search, search_log_flusher, search_rollup_worker
+from utils.tagfilter import TAG_MODES, parse_tags, question_tag_clause
+from utils.jsonresp import FastJSONResponse
+from utils.compression import CompressionMiddleware
+from utils.ratelimit import RateLimiter
 
 # 导入管理系统路由
 from admin.router import admin_router
 from admin.db_init import init_admin_schema
+from admin.services.audit_writer import audit_writer
+from admin.services.audit_service import audit_partition_worker
+from admin.services.purge_service import purge_worker
+from admin.services.user_service import last_login_flusher
 
 
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
 ALLOWED_MIME = {
     "application/vnd.openxmlformats-officedocument.wordprocessingml.document",  # .docx only
 }
+# /api/qbank/usage 无需登录，按客户端 IP 限制每分钟上报次数，单次最多 USAGE_MAX_QIDS 题
+USAGE_RATE_LIMIT = int(os.getenv("USAGE_RATE_LIMIT", "60"))
+USAGE_MAX_QIDS = 500
+usage_rate_limiter = RateLimiter(USAGE_RATE_LIMIT, 60.0)
 
 
 app = FastAPI(
     title="ChaoX Knowledge Base System",
     version="0.2.0",
-    description="知识库管理系统 - 支持文档上传、检索和管理后台"
+    description="知识库管理系统 - 支持文档上传、检索和管理后台",
+    default_response_class=FastJSONResponse,
 )
 
 app.add_middleware(
@@ -40,6 +60,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# 直接访问后端时按 Accept-Encoding 压缩 JSON / 文本响应（图片与已压缩的文件原样返回）
+app.add_middleware(CompressionMiddleware)
 
 # 提供静态资源（题库导出的图片 /static/qimg/**）
 if not os.path.exists("static"):
@@ -47,6 +69,23 @@ if not os.path.exists("static"):
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
+@app.get("/media/qimg/{shard1}/{shard2}/{name}")
+def media_qimg(shard1: str, shard2: str, name: str, request: Request):
+    """内容寻址的题库图片：强 ETag + immutable 长期缓存（变体未生成时短缓存返回原图）"""
+    found = resolve_image(shard1, shard2, name)
+    if not found:
+        raise HTTPException(status_code=404, detail="图片不存在")
+    path, etag, immutable = found
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else FALLBACK_CACHE_CONTROL,
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, headers=headers)
+
+
 @app.on_event("startup")
 def on_startup() -> None:
     """应用启动时初始化数据库"""
@@ -56,6 +95,25 @@ def on_startup() -> None:
         init_admin_schema()
     except Exception as e:
         print(f"管理系统初始化警告: {e}")
+    usage_flusher.start()
+    search_log_flusher.start()
+    search_rollup_worker.start()
+    audit_writer.start()
+    audit_partition_worker.start()
+    purge_worker.start()
+    last_login_flusher.start()
+
+
+@app.on_event("shutdown")
+def on_shutdown() -> None:
+    """停止后台任务并落库缓冲中的使用计数、检索事件、最后登录时间与审计日志"""
+    usage_flusher.stop()
+    search_rollup_worker.stop(run_final=False)
+    search_log_flusher.stop()
+    audit_partition_worker.stop(run_final=False)
+    purge_worker.stop(run_final=False)
+    last_login_flusher.stop()
+    audit_writer.stop()
 
 
 @app.get("/health")
@@ -68,6 +126,7 @@ def ingest(
     file: UploadFile = File(...),
     chapter: int = Form(...),
     section_number: int = Form(...),
+    skip_duplicates: Optional[bool] = Form(None),
 ) -> Dict[str, Any]:
     # 类型与大小校验
     filename_lower = (file.filename or "").lower()
@@ -88,6 +147,7 @@ def ingest(
             filename=file.filename,
             chapter=chapter,
             section_number=section_number,
+            skip_duplicates=skip_duplicates,
         )
         return {"ok": True, **result}
     except HTTPException:
@@ -96,6 +156,16 @@ def ingest(
         raise HTTPException(status_code=500, detail=f"解析或入库失败: {e}")
 
 
+def _tag_filter(tags: Optional[str], tag_mode: str) -> List[str]:
+    """解析 tags=a,b 与 tag_mode=any|all 查询参数"""
+    if tag_mode not in TAG_MODES:
+        raise HTTPException(status_code=400, detail="tag_mode 仅支持 any / all")
+    try:
+        return parse_tags(tags)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.get("/search")
 def search(
     q: Optional[str] = Query(None),
@@ -105,10 +175,19 @@ def search(
     offset: int = Query(0, ge=0),
     neighbor: int = Query(1, ge=0, le=1),
     source: Optional[str] = Query(None),
+    collapse: int = Query(1, ge=0, le=1),
+    tags: Optional[str] = Query(None),
+    tag_mode: str = Query("any"),
+    category: Optional[int] = Query(None),
 ) -> Dict[str, Any]:
     try:
-        results, total = perform_search(q=q, kind=kind, section=section, limit=limit, offset=offset, neighbor=neighbor, source=source)
-        return {"ok": True, "count": len(results), "total": int(total or 0), "results": results}
+        tag_list = _tag_filter(tags, tag_mode)
+        results, total = perform_search(
+            q=q, kind=kind, section=section, limit=limit, offset=offset, neighbor=neighbor, source=source,
+            collapse=bool(collapse), tags=tag_list, tag_mode=tag_mode, category=category,
+        )
+        # 检索结果直接序列化，跳过 FastAPI 的 jsonable_encoder
+        return FastJSONResponse({"ok": True, "count": len(results), "total": int(total or 0), "results": results})
     except HTTPException:
         raise
     except Exception as e:
@@ -175,15 +254,20 @@ def knowledge(
     neighbor: int = Query(1, ge=0, le=1),
     chunk_id: Optional[int] = Query(None),
     source: Optional[str] = Query(None),
+    collapse: int = Query(1, ge=0, le=1),
+    tags: Optional[str] = Query(None),
+    tag_mode: str = Query("any"),
+    category: Optional[int] = Query(None),
     # 预留：未来可能加入更多模式或参数
 ) -> Dict[str, Any]:
     try:
         m = (mode or "").strip().lower()
         if m == "search":
             results, total = perform_search(
-                q=q, kind=kind, section=section, limit=limit, offset=offset, neighbor=neighbor, source=source
+                q=q, kind=kind, section=section, limit=limit, offset=offset, neighbor=neighbor, source=source,
+                collapse=bool(collapse), tags=_tag_filter(tags, tag_mode), tag_mode=tag_mode, category=category,
             )
-            return {"ok": True, "count": len(results), "total": int(total or 0), "results": results}
+            return FastJSONResponse({"ok": True, "count": len(results), "total": int(total or 0), "results": results})
         elif m == "detail":
             if chunk_id is None:
                 raise HTTPException(status_code=400, detail="detail 模式需要提供 chunk_id")
@@ -206,38 +290,74 @@ def knowledge(
 api_q = APIRouter(prefix="/api/qbank", tags=["qbank"])
 
 
-@api_q.post("/ingest")
-def ingest_qbank(
-    file: UploadFile = File(...),
-    tags: Optional[str] = Form(None),
-    default_difficulty: int = Form(2),
-) -> Dict[str, Any]:
+def _apply_upload_defaults(rows: list, tags: Optional[str], default_difficulty: int) -> None:
+    if tags:
+        tag_list = [t.strip() for t in tags.split(",") if t.strip()]
+        for r in rows:
+            r["tags"] = (r.get("tags") or []) + tag_list
+    for r in rows:
+        r["difficulty"] = r.get("difficulty") or default_difficulty
+
+
+def _save_qbank_upload(file: UploadFile) -> str:
     filename_lower = (file.filename or "").lower()
     if not filename_lower.endswith(".docx"):
-        raise HTTPException(status_code=400, detail="仅支持 .docx 文件")
+        raise HTTPException(status_code=400, detail=f"仅支持 .docx 文件: {file.filename}")
 
     file_bytes = file.file.read()
     if len(file_bytes) > MAX_FILE_SIZE:
-        raise HTTPException(status_code=400, detail="文件大小超过 10MB")
+        raise HTTPException(status_code=400, detail=f"文件大小超过 10MB: {file.filename}")
 
     with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as tmp:
         tmp.write(file_bytes)
-        tmp_path = tmp.name
+        return tmp.name
+
+
+@api_q.post("/ingest")
+def ingest_qbank(
+    file: UploadFile = File(...),
+    tags: Optional[str] = Form(None),
+    default_difficulty: int = Form(2),
+    skip_duplicates: Optional[bool] = Form(None),
+) -> Dict[str, Any]:
+    tmp_path = _save_qbank_upload(file)
     try:
         rows = parse_docx_questions(tmp_path)
-        if tags:
-            tag_list = [t.strip() for t in tags.split(",") if t.strip()]
-            for r in rows:
-                r["tags"] = (r.get("tags") or []) + tag_list
-        for r in rows:
-            r["difficulty"] = r.get("difficulty") or default_difficulty
+        _apply_upload_defaults(rows, tags, default_difficulty)
 
-        count = insert_questions(rows, file.filename)
-        return {"ok": True, "questions": count, "source": file.filename}
+        stats = insert_questions(rows, file.filename, skip_duplicates=skip_duplicates)
+        # questions 为实际新增的题数（前端沿用该字段）
+        return {"ok": True, "questions": stats["inserted"], "source": file.filename, **stats}
     finally:
         os.remove(tmp_path)
 
 
+@api_q.post("/ingest-batch")
+def ingest_qbank_batch(
+    files: List[UploadFile] = File(...),
+    tags: Optional[str] = Form(None),
+    default_difficulty: int = Form(2),
+    skip_duplicates: Optional[bool] = Form(None),
+) -> Dict[str, Any]:
+    """一次上传多个题库文件，经 pandoc 转换池并行解析"""
+    tmp_paths: List[str] = []
+    try:
+        for f in files:
+            tmp_paths.append(_save_qbank_upload(f))
+        parsed = parse_docx_questions_batch(tmp_paths)
+
+        results = []
+        for f, rows in zip(files, parsed):
+            _apply_upload_defaults(rows, tags, default_difficulty)
+            stats = insert_questions(rows, f.filename, skip_duplicates=skip_duplicates)
+            results.append({"source": f.filename, "questions": stats["inserted"], **stats})
+        totals = {k: sum(r[k] for r in results) for k in ("inserted", "skipped_existing", "skipped_duplicates", "total")}
+        return {"ok": True, "questions": totals["inserted"], **totals, "files": results}
+    finally:
+        for p in tmp_paths:
+            os.remove(p)
+
+
 # ------------------------------ 题库检索接口 ------------------------------
 
 def _has_trgm(conn) -> bool:
@@ -252,11 +372,20 @@ def search_qbank(
     q: Optional[str] = Query(None),
     limit: int = Query(8, ge=1, le=20),
     offset: int = Query(0, ge=0),
+    collapse: int = Query(1, ge=0, le=1),
+    tags: Optional[str] = Query(None),
+    tag_mode: str = Query("any"),
 ) -> Dict[str, Any]:
+    tag_list = _tag_filter(tags, tag_mode)
+    started = time.perf_counter()
     conn = get_conn()
     try:
         params: list[Any] = []
-        where = ["1=1"]
+        where = ["deleted_at IS NULL"]
+        if tag_list:
+            tag_sql, tag_params = question_tag_clause(tag_list, tag_mode)
+            where.append(tag_sql)
+            params.extend(tag_params)
         use_trgm = _has_trgm(conn)
 
         listing_mode = (q is None) or (str(q).strip() == "")
@@ -274,22 +403,40 @@ def search_qbank(
             score_sql = "0.0"
             select_params = []
 
-        order_clause = "ORDER BY score DESC" if not listing_mode else "ORDER BY created_at DESC, qid DESC"
+        order_clause = "ORDER BY score DESC, qid" if not listing_mode else "ORDER BY created_at DESC, qid DESC"
 
         sql = f"""
         SELECT qid, qtype, stem_md, options_json, answer_text, explanation_md, difficulty, tags, source_file,
-               {score_sql} AS score
+               simhash, {score_sql} AS score
         FROM public.question
         WHERE {' AND '.join(where)}
         {order_clause}
         LIMIT %s OFFSET %s
         """
-        rows = _query(conn, sql, select_params + params + [limit, offset])
+
+        def fetch(raw_offset: int, n: int) -> List[Dict[str, Any]]:
+            return _query(conn, sql, select_params + params + [n, raw_offset])
+
+        # 先折叠近重复再分页，总数相应扣除已发现的近重复
+        dropped = 0
+        if collapse:
+            rows, dropped = collapse_page(fetch, offset, limit)
+        else:
+            rows = fetch(offset, limit)
+        for r in rows:
+            r.pop("simhash", None)
+        if not listing_mode:
+            record_question_usage(r["qid"] for r in rows)
 
         cnt_row = _query_one(conn, f"SELECT COUNT(1) AS total FROM public.question WHERE {' AND '.join(where)}", params)
         total = int(cnt_row["total"]) if cnt_row and "total" in cnt_row else 0
+        if not listing_mode:
+            record_search(
+                "qbank", q, {"tags": tag_list, "tag_mode": tag_mode if tag_list else None},
+                (time.perf_counter() - started) * 1000, total,
+            )
 
-        return {"ok": True, "results": rows, "total": total}
+        return FastJSONResponse({"ok": True, "results": rows, "total": max(total - dropped, offset + len(rows))})
     finally:
         release_conn(conn)
 
@@ -303,17 +450,84 @@ def question_detail(qid: int) -> Dict[str, Any]:
             """
             SELECT qid, qtype, stem_md, options_json, answer_text, explanation_md,
                    difficulty, tags, source_file, created_at
-            FROM public.question WHERE qid = %s
+            FROM public.question WHERE qid = %s AND deleted_at IS NULL
             """,
             (qid,),
         )
         if not row:
             raise HTTPException(status_code=404, detail="未找到该题目")
+        record_question_usage((qid,))
         return row
     finally:
         release_conn(conn)
 
 
+class PaperSection(BaseModel):
+    qtype: str
+    difficulty: int
+    count: int
+
+
+class PaperRequest(BaseModel):
+    blueprint: List[PaperSection]
+    tags: Optional[List[str]] = None
+    seed: Optional[int] = None
+    include_answers: bool = True
+
+
+@api_q.post("/paper")
+def make_paper(req: PaperRequest) -> Dict[str, Any]:
+    """按蓝图（题型 + 难度 + 数量）分层随机组卷；传入相同 seed 可复现同一份试卷"""
+    conn = get_conn()
+    try:
+        paper = generate_paper(
+            conn,
+            [s.dict() for s in req.blueprint],
+            tags=[t.strip() for t in (req.tags or []) if t and t.strip()] or None,
+            seed=req.seed,
+            include_answers=req.include_answers,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        release_conn(conn)
+    record_question_usage(q["qid"] for q in paper["questions"])
+    return {"ok": True, **paper}
+
+
+class UsageEvent(BaseModel):
+    qids: List[int]
+
+
+@api_q.post("/usage")
+def report_usage(event: UsageEvent, request: Request) -> Dict[str, Any]:
+    """
+    上报作答 / 练习事件（计入 usage_count，批量异步落库）。
+    每个客户端每分钟最多 USAGE_RATE_LIMIT 次；同一次上报内重复的 qid 只计一次，
+    不存在或已删除的题目不计数。
+    """
+    client = request.client.host if request.client else "unknown"
+    if not usage_rate_limiter.allow(client):
+        raise HTTPException(status_code=429, detail="上报过于频繁，请稍后再试")
+    qids = list(dict.fromkeys(event.qids))
+    if len(qids) > USAGE_MAX_QIDS:
+        raise HTTPException(status_code=400, detail=f"单次最多上报 {USAGE_MAX_QIDS} 题")
+    if not qids:
+        return {"ok": True, "recorded": 0}
+    conn = get_conn()
+    try:
+        rows = _query(
+            conn,
+            "SELECT qid FROM public.question WHERE qid = ANY(%s) AND deleted_at IS NULL",
+            (qids,),
+        )
+    finally:
+        release_conn(conn)
+    valid = [r["qid"] for r in rows]
+    record_question_usage(valid)
+    return {"ok": True, "recorded": len(valid)}
+
+
 # 将题库路由在所有定义完成后再包含到应用中
 app.include_router(api_q)
 
@@ -0,0 +1,89 @@
+"""JSON 序列化与响应压缩基准
+
+用数据库中的真实数据构造检索结果（/search）与管理端分片列表（含 datetime）两类响应体，
+比较三种序列化路径的耗时与输出大小：
+- default：jsonable_encoder + 标准库 json（FastAPI / Starlette 默认 JSONResponse）；
+- encoder+fast：jsonable_encoder + utils/jsonresp.dumps（默认响应类为 FastJSONResponse 的路由）；
+- direct：utils/jsonresp.dumps（直接返回 FastJSONResponse 的热路径）；
+并给出 gzip / br 压缩后的大小与压缩耗时。
+
+用法：
+    python bench_json.py [关键词] [--limit 20] [--rounds 200]
+"""
+import argparse
+import json
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from search import perform_search
+from admin.services.chunk_service import list_chunks
+from utils.jsonresp import dumps, orjson
+from utils.compression import BROTLI_QUALITY, GZIP_LEVEL, brotli
+
+
+def _stdlib_render(content: Any) -> bytes:
+    # 与 starlette.responses.JSONResponse.render 相同
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+SERIALIZERS: List[Tuple[str, Callable[[Any], bytes]]] = [
+    ("default", lambda p: _stdlib_render(jsonable_encoder(p))),
+    ("encoder+fast", lambda p: dumps(jsonable_encoder(p))),
+    ("direct", dumps),
+]
+
+
+def _timeit(fn: Callable[[], Any], rounds: int) -> float:
+    """返回单次平均耗时（微秒）"""
+    fn()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - started) / rounds * 1e6
+
+
+def build_payloads(q: str, limit: int) -> Dict[str, Any]:
+    results, total = perform_search(q=q or None, kind=None, section=None, limit=limit, offset=0, neighbor=1)
+    chunks, chunk_total = list_chunks(limit=limit)
+    return {
+        "search": {"ok": True, "count": len(results), "total": int(total or 0), "results": results},
+        "admin_chunks": {"ok": True, "data": chunks, "total": chunk_total, "limit": limit, "offset": 0},
+    }
+
+
+def run(q: str, limit: int, rounds: int) -> None:
+    print(f"orjson: {'已安装' if orjson is not None else '未安装（回退标准库 json）'}；"
+          f"brotli: {'已安装' if brotli is not None else '未安装'}")
+    for name, payload in build_payloads(q, limit).items():
+        print(f"\n[{name}]")
+        base = None
+        for label, fn in SERIALIZERS:
+            body = fn(payload)
+            us = _timeit(lambda: fn(payload), rounds)
+            base = base or us
+            print(f"  {label:<13} {us:9.1f} us  x{base / us:5.2f}  {len(body):8d} B")
+        body = dumps(payload)
+        gz = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        gz_size = len(gz.compress(body) + gz.flush())
+        gz_us = _timeit(lambda: zlib.compress(body, GZIP_LEVEL), rounds)
+        print(f"  gzip-{GZIP_LEVEL:<8} {gz_us:9.1f} us         {gz_size:8d} B")
+        if brotli is not None:
+            br_size = len(brotli.compress(body, quality=BROTLI_QUALITY))
+            br_us = _timeit(lambda: brotli.compress(body, quality=BROTLI_QUALITY), rounds)
+            print(f"  br-{BROTLI_QUALITY:<10} {br_us:9.1f} us         {br_size:8d} B")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON 序列化与响应压缩基准")
+    parser.add_argument("q", nargs="?", default="", help="检索关键词（为空时为列表模式）")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+    run(args.q, args.limit, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
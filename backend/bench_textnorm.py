@@ -0,0 +1,106 @@
+"""题库文本清洗基准
+
+- remove_text_duplicates：构造不同长度的稠密 LaTeX 行（中间插入一段相邻重复），
+  给出每次调用耗时及相对 n·log n 的增长，用于确认长行上没有超线性退化；
+- 题库解析：构造 Pandoc 风格的题库 Markdown（重复公式、带引号的坐标、重复选项行），
+  给出 _parse_markdown_questions 冷缓存耗时与 normalize_inline 缓存命中情况。
+
+用法：
+    python bench_textnorm.py [--sizes 1300 2600 5300] [--rounds 3] [--seed 3] [--questions 1500]
+"""
+import argparse
+import math
+import random
+import time
+from typing import Callable, List
+
+from utils.textnorm import normalize_inline, remove_text_duplicates
+
+
+_LATEX_TOKENS = [
+    "\\frac{", "}{", "}", "x", "y", "^2", "_{n}", "+", "-", "=", "\\left(", "\\right)",
+    "\\sin ", "\\cos ", "\\lim_{x\\to 0}", "\\int_0^1 ", "\\mathrm{d}x", "1", "2", "n", " ",
+]
+
+
+def dense_latex(n: int, rnd: random.Random) -> str:
+    """长度约为 n 的随机公式串，在 1/3～1/2 处复制一段形成相邻重复"""
+    s = ""
+    while len(s) < n:
+        s += rnd.choice(_LATEX_TOKENS)
+    s = s[:n]
+    return s[:n // 2] + s[n // 3:n // 2] + s[n // 2:]
+
+
+_QBANK_FRAGMENTS = [
+    "'3'", "''", "(1,3)(1, 3)", "$x$$x$", "$\\frac{1}{2}$$\\frac{1}{2}$", "\"(2,4)\"",
+    "设函数 f(x)=x^2+1", "求极限", "(1, 3)", " ", "已知数列 a_n 满足",
+]
+
+
+def qbank_markdown(questions: int, rnd: random.Random) -> str:
+    """Pandoc 风格的题库 Markdown：题头、题干、四个选项、答案、两行解析"""
+
+    def line() -> str:
+        return "".join(rnd.choice(_QBANK_FRAGMENTS) for _ in range(rnd.randint(1, 6)))
+
+    out: List[str] = []
+    options = [line() for _ in range(12)]
+    for q in range(questions):
+        out.append(f"{q + 1}. 【{rnd.choice(['单选题', '判断题', '填空题'])}】" + line())
+        out.append(line())
+        # 选项多取自一个小集合，模拟题库中反复出现的选项行
+        out.extend(f"{k}. " + rnd.choice(options) for k in "ABCD")
+        out.append("答案：" + rnd.choice("ABCD"))
+        out.append("解析：" + line())
+        out.append(line())
+    return "\n".join(out)
+
+
+def _timeit(fn: Callable[[], object], rounds: int) -> float:
+    """返回单次平均耗时（毫秒）"""
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - started) / rounds * 1e3
+
+
+def run(sizes: List[int], rounds: int, seed: int) -> None:
+    rnd = random.Random(seed)
+    print(f"{'长度':>8} {'耗时(ms)':>10} {'ms/(n·log2 n)·1e3':>20}")
+    for n in sizes:
+        line = dense_latex(n, rnd)
+        ms = _timeit(lambda: remove_text_duplicates(line), rounds)
+        norm = ms / (len(line) * math.log2(len(line))) * 1e3
+        print(f"{len(line):>8} {ms:>10.1f} {norm:>20.3f}")
+
+
+def run_qbank(questions: int, seed: int) -> None:
+    from ingest_qbank import _parse_markdown_questions
+
+    md = qbank_markdown(questions, random.Random(seed))
+    normalize_inline.cache_clear()
+    started = time.perf_counter()
+    parsed = _parse_markdown_questions(md)
+    ms = (time.perf_counter() - started) * 1e3
+    info = normalize_inline.cache_info()
+    calls = info.hits + info.misses
+    print(f"\n题库解析：{len(parsed)} 题，{md.count(chr(10)) + 1} 行，{len(md)} 字符")
+    print(f"  _parse_markdown_questions（冷缓存） {ms:8.1f} ms")
+    print(f"  normalize_inline 调用 {calls} 次，命中 {info.hits}（{info.hits / max(calls, 1):.0%}）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="题库文本清洗基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[650, 1300, 2600, 5300, 10600])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=3)
+    parser.add_argument("--questions", type=int, default=1500, help="题库解析基准的题目数（0 跳过）")
+    args = parser.parse_args()
+    run(args.sizes, args.rounds, args.seed)
+    if args.questions > 0:
+        run_qbank(args.questions, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ import threading
 from typing import Optional, Sequence, Any
 
 import psycopg2
+from psycopg2.extras import execute_values
 from psycopg2.pool import SimpleConnectionPool
 from dotenv import load_dotenv
 
@@ -31,7 +32,13 @@ def get_pool() -> SimpleConnectionPool:
 
 
 def get_conn():
-    return get_pool().getconn()
+    """从连接池取连接；连接总是处于事务模式（autocommit=False），由调用方 commit / rollback"""
+    conn = get_pool().getconn()
+    if conn.autocommit:
+        # 连接池归还时不重置会话状态，防止上一个使用者遗留的自动提交模式影响
+        # 命名游标、ON COMMIT DROP 临时表、事务级咨询锁与 SELECT ... FOR UPDATE
+        conn.autocommit = False
+    return conn
 
 
 def release_conn(conn) -> None:
@@ -61,6 +68,17 @@ def _query_one(conn, sql: str, params: Optional[Sequence[Any]] = None):
         return dict(zip(cols, row))
 
 
+# 检索用 trigram 索引（部分索引，只含未删除的行）；快照导入大批数据时先删除、导入后统一重建（见 kb_snapshot.py）
+TRGM_INDEXES = {
+    "idx_chunk_plain_trgm_live":
+        "CREATE INDEX IF NOT EXISTS idx_chunk_plain_trgm_live ON public.chunk USING gin (content_plain gin_trgm_ops) WHERE deleted_at IS NULL;",
+    "idx_q_stem_trgm_live":
+        "CREATE INDEX IF NOT EXISTS idx_q_stem_trgm_live ON public.question USING gin (stem_md gin_trgm_ops) WHERE deleted_at IS NULL;",
+    "idx_q_expl_trgm_live":
+        "CREATE INDEX IF NOT EXISTS idx_q_expl_trgm_live ON public.question USING gin (explanation_md gin_trgm_ops) WHERE deleted_at IS NULL;",
+}
+
+
 def ensure_extensions_and_schema(conn) -> None:
     conn.autocommit = True
     # pg_trgm 扩展
@@ -108,16 +126,42 @@ def ensure_extensions_and_schema(conn) -> None:
         """,
     )
 
-    # 索引
+    # 软删除标记（管理系统设置，公开检索只查询未删除的行）
+    _execute(conn, "ALTER TABLE public.doc ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP;")
+    _execute(conn, "ALTER TABLE public.chunk ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP;")
+
+    # 索引：检索用的索引均为 WHERE deleted_at IS NULL 的部分索引，已软删除的行不占索引空间与扫描时间
+    _execute(conn, TRGM_INDEXES["idx_chunk_plain_trgm_live"])
+    _execute(conn, "DROP INDEX IF EXISTS public.idx_chunk_plain_trgm;")
+    _execute(conn, "CREATE INDEX IF NOT EXISTS idx_chunk_kind ON public.chunk (kind);")
+    _execute(conn, "CREATE INDEX IF NOT EXISTS idx_chunk_doc ON public.chunk (doc_id);")
+    _execute(conn, "CREATE INDEX IF NOT EXISTS idx_doc_source ON public.doc (source);")
+
+    # 分片分类规则：关键字 -> kind，优先级高者胜出（由 ingest 编译为多模式自动机）
+    # 只在首次建表时写入默认规则；管理员删光规则后不会再自动补回
+    kind_rule_exists = _query_one(conn, "SELECT to_regclass('public.kind_rule') IS NOT NULL AS ok")["ok"]
     _execute(
         conn,
         """
-        CREATE INDEX IF NOT EXISTS idx_chunk_plain_trgm ON public.chunk USING gin (content_plain gin_trgm_ops);
+        CREATE TABLE IF NOT EXISTS public.kind_rule (
+          rule_id     BIGSERIAL PRIMARY KEY,
+          keyword     TEXT NOT NULL,
+          kind        TEXT NOT NULL,
+          priority    INT NOT NULL DEFAULT 0,
+          is_active   BOOLEAN DEFAULT true,
+          created_at  TIMESTAMP DEFAULT now(),
+          UNIQUE (keyword, kind)
+        );
         """,
     )
-    _execute(conn, "CREATE INDEX IF NOT EXISTS idx_chunk_kind ON public.chunk (kind);")
-    _execute(conn, "CREATE INDEX IF NOT EXISTS idx_chunk_doc ON public.chunk (doc_id);")
-    _execute(conn, "CREATE INDEX IF NOT EXISTS idx_doc_source ON public.doc (source);")
+    if not kind_rule_exists:
+        from ingest import DEFAULT_KIND_RULES
+        with conn.cursor() as cur:
+            execute_values(
+                cur,
+                "INSERT INTO public.kind_rule (keyword, kind, priority) VALUES %s ON CONFLICT (keyword, kind) DO NOTHING",
+                DEFAULT_KIND_RULES,
+            )
 
     # 题库表：每题作为一条记录
     _execute(
@@ -139,12 +183,143 @@ def ensure_extensions_and_schema(conn) -> None:
         """,
     )
 
+    _execute(conn, "ALTER TABLE public.question ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP;")
+
+    # 随机组卷：每题一个均匀随机键，按 (题型, 难度, 随机键) 索引取样（见 paper.py）
+    _execute(conn, "ALTER TABLE public.question ADD COLUMN IF NOT EXISTS rand_key DOUBLE PRECISION NOT NULL DEFAULT random();")
+    _execute(
+        conn,
+        "CREATE INDEX IF NOT EXISTS idx_question_paper_live ON public.question (qtype, difficulty, rand_key) WHERE deleted_at IS NULL;",
+    )
+    _execute(conn, "DROP INDEX IF EXISTS public.idx_question_paper;")
+    # 标签过滤（tags && / @> 列表）走 GIN 索引，见 utils/tagfilter.py
+    _execute(conn, "CREATE INDEX IF NOT EXISTS idx_question_tags_live ON public.question USING gin (tags) WHERE deleted_at IS NULL;")
+    _execute(conn, "DROP INDEX IF EXISTS public.idx_question_tags;")
+
+    # 近重复检测：SimHash 签名与分段 LSH 桶（见 dedup.py）
+    _execute(conn, "ALTER TABLE public.chunk ADD COLUMN IF NOT EXISTS simhash BIGINT;")
+    _execute(conn, "ALTER TABLE public.question ADD COLUMN IF NOT EXISTS simhash BIGINT;")
+    _execute(
+        conn,
+        """
+        CREATE TABLE IF NOT EXISTS public.lsh_bucket (
+          item_type  TEXT NOT NULL,
+          item_id    BIGINT NOT NULL,
+          band       SMALLINT NOT NULL,
+          bucket     INT NOT NULL,
+          sig        BIGINT NOT NULL,
+          PRIMARY KEY (item_type, item_id, band)
+        );
+        """,
+    )
+    _execute(conn, "CREATE INDEX IF NOT EXISTS idx_lsh_bucket ON public.lsh_bucket (item_type, band, bucket);")
+
+    # 题库图片引用计数（内容寻址存储，见 media_store.py）：由 question 上的触发器维护
+    _execute(
+        conn,
+        """
+        CREATE TABLE IF NOT EXISTS public.qimg (
+          sha256      TEXT PRIMARY KEY,
+          ref_count   INT NOT NULL DEFAULT 0,
+          created_at  TIMESTAMP DEFAULT now(),
+          updated_at  TIMESTAMP DEFAULT now()
+        );
+        """,
+    )
+    _execute(
+        conn,
+        """
+        CREATE OR REPLACE FUNCTION public.qimg_refs(t TEXT) RETURNS TEXT[]
+        LANGUAGE sql IMMUTABLE AS $$
+          SELECT COALESCE(array_agg(DISTINCT m[1]), '{}')
+          FROM regexp_matches(COALESCE(t, ''), 'qimg/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})', 'g') AS m
+        $$;
+        """,
+    )
+    _execute(
+        conn,
+        """
+        CREATE OR REPLACE FUNCTION public.qimg_track_refs() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        DECLARE
+          old_refs TEXT[] := '{}';
+          new_refs TEXT[] := '{}';
+        BEGIN
+          IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            old_refs := public.qimg_refs(concat_ws(' ', OLD.stem_md, OLD.options_json::text, OLD.explanation_md));
+          END IF;
+          IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            new_refs := public.qimg_refs(concat_ws(' ', NEW.stem_md, NEW.options_json::text, NEW.explanation_md));
+          END IF;
+          IF old_refs = new_refs THEN
+            RETURN NULL;
+          END IF;
+
+          INSERT INTO public.qimg (sha256, ref_count)
+          SELECT s, 1 FROM unnest(new_refs) AS s WHERE NOT s = ANY(old_refs)
+          ON CONFLICT (sha256) DO UPDATE
+            SET ref_count = public.qimg.ref_count + 1, updated_at = now();
+
+          UPDATE public.qimg
+          SET ref_count = GREATEST(ref_count - 1, 0), updated_at = now()
+          WHERE sha256 = ANY(old_refs) AND NOT sha256 = ANY(new_refs);
+          RETURN NULL;
+        END;
+        $$;
+        """,
+    )
+    _execute(conn, "DROP TRIGGER IF EXISTS trg_question_qimg_refs ON public.question;")
+    _execute(
+        conn,
+        """
+        CREATE TRIGGER trg_question_qimg_refs
+        AFTER INSERT OR DELETE OR UPDATE OF stem_md, options_json, explanation_md ON public.question
+        FOR EACH ROW EXECUTE FUNCTION public.qimg_track_refs();
+        """,
+    )
+
+    # 检索事件（只追加）与按日汇总（见 search_log.py）
+    _execute(
+        conn,
+        """
+        CREATE TABLE IF NOT EXISTS public.search_event (
+          event_id      BIGSERIAL PRIMARY KEY,
+          created_at    TIMESTAMP NOT NULL DEFAULT now(),
+          endpoint      TEXT NOT NULL,
+          query         TEXT NOT NULL,
+          filters       JSONB,
+          latency_ms    REAL NOT NULL,
+          result_count  INT NOT NULL,
+          zero_result   BOOLEAN NOT NULL
+        );
+        """,
+    )
+    # 按时间追加写入，BRIN 足以支持按天范围扫描且几乎不占空间
+    _execute(conn, "CREATE INDEX IF NOT EXISTS idx_search_event_created ON public.search_event USING brin (created_at);")
+    _execute(
+        conn,
+        """
+        CREATE TABLE IF NOT EXISTS public.search_daily (
+          query       TEXT NOT NULL,
+          day         DATE NOT NULL,
+          count       INT NOT NULL,
+          zero_count  INT NOT NULL DEFAULT 0,
+          p50_ms      REAL,
+          p95_ms      REAL,
+          PRIMARY KEY (query, day)
+        );
+        """,
+    )
+    _execute(conn, "CREATE INDEX IF NOT EXISTS idx_search_daily_day ON public.search_daily (day);")
+
     # 题库索引（若有 pg_trgm 则创建全文相似度索引）
     try:
         has_trgm = _query_one(conn, "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm';") is not None
         if has_trgm:
-            _execute(conn, "CREATE INDEX IF NOT EXISTS idx_q_stem_trgm ON public.question USING gin (stem_md gin_trgm_ops);")
-            _execute(conn, "CREATE INDEX IF NOT EXISTS idx_q_expl_trgm ON public.question USING gin (explanation_md gin_trgm_ops);")
+            _execute(conn, TRGM_INDEXES["idx_q_stem_trgm_live"])
+            _execute(conn, TRGM_INDEXES["idx_q_expl_trgm_live"])
+            _execute(conn, "DROP INDEX IF EXISTS public.idx_q_stem_trgm;")
+            _execute(conn, "DROP INDEX IF EXISTS public.idx_q_expl_trgm;")
     except Exception:
         pass
 
@@ -167,6 +342,7 @@ def init_db() -> None:
     try:
         ensure_extensions_and_schema(conn)
     finally:
+        conn.autocommit = False
         release_conn(conn)
 
 
@@ -0,0 +1,278 @@
+"""近重复检测：SimHash 签名 + 分段 LSH 桶
+
+每个分片 / 题目在入库时计算 64 位 SimHash 签名，并按 4 段 × 16 位写入 lsh_bucket 表。
+两个签名的汉明距离 ≤ 3 时，按抽屉原理至少有一段完全相同，因此只需按桶等值查询即可召回候选。
+"""
+import hashlib
+import os
+import re
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+SIMHASH_BITS = 64
+LSH_BANDS = 4
+BAND_BITS = SIMHASH_BITS // LSH_BANDS
+NEAR_DUP_DISTANCE = 3
+SHINGLE_SIZE = 3
+# 折叠分页时，除 offset + limit 行之外最多再多扫描的原始结果行数（即最多容忍的近重复行数）
+COLLAPSE_MAX_EXTRA = int(os.getenv("COLLAPSE_MAX_EXTRA", "500"))
+
+_MASK = (1 << SIMHASH_BITS) - 1
+_BAND_MASK = (1 << BAND_BITS) - 1
+_WS_RE = re.compile(r"\s+")
+
+# 参与近重复检测的对象：item_type -> (表名, 主键列)
+ITEM_TABLES = {
+    "chunk": ("public.chunk", "chunk_id"),
+    "question": ("public.question", "qid"),
+}
+
+
+def _to_signed(v: int) -> int:
+    """无符号 64 位转为 BIGINT 可存储的有符号整数"""
+    return v - (1 << SIMHASH_BITS) if v >= (1 << (SIMHASH_BITS - 1)) else v
+
+
+def simhash(text: Optional[str]) -> Optional[int]:
+    """计算文本的 64 位 SimHash（字符 3-gram 特征，忽略空白）；文本过短时返回 None"""
+    t = _WS_RE.sub("", text or "").lower()
+    if len(t) < SHINGLE_SIZE:
+        return None
+    features = Counter(t[i:i + SHINGLE_SIZE] for i in range(len(t) - SHINGLE_SIZE + 1))
+    weights = [0] * SIMHASH_BITS
+    for shingle, w in features.items():
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            if (h >> bit) & 1:
+                weights[bit] += w
+            else:
+                weights[bit] -= w
+    sig = 0
+    for bit, w in enumerate(weights):
+        if w > 0:
+            sig |= 1 << bit
+    return _to_signed(sig)
+
+
+def question_signature_text(stem_md: Optional[str], options: Optional[Dict[str, Any]]) -> str:
+    """题目的签名文本：题干 + 选项内容"""
+    parts = [stem_md or ""]
+    if options:
+        parts.extend(str(v) for _k, v in sorted(options.items()))
+    return "\n".join(parts)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin((a ^ b) & _MASK).count("1")
+
+
+def lsh_bands(sig: int) -> List[Tuple[int, int]]:
+    """签名切分为 (段号, 桶值) 列表"""
+    u = sig & _MASK
+    return [(band, (u >> (band * BAND_BITS)) & _BAND_MASK) for band in range(LSH_BANDS)]
+
+
+def index_signatures(cur, item_type: str, items: Iterable[Tuple[int, Optional[int]]]) -> int:
+    """写入 / 更新 LSH 桶；items 为 (item_id, simhash)，签名为空的忽略"""
+    rows = []
+    for item_id, sig in items:
+        if sig is None:
+            continue
+        rows.extend((item_type, item_id, band, bucket, sig) for band, bucket in lsh_bands(sig))
+    if not rows:
+        return 0
+    cur.executemany(
+        """
+        INSERT INTO public.lsh_bucket (item_type, item_id, band, bucket, sig)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (item_type, item_id, band) DO UPDATE
+          SET bucket = EXCLUDED.bucket, sig = EXCLUDED.sig
+        """,
+        rows,
+    )
+    return len(rows) // LSH_BANDS
+
+
+def find_near_duplicates(
+    cur,
+    item_type: str,
+    sig: Optional[int],
+    exclude_id: Optional[int] = None,
+    max_distance: int = NEAR_DUP_DISTANCE,
+) -> List[int]:
+    """按桶召回候选并校验汉明距离，返回近重复对象的 id（按距离升序）"""
+    if sig is None:
+        return []
+    table, pk = ITEM_TABLES[item_type]
+    bands = lsh_bands(sig)
+    cond = " OR ".join(["(l.band = %s AND l.bucket = %s)"] * len(bands))
+    params: List[Any] = [item_type]
+    for band, bucket in bands:
+        params.extend([band, bucket])
+    cur.execute(
+        f"""
+        SELECT DISTINCT l.item_id, l.sig
+        FROM public.lsh_bucket l
+        JOIN {table} t ON t.{pk} = l.item_id AND t.deleted_at IS NULL
+        WHERE l.item_type = %s AND ({cond})
+        """,
+        params,
+    )
+    hits = []
+    for item_id, other in cur.fetchall():
+        if exclude_id is not None and item_id == exclude_id:
+            continue
+        d = hamming(sig, other)
+        if d <= max_distance:
+            hits.append((d, item_id))
+    hits.sort()
+    return [item_id for _d, item_id in hits]
+
+
+def collapse_near_duplicates(
+    rows: Sequence[Dict[str, Any]],
+    key: str = "simhash",
+    max_distance: int = NEAR_DUP_DISTANCE,
+) -> List[Dict[str, Any]]:
+    """按顺序保留结果，丢弃与前面已保留结果近重复的行（适用于已按得分排序的检索结果）"""
+    kept: List[Dict[str, Any]] = []
+    seen: List[int] = []
+    for r in rows:
+        sig = r.get(key)
+        if sig is not None and any(hamming(sig, s) <= max_distance for s in seen):
+            continue
+        if sig is not None:
+            seen.append(sig)
+        kept.append(r)
+    return kept
+
+
+def collapse_page(
+    fetch: Callable[[int, int], List[Dict[str, Any]]],
+    offset: int,
+    limit: int,
+    key: str = "simhash",
+    max_distance: int = NEAR_DUP_DISTANCE,
+    max_extra: int = COLLAPSE_MAX_EXTRA,
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    先折叠再分页：fetch(raw_offset, n) 按检索顺序返回原始结果的第 raw_offset 起 n 行。
+    从头按窗口（逐次加倍）读取，直到折叠后的结果够 offset + limit 条、原始结果读完，
+    或多扫描的行数超过 max_extra。返回 (折叠后的第 offset 起 limit 条, 已扫描部分中丢弃的近重复行数)；
+    总数减去丢弃数即为折叠后总数（扫描到末尾时精确，否则为上界）。
+    """
+    want = offset + limit
+    max_scan = want + max(0, max_extra)
+    kept: List[Dict[str, Any]] = []
+    seen: List[int] = []
+    dropped = 0
+    raw_offset = 0
+    window = max(2 * want, 50)
+    while len(kept) < want and raw_offset < max_scan:
+        n = min(window, max_scan - raw_offset)
+        rows = fetch(raw_offset, n)
+        raw_offset += len(rows)
+        for r in rows:
+            sig = r.get(key)
+            if sig is not None and any(hamming(sig, s) <= max_distance for s in seen):
+                dropped += 1
+                continue
+            if sig is not None:
+                seen.append(sig)
+            kept.append(r)
+            if len(kept) >= want:
+                break
+        if len(rows) < n:
+            break
+        window *= 2
+    return kept[offset:want], dropped
+
+
+def find_duplicate_groups(
+    conn,
+    item_type: str,
+    max_distance: int = NEAR_DUP_DISTANCE,
+    limit: int = 50,
+) -> List[List[int]]:
+    """找出未删除对象中的近重复分组（每组为 id 列表，按组大小降序）"""
+    table, pk = ITEM_TABLES[item_type]
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT DISTINCT a.item_id, b.item_id
+            FROM public.lsh_bucket a
+            JOIN public.lsh_bucket b
+              ON b.item_type = a.item_type AND b.band = a.band
+             AND b.bucket = a.bucket AND b.item_id > a.item_id
+            JOIN {table} ta ON ta.{pk} = a.item_id AND ta.deleted_at IS NULL
+            JOIN {table} tb ON tb.{pk} = b.item_id AND tb.deleted_at IS NULL
+            WHERE a.item_type = %s
+              AND length(replace(((a.sig # b.sig)::bit(64))::text, '0', '')) <= %s
+            """,
+            (item_type, max_distance),
+        )
+        pairs = cur.fetchall()
+
+    # 并查集合并成组
+    parent: Dict[int, int] = {}
+
+    def find(x: int) -> int:
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in pairs:
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+
+    groups: Dict[int, List[int]] = {}
+    for x in list(parent):
+        groups.setdefault(find(x), []).append(x)
+    result = [sorted(g) for g in groups.values()]
+    result.sort(key=lambda g: (-len(g), g[0]))
+    return result[:limit]
+
+
+def backfill_signatures(conn, item_type: str, batch_size: int = 500) -> int:
+    """为尚无签名的已有对象补算 SimHash 并写入 LSH 桶，返回处理条数"""
+    table, pk = ITEM_TABLES[item_type]
+    if item_type == "chunk":
+        cols = "content_plain"
+    else:
+        cols = "stem_md, options_json"
+    done = 0
+    last_id = 0
+    while True:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT {pk}, {cols} FROM {table}
+                WHERE simhash IS NULL AND {pk} > %s
+                ORDER BY {pk}
+                LIMIT %s
+                """,
+                (last_id, batch_size),
+            )
+            rows = cur.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            items = []
+            for row in rows:
+                if item_type == "chunk":
+                    sig = simhash(row[1])
+                else:
+                    sig = simhash(question_signature_text(row[1], row[2]))
+                items.append((row[0], sig))
+            cur.executemany(
+                f"UPDATE {table} SET simhash = %s WHERE {pk} = %s",
+                [(sig, item_id) for item_id, sig in items if sig is not None],
+            )
+            index_signatures(cur, item_type, items)
+        conn.commit()
+        done += len(rows)
+    return done
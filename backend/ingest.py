@@ -1,55 +1,99 @@
 import hashlib
+import os
 import re
+import threading
 from io import BytesIO
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional
 
 from docx import Document
+from psycopg2.extras import execute_values
 
-from db import get_conn, release_conn, _execute, _query_one
+from db import get_conn, release_conn, _execute, _query
+from utils.aho_corasick import KeywordAutomaton
+from utils.textnorm import canonicalize_text, to_plain
+from dedup import simhash, find_near_duplicates, index_signatures
+from quality import score_batch
 
 
 H1_RE = re.compile(r"^第[一二三四五六七八九十百千万0-9]+节")
 H2_RE = re.compile(r"^[一二三四五六七八九十]+、\s*")
 
+# 入库时是否跳过与已有分片近重复的内容（可被接口参数覆盖）
+DEDUP_SKIP_ON_INGEST = os.getenv("DEDUP_SKIP_ON_INGEST", "false").lower() in ("1", "true", "yes")
 
-def canonicalize_text(text: str) -> str:
-    if not text:
-        return text
-    rep = (
-        ("→", "->"),
-        ("∞", "inf"),
-        ("（", "("), ("）", ")"),
-        ("／", "/"), ("∕", "/"), ("/", "/"),
-        ("·", "*"),
+
+# 默认分类规则：(关键字, kind, 优先级)。多个 kind 同时命中时优先级高者胜出。
+# 首次建 kind_rule 表时以此初始化（见 db.init_db）；数据库不可用时作为兜底。
+DEFAULT_KIND_RULES: List[Tuple[str, str, int]] = (
+    [(k, "definition", 50) for k in ["定义", "ε–δ", "ε–N", "ε-δ", "ε-N"]]
+    + [(k, "theorem", 40) for k in ["定理", "准则", "引理", "推论"]]
+    + [(k, "formula", 30) for k in ["重要极限", "等价无穷小", "公式", "恒等式"]]
+    + [(k, "property", 20) for k in ["性质", "连续", "间断"]]
+    + [(k, "example", 10) for k in ["例题", "例", "计算", "求", "证明"]]
+)
+DEFAULT_KIND = "remark"
+
+_kind_matcher_lock = threading.Lock()
+_kind_matcher: Optional[KeywordAutomaton] = None
+_default_kind_matcher: Optional[KeywordAutomaton] = None
+
+
+def build_kind_matcher(rules: List[Tuple[str, str, int]]) -> KeywordAutomaton:
+    """将规则编译为自动机；附带数据为 (优先级, -规则序号, kind)，取最大者即为分类结果"""
+    return KeywordAutomaton(
+        (keyword, (priority, -idx, kind)) for idx, (keyword, kind, priority) in enumerate(rules)
     )
-    t = text
-    for a, b in rep:
-        t = t.replace(a, b)
-    return t
-
-
-def to_plain(text: str) -> str:
-    if not text:
-        return text
-    # 移除 $ 和 $$ 包裹，仅保留内部内容
-    t = re.sub(r"\$\$(.+?)\$\$", r"\1", text, flags=re.S)
-    t = re.sub(r"\$(.+?)\$", r"\1", t, flags=re.S)
-    return t
-
-
-def classify_kind(text: str) -> str:
-    t = text or ""
-    if any(k in t for k in ["定义", "ε–δ", "ε–N", "ε-δ", "ε-N"]):
-        return "definition"
-    if any(k in t for k in ["定理", "准则", "引理", "推论"]):
-        return "theorem"
-    if any(k in t for k in ["重要极限", "等价无穷小", "公式", "恒等式"]):
-        return "formula"
-    if any(k in t for k in ["性质", "连续", "间断"]):
-        return "property"
-    if any(k in t for k in ["例题", "例", "计算", "求", "证明"]):
-        return "example"
-    return "remark"
+
+
+def load_kind_rules(conn) -> List[Tuple[str, str, int]]:
+    """从 kind_rule 表读取启用的规则（表为空时没有规则，所有分片归为 DEFAULT_KIND）"""
+    rows = _query(
+        conn,
+        """
+        SELECT keyword, kind, priority
+        FROM public.kind_rule
+        WHERE is_active = true
+        ORDER BY priority DESC, rule_id
+        """,
+    )
+    return [(r["keyword"], r["kind"], int(r["priority"] or 0)) for r in rows]
+
+
+def get_kind_matcher() -> KeywordAutomaton:
+    """获取已编译的分类自动机（进程内缓存，规则变更后调用 reload_kind_rules 失效）"""
+    global _kind_matcher, _default_kind_matcher
+    if _kind_matcher is None:
+        with _kind_matcher_lock:
+            if _kind_matcher is None:
+                try:
+                    conn = get_conn()
+                    try:
+                        _kind_matcher = build_kind_matcher(load_kind_rules(conn))
+                    finally:
+                        release_conn(conn)
+                except Exception as e:
+                    # 数据库不可用时使用内置规则，但不缓存，下次再尝试读取
+                    print(f"加载分类规则失败，使用默认规则: {e}")
+                    if _default_kind_matcher is None:
+                        _default_kind_matcher = build_kind_matcher(DEFAULT_KIND_RULES)
+                    return _default_kind_matcher
+    return _kind_matcher
+
+
+def reload_kind_rules() -> None:
+    """规则表变更后清除缓存，下次分类时重新编译"""
+    global _kind_matcher
+    with _kind_matcher_lock:
+        _kind_matcher = None
+
+
+def classify_kind(text: str, matcher: Optional[KeywordAutomaton] = None) -> str:
+    m = matcher or get_kind_matcher()
+    best = None
+    for hit in m.iter_matches(text or ""):
+        if best is None or hit > best:
+            best = hit
+    return best[2] if best else DEFAULT_KIND
 
 
 def split_with_overlap(text: str, max_len: int = 1200, overlap: int = 120) -> List[str]:
@@ -66,6 +110,17 @@ def split_with_overlap(text: str, max_len: int = 1200, overlap: int = 120) -> Li
     return parts
 
 
+def derive_chunk_fields(content_md: str) -> Dict[str, Any]:
+    """由 content_md 计算派生列（纯文本、规范化文本、长度、SimHash）；入库与编辑时共用"""
+    content_plain = to_plain(content_md)
+    return {
+        "content_plain": content_plain,
+        "canonical": canonicalize_text(content_md),
+        "tokens": len(content_plain or ""),
+        "simhash": simhash(content_plain),
+    }
+
+
 def parse_docx(file_bytes: bytes) -> Dict[str, Any]:
     doc = Document(BytesIO(file_bytes))
     heading_h1 = None
@@ -132,7 +187,16 @@ def _extract_section_from_h1(h1: str) -> int:
     return _cn_num_to_int(m.group(1))
 
 
-def process_upload(file_bytes: bytes, filename: str, chapter: int, section_number: int, source: str = "kb") -> Dict[str, Any]:
+def process_upload(
+    file_bytes: bytes,
+    filename: str,
+    chapter: int,
+    section_number: int,
+    source: str = "kb",
+    skip_duplicates: Optional[bool] = None,
+) -> Dict[str, Any]:
+    if skip_duplicates is None:
+        skip_duplicates = DEDUP_SKIP_ON_INGEST
     sha256 = hashlib.sha256(file_bytes).hexdigest()
     parsed = parse_docx(file_bytes)
     h1 = parsed.get("h1") or filename
@@ -143,6 +207,7 @@ def process_upload(file_bytes: bytes, filename: str, chapter: int, section_numbe
     if section_number in (None, 0, 1) and inferred_sec not in (0, 1):
         section_number = inferred_sec
 
+    matcher = get_kind_matcher()
     conn = get_conn()
     try:
         with conn:
@@ -168,6 +233,7 @@ def process_upload(file_bytes: bytes, filename: str, chapter: int, section_numbe
                 existing = cur.fetchone()[0]
 
                 inserted = 0
+                skipped = 0
 
                 if existing == 0:
                     # 若没有 H2，则以“正文”整体入库
@@ -178,11 +244,22 @@ def process_upload(file_bytes: bytes, filename: str, chapter: int, section_numbe
                         if not content:
                             continue
                         parts = split_with_overlap(content)
-                        for p_idx, part in enumerate(parts, start=1):
+                        part_fields = [derive_chunk_fields(part) for part in parts]
+                        # 一节的各部分一次评分（近重复跳过的部分也计算，代价很小）
+                        quality_scores = score_batch(
+                            [(part, derived["content_plain"], h2) for part, derived in zip(parts, part_fields)],
+                            matcher,
+                        )
+                        for p_idx, (part, derived, quality_score) in enumerate(
+                            zip(parts, part_fields, quality_scores), start=1
+                        ):
                             content_md = part
-                            content_plain = to_plain(content_md)
-                            canonical = canonicalize_text(content_md)
-                            kind = classify_kind(part)
+                            content_plain = derived["content_plain"]
+                            sig = derived["simhash"]
+                            if skip_duplicates and find_near_duplicates(cur, "chunk", sig):
+                                skipped += 1
+                                continue
+                            kind = classify_kind(part, matcher)
                             anchor = f"ch{chapter}-s{section_number}-h2-{idx}"
                             if len(parts) > 1:
                                 anchor += f"-p{p_idx}"
@@ -191,8 +268,8 @@ def process_upload(file_bytes: bytes, filename: str, chapter: int, section_numbe
                                 """
                                 INSERT INTO public.chunk (
                                   doc_id, kind, heading_h1, heading_h2, anchor,
-                                  content_md, content_plain, canonical, tokens
-                                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                                  content_md, content_plain, canonical, tokens, simhash, quality_score
+                                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                                 RETURNING chunk_id
                                 """,
                                 (
@@ -203,15 +280,74 @@ def process_upload(file_bytes: bytes, filename: str, chapter: int, section_numbe
                                     anchor,
                                     content_md,
                                     content_plain,
-                                    canonical,
-                                    len(content_plain or ""),
+                                    derived["canonical"],
+                                    derived["tokens"],
+                                    sig,
+                                    quality_score,
                                 ),
                             )
-                            _ = cur.fetchone()[0]
+                            chunk_id = cur.fetchone()[0]
+                            index_signatures(cur, "chunk", [(chunk_id, sig)])
                             inserted += 1
 
-        return {"doc_id": doc_id, "chunks": inserted}
+        return {"doc_id": doc_id, "chunks": inserted, "skipped_duplicates": skipped}
     finally:
         release_conn(conn)
 
 
+def reclassify_chunks(batch_size: int = 1000, doc_id: Optional[int] = None) -> Dict[str, int]:
+    """按当前规则批量重新分类已有分片（无需重新解析文档）。
+
+    以 chunk_id 为游标分批读取，只更新 kind 发生变化的行，每批单独提交。
+    """
+    matcher = get_kind_matcher()
+    scanned = 0
+    updated = 0
+    last_id = 0
+    conn = get_conn()
+    try:
+        while True:
+            params: List[Any] = [last_id]
+            doc_filter = ""
+            if doc_id is not None:
+                doc_filter = "AND doc_id = %s"
+                params.append(doc_id)
+            rows = _query(
+                conn,
+                f"""
+                SELECT chunk_id, kind, content_md
+                FROM public.chunk
+                WHERE chunk_id > %s {doc_filter}
+                ORDER BY chunk_id
+                LIMIT %s
+                """,
+                params + [batch_size],
+            )
+            if not rows:
+                break
+            last_id = rows[-1]["chunk_id"]
+            scanned += len(rows)
+
+            changes = []
+            for r in rows:
+                kind = classify_kind(r["content_md"], matcher)
+                if kind != r["kind"]:
+                    changes.append((r["chunk_id"], kind))
+            if changes:
+                with conn.cursor() as cur:
+                    execute_values(
+                        cur,
+                        """
+                        UPDATE public.chunk AS c SET kind = v.kind
+                        FROM (VALUES %s) AS v(chunk_id, kind)
+                        WHERE c.chunk_id = v.chunk_id
+                        """,
+                        changes,
+                        page_size=len(changes),
+                    )
+                    updated += cur.rowcount
+            conn.commit()
+
+        return {"scanned": scanned, "updated": updated}
+    finally:
+        release_conn(conn)
@@ -1,14 +1,29 @@
 # -*- coding: utf-8 -*-
 # ingest_qbank.py —— 解析 .docx 题库为“每题一分片”，写入 question 表
-import os, io, re, json, hashlib, uuid, shutil, subprocess, tempfile
+import os, io, re, json, hashlib, shutil, subprocess, tempfile, threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Dict, List, Tuple, Optional
 from docx import Document
 from docx.text.run import Run
-import psycopg
-from db import get_database_url
-
-PG_URL = os.getenv("DATABASE_URL", get_database_url())
-IMG_DIR = os.getenv("QIMG_DIR", "./static/qimg")
+from psycopg2.extras import execute_values
+from db import get_conn, release_conn
+from utils.textnorm import normalize_inline
+from media_store import store_question_image, store_question_image_file
+from dedup import (
+    NEAR_DUP_DISTANCE, simhash, question_signature_text, hamming, lsh_bands,
+    find_near_duplicates, index_signatures,
+)
+
+# 入库时是否跳过与已有题目近重复的题（可被接口参数覆盖）
+DEDUP_SKIP_ON_INGEST = os.getenv("DEDUP_SKIP_ON_INGEST", "false").lower() in ("1", "true", "yes")
+
+# pandoc 转换池：同时运行的 pandoc 进程上限、排队等待秒数、单次转换超时秒数。
+# 排队超时（池已满）时回退到 python-docx 解析，避免并发导入时请求长时间阻塞。
+PANDOC_WORKERS = max(1, int(os.getenv("PANDOC_WORKERS", "2")))
+PANDOC_QUEUE_TIMEOUT = float(os.getenv("PANDOC_QUEUE_TIMEOUT", "10"))
+PANDOC_TIMEOUT = float(os.getenv("PANDOC_TIMEOUT", "120"))
+_pandoc_slots = threading.BoundedSemaphore(PANDOC_WORKERS)
 
 # 正则
 RE_QHEAD = re.compile(r"^\s*(\d+)[\.、]\s*[【(（]?\s*(判断题|单选题|多选题|填空题|证明题)\s*[】)）]?\s*", re.I)
@@ -20,110 +35,26 @@ DIFF_MAP = {"易":1, "中":2, "难":3, "easy":1, "medium":2, "hard":3}
 def sha256_text(s: str) -> str:
     return hashlib.sha256(s.encode("utf-8")).hexdigest()
 
+def question_sha256(stem_md: Optional[str], options: Optional[Dict], answer_text: Optional[str], explanation_md: Optional[str]) -> str:
+    """题目去重用的内容哈希（题干 + 选项 + 答案 + 解析）；入库与编辑时一致计算"""
+    canon = (stem_md or "") + "\n" + json.dumps(options or {}, ensure_ascii=False) + "\n" + (answer_text or "") + "\n" + (explanation_md or "")
+    return sha256_text(canon)
+
 def ensure_dir(d: str): 
     os.makedirs(d, exist_ok=True)
 
 
-def _normalize_inline(text: str) -> str:
-    """
-    去重清洗：删除多余引号与连续重复的括号/坐标对。
-    """
-    if not text:
-        return text
-    
-    t = text
-    # 1. 统一 Unicode prime/各种引号
-    t = t.replace("′", "'").replace(""", '"').replace(""", '"').replace("'", "'").replace("'", "'")
-    
-    # 2. 删除引号完整包裹的内容
-    t = re.sub(r"(['\"])\s*(\([^)]+\))\s*\1", r"\2", t)  # '(1,3)' → (1,3)
-    t = re.sub(r"(['\"])\s*(\d+)\s*\1", r"\2", t)        # '3' → 3
-    
-    # 3. 合并连续相同引号
-    t = re.sub(r"'{2,}", "'", t)
-    t = re.sub(r'"{2,}', '"', t)
-    
-    # 4. 终极去重：删除任何连续重复的括号内容（无论有无空格）
-    #    匹配 (xxx)(xxx) 或 (xxx) (xxx)，只保留一份
-    while True:
-        before = t
-        # 先处理紧邻重复
-        t = re.sub(r'(\([^)]+\))\s*\1', r'\1', t)
-        # 再处理任意空白分隔的重复
-        t = re.sub(r'(\(\s*[^)]+\s*\))\s+\1', r'\1', t)
-        if t == before:
-            break  # 没有更多重复了
-    
-    # 5. 专门处理坐标格式的变体（如 (1,3) 和 (1, 3) 被认为是同一个）
-    def _normalize_coords(s: str) -> str:
-        return re.sub(r'\(\s*(\d+)\s*,\s*(\d+)\s*\)', r'(\1,\2)', s)
-    t = _normalize_coords(t)
-    
-    # 6. 删除连续重复的数学环境（如 $x$$x$ 或 $$y$$$$y$$）
-    #    核心问题：Pandoc 把 Word 公式识别成两份，且中间无空格
-    #    策略：先标准化（加空格），再去重，最后还原
-    
-    # Step 1: 在所有 $ 符号后添加临时标记空格（便于反向引用匹配）
-    t = re.sub(r'\$(?!\s)', '$ ', t)  # $ 后面不是空格就加空格
-    
-    # Step 2: 去重（现在 $x$ $x$ 可以被 \1 匹配）
-    while True:
-        before = t
-        # 内联公式去重
-        t = re.sub(r'(\$\s*[^\$]+?\s*\$)\s*\1', r'\1', t)
-        # 块级公式去重
-        t = re.sub(r'(\$\$\s*[^\$]+?\s*\$\$)\s*\1', r'\1', t)
-        if t == before:
-            break
-    
-    # Step 3: 移除多余的空格（还原紧凑格式）
-    t = re.sub(r'\$\s+', '$', t)  # $ 后的空格删除
-    
-    # 7. 终极通用去重：删除任何连续重复的文本片段（至少5个字符，避免误删）
-    #    例如："A = {1,2,3,4}A = {1,2,3,4}" → "A = {1,2,3,4}"
-    #    策略：找到长度≥5且连续重复的子串
-    def _remove_text_duplicates(s: str) -> str:
-        # 使用滑动窗口查找重复
-        max_attempts = 10  # 防止无限循环
-        for _ in range(max_attempts):
-            found = False
-            # 从长到短尝试（优先删除长片段）
-            for length in range(len(s) // 2, 4, -1):  # 最小5个字符
-                for i in range(len(s) - length * 2 + 1):
-                    chunk = s[i:i+length]
-                    next_chunk = s[i+length:i+length*2]
-                    # 如果两个片段完全相同（忽略首尾空格）
-                    if chunk.strip() == next_chunk.strip() and len(chunk.strip()) >= 5:
-                        # 删除第二个片段
-                        s = s[:i+length] + s[i+length*2:]
-                        found = True
-                        break
-                if found:
-                    break
-            if not found:
-                break
-        return s
-    
-    t = _remove_text_duplicates(t)
-    
-    return t
-
 def save_inline_images(doc: Document, base_name: str) -> Dict[str, str]:
     """
-    导出 docx 内联图片；返回 {rid: /static/qimg/xxx.png}
+    导出 docx 内联图片；返回 {rid: /media/qimg/ab/cd/<sha256>.w960.webp 或原图 URL}
     """
-    ensure_dir(IMG_DIR)
     mapping = {}
-    # 遍历关系 part（python-docx 的图片以关系 id 引用）
+    # 遍历关系 part（python-docx 的图片以关系 id 引用）；按内容寻址保存，相同图片只存一份
     media = doc.part._rels
     for rid, rel in media.items():
         if "image" in rel.reltype:
             ext = os.path.splitext(rel.target_ref)[1] or ".png"
-            fname = f"{base_name}-{uuid.uuid4().hex}{ext}"
-            out_path = os.path.join(IMG_DIR, fname)
-            with open(out_path, "wb") as f:
-                f.write(rel.target_part.blob)
-            mapping[rid] = f"/static/qimg/{fname}"
+            mapping[rid] = store_question_image(rel.target_part.blob, ext)
     return mapping
 
 def para_to_markdown(p, img_map: Dict[str, str]) -> str:
@@ -150,6 +81,7 @@ def para_to_markdown(p, img_map: Dict[str, str]) -> str:
 
 # ---------- 使用 pandoc 将 docx 转为 Markdown（含 LaTeX 公式） ----------
 
+@lru_cache(maxsize=1)
 def _which_pandoc() -> Optional[str]:
     exe = shutil.which("pandoc") or shutil.which("pandoc.exe")
     if exe:
@@ -163,11 +95,21 @@ def _which_pandoc() -> Optional[str]:
     return None
 
 
-def _pandoc_docx_to_markdown_with_media(path: str) -> Optional[str]:
+def _pandoc_docx_to_markdown_with_media(path: str, wait: Optional[float] = None) -> Optional[str]:
+    """用 pandoc 转换 docx；wait 为在转换池中排队的最长秒数，超时返回 None 由调用方回退"""
     pandoc = _which_pandoc()
     if not pandoc:
         return None
-    ensure_dir(IMG_DIR)
+    if not _pandoc_slots.acquire(timeout=PANDOC_QUEUE_TIMEOUT if wait is None else wait):
+        print(f"pandoc 转换池已满，回退到 python-docx: {os.path.basename(path)}")
+        return None
+    try:
+        return _run_pandoc(pandoc, path)
+    finally:
+        _pandoc_slots.release()
+
+
+def _run_pandoc(pandoc: str, path: str) -> Optional[str]:
     with tempfile.TemporaryDirectory() as td:
         md_out = os.path.join(td, "out.md")
         cmd = [
@@ -182,7 +124,10 @@ def _pandoc_docx_to_markdown_with_media(path: str) -> Optional[str]:
             "-o",
             md_out,
         ]
-        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+        try:
+            proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False, timeout=PANDOC_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            return None
         if proc.returncode != 0 or not os.path.exists(md_out):
             return None
         with open(md_out, "r", encoding="utf-8") as f:
@@ -194,12 +139,8 @@ def _pandoc_docx_to_markdown_with_media(path: str) -> Optional[str]:
             for root, _dirs, files in os.walk(media_root):
                 for name in files:
                     src = os.path.join(root, name)
-                    ext = os.path.splitext(name)[1] or ".png"
-                    new_name = f"{uuid.uuid4().hex}{ext}"
-                    dst = os.path.join(IMG_DIR, new_name)
-                    shutil.move(src, dst)
                     rel = os.path.relpath(src, td).replace("\\", "/")
-                    mapping[rel] = f"/static/qimg/{new_name}"
+                    mapping[rel] = store_question_image_file(src)
 
         def repl(m):
             p = m.group(1)
@@ -210,7 +151,10 @@ def _pandoc_docx_to_markdown_with_media(path: str) -> Optional[str]:
 
 
 def _parse_markdown_questions(md: str) -> List[Dict]:
-    lines = [_normalize_inline(ln.rstrip()) for ln in md.splitlines()]
+    # 行先整体清洗一次，选项 / 题干 / 解析片段再各清洗一次：normalize_inline 不是幂等的，
+    # 第二次清洗会改变部分文本，而 question.sha256 由清洗后的字段计算，两次都保留才能与已入库的题目去重。
+    # 第二次的输入多数与第一次的输出相同，由 lru_cache 直接命中
+    lines = [normalize_inline(ln.rstrip()) for ln in md.splitlines()]
     qs: List[Dict] = []
     cur: Dict = {}
 
@@ -225,8 +169,7 @@ def _parse_markdown_questions(md: str) -> List[Dict]:
         answer = cur.get("answer_text")
         diff = cur.get("difficulty", 2)
         tags = cur.get("tags", [])
-        canon = stem + "\n" + json.dumps(options, ensure_ascii=False) + "\n" + (answer or "") + "\n" + expl
-        sha = sha256_text(canon)
+        sha = question_sha256(stem, options, answer, expl)
         qs.append({
             "qtype": qtype,
             "stem_md": stem,
@@ -257,7 +200,7 @@ def _parse_markdown_questions(md: str) -> List[Dict]:
             mdif = RE_DIFF.match(text)
             if mopt:
                 k, _v = mopt.groups()
-                cur["options"][k] = _normalize_inline(mopt.group(2).strip())
+                cur["options"][k] = normalize_inline(mopt.group(2).strip())
             elif mans:
                 cur["answer_text"] = mans.group(1).strip().upper().replace("对","True").replace("错","False")
             elif mdif:
@@ -266,12 +209,12 @@ def _parse_markdown_questions(md: str) -> List[Dict]:
                 if text.startswith(("解析：","解：","【解析】")):
                     cur.setdefault("_in_expl", True)
                     content = text.split("：",1)[-1] if "：" in text else text
-                    cur["expl_parts"].append(_normalize_inline(content))
+                    cur["expl_parts"].append(normalize_inline(content))
                 else:
                     if cur.get("_in_expl"):
-                        cur["expl_parts"].append(_normalize_inline(text))
+                        cur["expl_parts"].append(normalize_inline(text))
                     else:
-                        cur["stem_parts"].append(_normalize_inline(text))
+                        cur["stem_parts"].append(normalize_inline(text))
 
     flush()
     return qs
@@ -300,8 +243,7 @@ def parse_docx_questions(path: str) -> List[Dict]:
         answer = cur.get("answer_text")
         diff = cur.get("difficulty", 2)
         tags = cur.get("tags", [])
-        canon = stem + "\n" + json.dumps(options, ensure_ascii=False) + "\n" + (answer or "") + "\n" + expl
-        sha = sha256_text(canon)
+        sha = question_sha256(stem, options, answer, expl)
         qs.append({
             "qtype": qtype,
             "stem_md": stem,
@@ -315,8 +257,9 @@ def parse_docx_questions(path: str) -> List[Dict]:
         cur = {}
 
     for p in doc.paragraphs:
-        text = _normalize_inline((p.text or "").strip())
-        md = _normalize_inline(para_to_markdown(p, img_map))
+        # 与 _parse_markdown_questions 相同：段落清洗一次，拆出的字段再清洗一次（sha256 依赖于此）
+        text = normalize_inline((p.text or "").strip())
+        md = normalize_inline(para_to_markdown(p, img_map))
         if not text and not md: 
             continue
 
@@ -336,7 +279,7 @@ def parse_docx_questions(path: str) -> List[Dict]:
             mdif = RE_DIFF.match(text)  # 难度
             if mopt:
                 k, v = mopt.groups()
-                cur["options"][k] = _normalize_inline(mopt.group(2).strip())
+                cur["options"][k] = normalize_inline(mopt.group(2).strip())
                 continue
             elif mans:
                 cur["answer_text"] = mans.group(1).strip().upper().replace("对","True").replace("错","False")
@@ -349,12 +292,12 @@ def parse_docx_questions(path: str) -> List[Dict]:
                 if text.startswith(("解析：","解：","【解析】")):
                     cur.setdefault("_in_expl", True)
                     content = md.split("：",1)[-1] if "：" in md else md
-                    cur["expl_parts"].append(_normalize_inline(content))
+                    cur["expl_parts"].append(normalize_inline(content))
                 else:
                     if cur.get("_in_expl"):
-                        cur["expl_parts"].append(_normalize_inline(md))
+                        cur["expl_parts"].append(normalize_inline(md))
                     else:
-                        cur["stem_parts"].append(_normalize_inline(md))
+                        cur["stem_parts"].append(normalize_inline(md))
         else:
             # 文档前言/空段落，忽略
             pass
@@ -362,26 +305,92 @@ def parse_docx_questions(path: str) -> List[Dict]:
     flush()
     return qs
 
-def insert_questions(rows: List[Dict], source_file: str) -> int:
-    if not rows: return 0
-    inserted = 0
-    with psycopg.connect(PG_URL) as conn:
+def parse_docx_questions_batch(paths: List[str]) -> List[List[Dict]]:
+    """批量解析多个题库文件，按转换池并发度并行，结果与 paths 顺序一致"""
+    if len(paths) <= 1:
+        return [parse_docx_questions(p) for p in paths]
+    with ThreadPoolExecutor(max_workers=min(PANDOC_WORKERS, len(paths))) as pool:
+        return list(pool.map(parse_docx_questions, paths))
+
+# 批量写入题目时每条 INSERT 携带的行数
+INSERT_BATCH_SIZE = 500
+
+
+def _skip_near_duplicates(cur, rows: List[Dict], sigs: List[Optional[int]]) -> Tuple[List[Dict], List[Optional[int]]]:
+    """剔除与库中已有题目、或与本批前面题目近重复的题"""
+    kept_rows: List[Dict] = []
+    kept_sigs: List[Optional[int]] = []
+    # 本批已保留签名的 LSH 桶：(段号, 桶值) -> [签名]
+    local: Dict[Tuple[int, int], List[int]] = {}
+    for r, sig in zip(rows, sigs):
+        if sig is not None:
+            bands = lsh_bands(sig)
+            if any(hamming(sig, other) <= NEAR_DUP_DISTANCE for band in bands for other in local.get(band, ())):
+                continue
+            if find_near_duplicates(cur, "question", sig):
+                continue
+            for band in bands:
+                local.setdefault(band, []).append(sig)
+        kept_rows.append(r)
+        kept_sigs.append(sig)
+    return kept_rows, kept_sigs
+
+
+def insert_questions(rows: List[Dict], source_file: str, skip_duplicates: Optional[bool] = None) -> Dict[str, int]:
+    """
+    批量写入题目（连接池 + 多行 INSERT … ON CONFLICT (sha256) DO NOTHING RETURNING），
+    返回 {"inserted", "skipped_existing", "skipped_duplicates", "total"}：
+    skipped_existing 为 sha256 已存在（含同批重复）的题数，skipped_duplicates 为近重复跳过的题数。
+    """
+    stats = {"inserted": 0, "skipped_existing": 0, "skipped_duplicates": 0, "total": len(rows)}
+    if not rows:
+        return stats
+    if skip_duplicates is None:
+        skip_duplicates = DEDUP_SKIP_ON_INGEST
+
+    sigs = [simhash(question_signature_text(r["stem_md"], r.get("options_json"))) for r in rows]
+    conn = get_conn()
+    # 整批在同一事务内写入，出错整体回滚；不能依赖连接池归还时的会话状态
+    conn.autocommit = False
+    try:
         with conn.cursor() as cur:
-            for r in rows:
-                try:
-                    cur.execute("""
-                      INSERT INTO question(qtype, stem_md, options_json, answer_text, explanation_md,
-                                           tags, difficulty, source_file, sha256)
-                      VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
-                      ON CONFLICT (sha256) DO NOTHING
-                    """, (r["qtype"], r["stem_md"], json.dumps(r["options_json"], ensure_ascii=False) if r["options_json"] else None,
-                          r.get("answer_text"), r.get("explanation_md"),
-                          r.get("tags"), r.get("difficulty"), source_file, r["sha256"]))
-                    inserted += 1
-                except Exception as e:
-                    print("skip one:", e)
+            if skip_duplicates:
+                rows, sigs = _skip_near_duplicates(cur, rows, sigs)
+                stats["skipped_duplicates"] = stats["total"] - len(rows)
+
+            values = [
+                (r["qtype"], r["stem_md"], json.dumps(r["options_json"], ensure_ascii=False) if r["options_json"] else None,
+                 r.get("answer_text"), r.get("explanation_md"),
+                 r.get("tags"), r.get("difficulty"), source_file, r["sha256"], sig)
+                for r, sig in zip(rows, sigs)
+            ]
+            sig_by_sha = {r["sha256"]: sig for r, sig in zip(rows, sigs)}
+            for start in range(0, len(values), INSERT_BATCH_SIZE):
+                page = values[start:start + INSERT_BATCH_SIZE]
+                returned = execute_values(
+                    cur,
+                    """
+                    INSERT INTO public.question (qtype, stem_md, options_json, answer_text, explanation_md,
+                                                 tags, difficulty, source_file, sha256, simhash)
+                    VALUES %s
+                    ON CONFLICT (sha256) DO NOTHING
+                    RETURNING qid, sha256
+                    """,
+                    page,
+                    page_size=len(page),
+                    fetch=True,
+                )
+                index_signatures(cur, "question", [(qid, sig_by_sha[sha]) for qid, sha in returned])
+                stats["inserted"] += len(returned)
         conn.commit()
-    return inserted
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        release_conn(conn)
+
+    stats["skipped_existing"] = stats["total"] - stats["skipped_duplicates"] - stats["inserted"]
+    return stats
 
 def main():
     import sys
@@ -389,8 +398,9 @@ def main():
         print("用法: python ingest_qbank.py /path/to/题库.docx"); return
     path = sys.argv[1]
     rows = parse_docx_questions(path)
-    n = insert_questions(rows, os.path.basename(path))
-    print(f"[OK] {os.path.basename(path)} 导入 {n} 题（含图片引用） -> question 表")
+    stats = insert_questions(rows, os.path.basename(path))
+    print(f"[OK] {os.path.basename(path)} 导入 {stats['inserted']} 题（含图片引用），"
+          f"已存在 {stats['skipped_existing']} 题，近重复跳过 {stats['skipped_duplicates']} 题 -> question 表")
 
 if __name__ == "__main__":
     main()
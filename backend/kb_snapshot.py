@@ -0,0 +1,388 @@
+"""知识库快照导出 / 导入
+
+快照为 tar.gz 归档，依次包含：
+- manifest.json：格式版本、各表列名与行数；
+- doc.csv / tag.csv / chunk.csv / chunk_tag.csv / question.csv：由 COPY ... TO STDOUT 导出的未删除行；
+- media/<aa>/<bb>/<sha>.<ext>：题目引用的原图（变体按需重新生成，不打包）。
+
+导入时顺序读取归档，CSV 直接 COPY 进临时暂存表，再在一个事务内用集合 SQL 写入正式表：
+文档与题目按 sha256 去重（已存在的更新元数据，文档已存在时不再导入其分片；
+匹配到已软删除的行时恢复该行，文档的分片按快照重新导入），
+标签按名称合并，新行的 id 由各表序列 nextval 重新分配，分片 / 标签关联按新旧 id 映射改写。
+导入行数较多时先删除 trigram 索引，写入完成后统一重建一次。
+
+用法：
+    python kb_snapshot.py export kb.tar.gz
+    python kb_snapshot.py import kb.tar.gz
+"""
+import io
+import json
+import os
+import re
+import sys
+import tarfile
+import tempfile
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from db import get_conn, release_conn, TRGM_INDEXES
+from dedup import LSH_BANDS, BAND_BITS
+from media_store import IMG_DIR, iter_stored_images, is_original_image, restore_image
+
+
+SNAPSHOT_VERSION = 1
+# 导入的分片 + 题目超过该行数时，先删除 trigram 索引、导入后重建
+SNAPSHOT_REBUILD_INDEX_ROWS = int(os.getenv("SNAPSHOT_REBUILD_INDEX_ROWS", "20000"))
+
+# 表 -> 快照列，按导出顺序排列
+SNAPSHOT_TABLES: Dict[str, List[str]] = {
+    "doc": [
+        "doc_id", "title", "chapter", "section_number", "source_filename", "source",
+        "sha256", "is_published", "created_at",
+    ],
+    "tag": ["tag_id", "name", "color", "created_at"],
+    "chunk": [
+        "chunk_id", "doc_id", "kind", "heading_h1", "heading_h2", "anchor",
+        "content_md", "content_plain", "canonical", "tokens", "simhash",
+        "is_verified", "quality_score", "created_at",
+    ],
+    "chunk_tag": ["chunk_id", "tag_id"],
+    "question": [
+        "qid", "qtype", "stem_md", "options_json", "answer_text", "explanation_md",
+        "tags", "difficulty", "source_file", "sha256", "simhash", "is_published", "created_at",
+    ],
+}
+
+_EXPORT_QUERIES = {
+    "doc": "SELECT {cols} FROM public.doc WHERE deleted_at IS NULL ORDER BY doc_id",
+    "tag": "SELECT {cols} FROM public.tag ORDER BY tag_id",
+    "chunk": """
+        SELECT {cols} FROM public.chunk c
+        WHERE c.deleted_at IS NULL
+          AND EXISTS (SELECT 1 FROM public.doc d WHERE d.doc_id = c.doc_id AND d.deleted_at IS NULL)
+        ORDER BY c.chunk_id
+    """,
+    "chunk_tag": """
+        SELECT {cols} FROM public.chunk_tag ct
+        WHERE EXISTS (SELECT 1 FROM public.chunk c WHERE c.chunk_id = ct.chunk_id AND c.deleted_at IS NULL)
+    """,
+    "question": "SELECT {cols} FROM public.question WHERE deleted_at IS NULL ORDER BY qid",
+}
+
+_MEDIA_NAME_RE = re.compile(r"^media/([0-9a-f]{2})/([0-9a-f]{2})/([^/]+)$")
+
+
+# ---------------------------------------------------------------------------
+# 导出
+# ---------------------------------------------------------------------------
+
+def _add_bytes(tar: tarfile.TarFile, name: str, data: bytes) -> None:
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(datetime.now().timestamp())
+    tar.addfile(info, io.BytesIO(data))
+
+
+def export_snapshot(path: str) -> Dict[str, Any]:
+    """把未删除的文档、分片、标签、题目与题目图片写入 tar.gz 快照，返回各表行数"""
+    conn = get_conn()
+    # SET TRANSACTION 只在事务模式下生效
+    conn.autocommit = False
+    try:
+        with conn.cursor() as cur:
+            # 所有表读取同一时刻的数据
+            cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+            with tarfile.open(path, "w:gz") as tar:
+                counts: Dict[str, int] = {}
+                files = {}
+                for table, cols in SNAPSHOT_TABLES.items():
+                    tmp = tempfile.TemporaryFile()
+                    sql = _EXPORT_QUERIES[table].format(cols=", ".join(cols))
+                    cur.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER true)", tmp)
+                    counts[table] = cur.rowcount
+                    files[table] = tmp
+
+                cur.execute(
+                    """
+                    SELECT DISTINCT unnest(public.qimg_refs(
+                        concat_ws(' ', stem_md, options_json::text, explanation_md)
+                    ))
+                    FROM public.question
+                    WHERE deleted_at IS NULL
+                    """
+                )
+                referenced = {r[0] for r in cur.fetchall()}
+
+                manifest = {
+                    "version": SNAPSHOT_VERSION,
+                    "created_at": datetime.now().isoformat(timespec="seconds"),
+                    "tables": {t: {"columns": SNAPSHOT_TABLES[t], "rows": counts[t]} for t in SNAPSHOT_TABLES},
+                }
+                _add_bytes(tar, "manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8"))
+                for table, tmp in files.items():
+                    info = tarfile.TarInfo(f"{table}.csv")
+                    info.size = tmp.tell()
+                    info.mtime = int(datetime.now().timestamp())
+                    tmp.seek(0)
+                    tar.addfile(info, tmp)
+                    tmp.close()
+
+                images = 0
+                for sha, img_path in iter_stored_images():
+                    name = os.path.basename(img_path)
+                    if sha in referenced and is_original_image(name):
+                        tar.add(img_path, arcname="media/" + os.path.relpath(img_path, IMG_DIR).replace(os.sep, "/"))
+                        images += 1
+        conn.rollback()
+        return {"tables": counts, "images": images}
+    finally:
+        release_conn(conn)
+
+
+# ---------------------------------------------------------------------------
+# 导入
+# ---------------------------------------------------------------------------
+
+def _create_staging(cur) -> None:
+    for table, cols in SNAPSHOT_TABLES.items():
+        cur.execute(
+            f"""
+            CREATE TEMP TABLE snap_{table} ON COMMIT DROP AS
+            SELECT {', '.join(cols)} FROM public.{table} WITH NO DATA
+            """
+        )
+    for table in ("doc", "tag", "chunk"):
+        cur.execute(f"ALTER TABLE snap_{table} ADD COLUMN new_id BIGINT, ADD COLUMN is_new BOOLEAN NOT NULL DEFAULT false")
+    # 匹配到已软删除的文档：沿用原 id 并恢复，其分片（原分片已软删除）按快照重新导入
+    cur.execute("ALTER TABLE snap_doc ADD COLUMN restored BOOLEAN NOT NULL DEFAULT false")
+
+
+def _copy_member(cur, table: str, columns: List[str], fileobj) -> None:
+    unknown = set(columns) - set(SNAPSHOT_TABLES[table])
+    if unknown:
+        raise ValueError(f"快照中 {table} 含未知列: {', '.join(sorted(unknown))}")
+    cur.copy_expert(
+        f"COPY snap_{table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, HEADER true)",
+        fileobj,
+    )
+
+
+def _lsh_insert_sql(item_type: str, source_sql: str) -> str:
+    """把 (id, simhash) 结果集按 dedup.lsh_bands 的切分写入 lsh_bucket"""
+    mask = (1 << BAND_BITS) - 1
+    return f"""
+        INSERT INTO public.lsh_bucket (item_type, item_id, band, bucket, sig)
+        SELECT '{item_type}', s.item_id, b, ((s.sig >> (b * {BAND_BITS})) & {mask})::int, s.sig
+        FROM ({source_sql}) AS s(item_id, sig)
+        CROSS JOIN generate_series(0, {LSH_BANDS - 1}) AS b
+        WHERE s.sig IS NOT NULL
+        ON CONFLICT (item_type, item_id, band) DO UPDATE
+          SET bucket = EXCLUDED.bucket, sig = EXCLUDED.sig
+    """
+
+
+def _merge(cur) -> Dict[str, int]:
+    """暂存表 -> 正式表，返回各类写入计数"""
+    stats: Dict[str, int] = {}
+
+    # 文档：sha256 已存在的沿用原 id 并更新元数据（已软删除的同时恢复），其余按序列分配新 id
+    cur.execute(
+        """
+        UPDATE snap_doc s SET new_id = d.doc_id, restored = d.deleted_at IS NOT NULL
+        FROM public.doc d
+        WHERE s.sha256 IS NOT NULL AND d.sha256 = s.sha256
+        """
+    )
+    cur.execute(
+        """
+        UPDATE snap_doc
+        SET new_id = nextval(pg_get_serial_sequence('public.doc', 'doc_id')), is_new = true
+        WHERE new_id IS NULL
+        """
+    )
+    cur.execute(
+        """
+        INSERT INTO public.doc (doc_id, title, chapter, section_number, source_filename, source, sha256, is_published, created_at)
+        SELECT new_id, title, chapter, section_number, source_filename, source, sha256, is_published, created_at
+        FROM snap_doc WHERE is_new
+        """
+    )
+    stats["docs_inserted"] = cur.rowcount
+    cur.execute(
+        """
+        UPDATE public.doc d
+        SET title = s.title, chapter = s.chapter, section_number = s.section_number,
+            source = s.source, is_published = s.is_published, deleted_at = NULL
+        FROM snap_doc s
+        WHERE NOT s.is_new AND d.doc_id = s.new_id
+          AND (d.title, d.chapter, d.section_number, d.source, d.is_published, d.deleted_at)
+              IS DISTINCT FROM (s.title, s.chapter, s.section_number, s.source, s.is_published, NULL)
+        """
+    )
+    stats["docs_updated"] = cur.rowcount
+    cur.execute("SELECT COUNT(*) FROM snap_doc WHERE restored")
+    stats["docs_restored"] = cur.fetchone()[0]
+
+    # 标签：按名称合并
+    cur.execute(
+        """
+        INSERT INTO public.tag (name, color, created_at)
+        SELECT name, color, created_at FROM snap_tag
+        ON CONFLICT (name) DO NOTHING
+        """
+    )
+    stats["tags_inserted"] = cur.rowcount
+    cur.execute("UPDATE snap_tag s SET new_id = t.tag_id FROM public.tag t WHERE t.name = s.name")
+
+    # 分片：只导入新建或恢复的文档下的分片
+    cur.execute(
+        """
+        UPDATE snap_chunk c
+        SET new_id = nextval(pg_get_serial_sequence('public.chunk', 'chunk_id')), is_new = true
+        FROM snap_doc d
+        WHERE d.doc_id = c.doc_id AND (d.is_new OR d.restored)
+        """
+    )
+    cur.execute(
+        """
+        INSERT INTO public.chunk (chunk_id, doc_id, kind, heading_h1, heading_h2, anchor, content_md, content_plain,
+                                  canonical, tokens, simhash, is_verified, quality_score, created_at)
+        SELECT c.new_id, d.new_id, c.kind, c.heading_h1, c.heading_h2, c.anchor, c.content_md, c.content_plain,
+               c.canonical, c.tokens, c.simhash, c.is_verified, c.quality_score, c.created_at
+        FROM snap_chunk c
+        JOIN snap_doc d ON d.doc_id = c.doc_id
+        WHERE c.is_new
+        """
+    )
+    stats["chunks_inserted"] = cur.rowcount
+    cur.execute(
+        """
+        INSERT INTO public.chunk_tag (chunk_id, tag_id)
+        SELECT c.new_id, t.new_id
+        FROM snap_chunk_tag ct
+        JOIN snap_chunk c ON c.chunk_id = ct.chunk_id AND c.is_new
+        JOIN snap_tag t ON t.tag_id = ct.tag_id
+        ON CONFLICT DO NOTHING
+        """
+    )
+    stats["chunk_tags_inserted"] = cur.rowcount
+    cur.execute(_lsh_insert_sql("chunk", "SELECT new_id, simhash FROM snap_chunk WHERE is_new"))
+
+    # 题目：按 sha256 upsert，已软删除的同时恢复（图片引用计数由 question 上的触发器维护）
+    cur.execute(
+        """
+        SELECT COUNT(*) FROM public.question q
+        JOIN snap_question s ON s.sha256 = q.sha256
+        WHERE q.deleted_at IS NOT NULL
+        """
+    )
+    stats["questions_restored"] = cur.fetchone()[0]
+    cur.execute(
+        """
+        WITH upserted AS (
+            INSERT INTO public.question (qtype, stem_md, options_json, answer_text, explanation_md, tags,
+                                         difficulty, source_file, sha256, simhash, is_published, created_at)
+            SELECT qtype, stem_md, options_json, answer_text, explanation_md, tags,
+                   difficulty, source_file, sha256, simhash, is_published, created_at
+            FROM snap_question
+            ON CONFLICT (sha256) DO UPDATE
+              SET qtype = EXCLUDED.qtype, stem_md = EXCLUDED.stem_md, options_json = EXCLUDED.options_json,
+                  answer_text = EXCLUDED.answer_text, explanation_md = EXCLUDED.explanation_md,
+                  tags = EXCLUDED.tags, difficulty = EXCLUDED.difficulty, simhash = EXCLUDED.simhash,
+                  is_published = EXCLUDED.is_published, deleted_at = NULL
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted) FROM upserted
+        """
+    )
+    stats["questions_inserted"], stats["questions_updated"] = cur.fetchone()
+    cur.execute(_lsh_insert_sql(
+        "question",
+        "SELECT q.qid, q.simhash FROM public.question q JOIN snap_question s ON s.sha256 = q.sha256",
+    ))
+    return stats
+
+
+def _drop_trgm_indexes(cur) -> List[str]:
+    cur.execute(
+        "SELECT indexname FROM pg_indexes WHERE schemaname = 'public' AND indexname = ANY(%s)",
+        (list(TRGM_INDEXES),),
+    )
+    names = [r[0] for r in cur.fetchall()]
+    for name in names:
+        cur.execute(f"DROP INDEX public.{name}")
+    return names
+
+
+def import_snapshot(fileobj, rebuild_indexes: Optional[bool] = None) -> Dict[str, Any]:
+    """
+    从快照归档（tar / tar.gz 文件对象，可不支持 seek）导入；全部数据在一个事务内写入。
+    rebuild_indexes 为 None 时按导入行数自动决定是否先删除再重建 trigram 索引。
+    """
+    conn = get_conn()
+    # ON COMMIT DROP 暂存表与单事务写入都依赖事务模式
+    conn.autocommit = False
+    try:
+        with conn.cursor() as cur, tarfile.open(fileobj=fileobj, mode="r|*") as tar:
+            _create_staging(cur)
+            manifest = None
+            images = 0
+            for member in tar:
+                if not member.isfile():
+                    continue
+                f = tar.extractfile(member)
+                if member.name == "manifest.json":
+                    manifest = json.loads(f.read().decode("utf-8"))
+                    if manifest.get("version") != SNAPSHOT_VERSION:
+                        raise ValueError(f"不支持的快照版本: {manifest.get('version')}")
+                    continue
+                table = member.name[:-4] if member.name.endswith(".csv") else None
+                if table in SNAPSHOT_TABLES:
+                    if manifest is None:
+                        raise ValueError("快照缺少 manifest.json 或顺序错误")
+                    columns = manifest["tables"].get(table, {}).get("columns") or SNAPSHOT_TABLES[table]
+                    _copy_member(cur, table, columns, f)
+                    continue
+                m = _MEDIA_NAME_RE.match(member.name)
+                if m and restore_image(m.group(3), f.read()):
+                    images += 1
+            if manifest is None:
+                raise ValueError("快照缺少 manifest.json")
+
+            cur.execute("SELECT (SELECT COUNT(*) FROM snap_chunk) + (SELECT COUNT(*) FROM snap_question)")
+            staged = cur.fetchone()[0]
+            if rebuild_indexes is None:
+                rebuild_indexes = staged >= SNAPSHOT_REBUILD_INDEX_ROWS
+            dropped = _drop_trgm_indexes(cur) if rebuild_indexes else []
+
+            stats = _merge(cur)
+
+            for name in dropped:
+                cur.execute(TRGM_INDEXES[name])
+            cur.execute("ANALYZE public.doc")
+            cur.execute("ANALYZE public.chunk")
+            cur.execute("ANALYZE public.question")
+        conn.commit()
+        return {**stats, "images": images, "rebuilt_indexes": dropped}
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        release_conn(conn)
+
+
+def main():
+    if len(sys.argv) != 3 or sys.argv[1] not in ("export", "import"):
+        print("用法: python kb_snapshot.py export|import /path/to/kb.tar.gz"); return
+    cmd, path = sys.argv[1], sys.argv[2]
+    if cmd == "export":
+        result = export_snapshot(path)
+        print(f"[OK] 快照已写入 {path}: {result['tables']}，图片 {result['images']} 个")
+    else:
+        with open(path, "rb") as f:
+            result = import_snapshot(f)
+        print(f"[OK] 已从 {path} 导入: {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""题库图片的内容寻址存储
+
+图片以字节内容的 SHA-256 命名，按前 4 位十六进制分两级目录存放：
+    static/qimg/ab/cd/abcd…ef.png  →  /media/qimg/ab/cd/abcd…ef.png
+重复导入同一题库、多份题库共用插图时只保存一份，URL 稳定，按 immutable 长期缓存。
+
+安装 Pillow 时，题库中的图片引用缩放后的 WebP 变体（abcd…ef.w960.webp），
+变体由后台线程生成；生成完成前 /media/qimg 以短缓存返回原图。
+
+引用计数保存在 qimg 表中，由 question 表上的触发器按题干 / 选项 / 解析中的图片 URL 维护；
+计数归零且超过宽限期的文件由 collect_garbage 清理。旧的 uuid 命名图片不受影响。
+"""
+import hashlib
+import io
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+try:
+    from PIL import Image
+except ImportError:  # 未安装 Pillow 时不生成变体，题目直接引用原图
+    Image = None
+
+
+IMG_DIR = os.getenv("QIMG_DIR", "./static/qimg")
+IMG_URL_PREFIX = "/media/qimg"
+# 清理宽限期：刚写入 / 刚被复用的文件在此时间内不会被清理（覆盖“解析 → 入库”之间的窗口）
+GC_GRACE_SECONDS = int(os.getenv("QIMG_GC_GRACE_SECONDS", "86400"))
+
+# Markdown / JSON 中引用内容寻址图片的片段，捕获 sha256（与数据库函数 qimg_refs 一致）
+QIMG_REF_RE = re.compile(r"qimg/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})")
+# 原图 <sha>.<ext> 与变体 <sha>.w<宽度>.webp
+_FILE_RE = re.compile(r"^([0-9a-f]{64})((?:\.w\d+)?\.[a-z0-9]{1,8})$")
+_VARIANT_SUFFIX_RE = re.compile(r"^\.w(\d+)\.webp$")
+_SHARD_RE = re.compile(r"^[0-9a-f]{2}$")
+_EXT_RE = re.compile(r"^\.[a-z0-9]{1,8}$")
+
+# 变体：限制最大宽度并转为 WebP；只处理 Pillow 可解码的位图格式（EMF/WMF/SVG 等保持原图）
+VARIANT_WIDTH = int(os.getenv("QIMG_VARIANT_WIDTH", "960"))
+VARIANT_QUALITY = int(os.getenv("QIMG_VARIANT_QUALITY", "82"))
+_VARIANT_SOURCE_FORMATS = {"PNG", "JPEG", "GIF", "BMP", "TIFF", "WEBP"}
+# 内容寻址的文件永不变化，可被浏览器 / CDN 永久缓存
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+FALLBACK_CACHE_CONTROL = "public, max-age=60"
+
+
+def _normalize_ext(ext: str) -> str:
+    ext = (ext or "").lower()
+    if ext and not ext.startswith("."):
+        ext = "." + ext
+    return ext if _EXT_RE.match(ext) else ".png"
+
+
+def image_relpath(sha: str, ext: str) -> str:
+    return f"{sha[:2]}/{sha[2:4]}/{sha}{ext}"
+
+
+def image_url(sha: str, ext: str) -> str:
+    return f"{IMG_URL_PREFIX}/{image_relpath(sha, ext)}"
+
+
+def variant_suffix(width: int) -> str:
+    return f".w{width}.webp"
+
+
+def variant_url(sha: str, width: int = VARIANT_WIDTH) -> str:
+    return f"{IMG_URL_PREFIX}/{sha[:2]}/{sha[2:4]}/{sha}{variant_suffix(width)}"
+
+
+def _store(data: bytes, ext: str) -> Tuple[str, str]:
+    """写入原图（已存在则只刷新修改时间以避开清理），返回 (sha256, 扩展名)"""
+    sha = hashlib.sha256(data).hexdigest()
+    ext = _normalize_ext(ext)
+    dst = os.path.join(IMG_DIR, image_relpath(sha, ext))
+    if os.path.exists(dst):
+        try:
+            os.utime(dst)
+        except OSError:
+            pass
+        return sha, ext
+
+    # 先写临时文件再原子改名，并发导入同一图片时不会读到半个文件
+    _atomic_write(dst, data)
+    return sha, ext
+
+
+def _atomic_write(dst: str, data: bytes) -> None:
+    shard = os.path.dirname(dst)
+    os.makedirs(shard, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=shard, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, dst)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def is_original_image(name: str) -> bool:
+    """文件名是否为原图 <sha>.<ext>（变体可按需重新生成）"""
+    m = _FILE_RE.match(name)
+    return bool(m) and not _VARIANT_SUFFIX_RE.match(m.group(2))
+
+
+def restore_image(name: str, data: bytes) -> bool:
+    """按原文件名恢复原图（如从快照导入）；文件名须与内容的 sha256 一致，否则拒绝"""
+    if not is_original_image(name):
+        return False
+    if hashlib.sha256(data).hexdigest() != name.split(".", 1)[0]:
+        return False
+    _store(data, os.path.splitext(name)[1])
+    return True
+
+
+def store_image_bytes(data: bytes, ext: str) -> str:
+    """保存图片并返回原图 URL；相同内容已存在时跳过写入"""
+    sha, ext = _store(data, ext)
+    return image_url(sha, ext)
+
+
+def store_question_image(data: bytes, ext: str) -> str:
+    """保存题目图片，返回写入 Markdown 的 URL：可生成变体时为 WebP 变体，否则为原图"""
+    sha, ext = _store(data, ext)
+    if Image is None or not _is_variant_source(data):
+        return image_url(sha, ext)
+    enqueue_variant(sha)
+    return variant_url(sha)
+
+
+def store_question_image_file(path: str) -> str:
+    """保存磁盘上的题目图片（如 pandoc 导出的 media），返回写入 Markdown 的 URL"""
+    with open(path, "rb") as f:
+        data = f.read()
+    return store_question_image(data, os.path.splitext(path)[1])
+
+
+# ---------------------------------------------------------------------------
+# 缩放 / WebP 变体
+# ---------------------------------------------------------------------------
+
+def _is_variant_source(data: bytes) -> bool:
+    """仅读取文件头判断 Pillow 能否处理该位图"""
+    try:
+        with Image.open(io.BytesIO(data)) as im:
+            return im.format in _VARIANT_SOURCE_FORMATS
+    except Exception:
+        return False
+
+
+def _find_original(sha: str) -> Optional[str]:
+    shard = os.path.join(IMG_DIR, sha[:2], sha[2:4])
+    try:
+        names = os.listdir(shard)
+    except OSError:
+        return None
+    for name in names:
+        m = _FILE_RE.match(name)
+        if m and m.group(1) == sha and not _VARIANT_SUFFIX_RE.match(m.group(2)):
+            return os.path.join(shard, name)
+    return None
+
+
+def make_variant(sha: str, width: int = VARIANT_WIDTH) -> Optional[str]:
+    """生成（或复用）宽度不超过 width 的 WebP 变体，返回其路径；原图不存在或无法解码时返回 None"""
+    dst = os.path.join(IMG_DIR, sha[:2], sha[2:4], f"{sha}{variant_suffix(width)}")
+    if os.path.exists(dst):
+        return dst
+    src = _find_original(sha)
+    if src is None or Image is None:
+        return None
+    with Image.open(src) as im:
+        im.thumbnail((width, width * 100))
+        has_alpha = im.mode in ("RGBA", "LA") or (im.mode == "P" and "transparency" in im.info)
+        im = im.convert("RGBA" if has_alpha else "RGB")
+        buf = io.BytesIO()
+        im.save(buf, format="WEBP", quality=VARIANT_QUALITY, method=4)
+    _atomic_write(dst, buf.getvalue())
+    return dst
+
+
+_variant_queue: "queue.Queue[Tuple[str, int]]" = queue.Queue()
+_variant_pending: Set[Tuple[str, int]] = set()
+_variant_lock = threading.Lock()
+_variant_thread: Optional[threading.Thread] = None
+
+
+def _variant_worker() -> None:
+    while True:
+        sha, width = _variant_queue.get()
+        try:
+            make_variant(sha, width)
+        except Exception as e:
+            print(f"[qimg] 生成变体失败 {sha}.w{width}: {e}")
+        finally:
+            with _variant_lock:
+                _variant_pending.discard((sha, width))
+            _variant_queue.task_done()
+
+
+def enqueue_variant(sha: str, width: int = VARIANT_WIDTH) -> bool:
+    """把变体生成任务交给后台线程（同一任务只排队一次）；未安装 Pillow 时返回 False"""
+    global _variant_thread
+    if Image is None:
+        return False
+    if os.path.exists(os.path.join(IMG_DIR, sha[:2], sha[2:4], f"{sha}{variant_suffix(width)}")):
+        return True
+    key = (sha, width)
+    with _variant_lock:
+        if key in _variant_pending:
+            return True
+        _variant_pending.add(key)
+        if _variant_thread is None or not _variant_thread.is_alive():
+            _variant_thread = threading.Thread(target=_variant_worker, name="qimg-variants", daemon=True)
+            _variant_thread.start()
+    _variant_queue.put(key)
+    return True
+
+
+def resolve_image(shard1: str, shard2: str, name: str) -> Optional[Tuple[str, str, bool]]:
+    """解析 /media/qimg/<shard1>/<shard2>/<name>，返回 (文件路径, 强 ETag, 是否可 immutable 缓存)。
+
+    请求的变体尚未生成时返回原图（不可长期缓存）并安排生成；文件不存在时返回 None。
+    """
+    m = _FILE_RE.match(name)
+    if not m:
+        return None
+    sha, suffix = m.groups()
+    if sha[:2] != shard1 or sha[2:4] != shard2:
+        return None
+    path = os.path.join(IMG_DIR, shard1, shard2, name)
+    if os.path.isfile(path):
+        return path, f'"{sha}{suffix}"', True
+    # 只为配置的宽度按需生成，避免任意宽度请求触发转换
+    vm = _VARIANT_SUFFIX_RE.match(suffix)
+    if not vm or int(vm.group(1)) != VARIANT_WIDTH:
+        return None
+    original = _find_original(sha)
+    if original is None:
+        return None
+    enqueue_variant(sha)
+    return original, f'"{sha}{os.path.splitext(original)[1]}"', False
+
+
+def iter_stored_images() -> Iterator[Tuple[str, str]]:
+    """遍历分片目录中的内容寻址图片，产出 (sha256, 路径)"""
+    if not os.path.isdir(IMG_DIR):
+        return
+    for d1 in os.listdir(IMG_DIR):
+        p1 = os.path.join(IMG_DIR, d1)
+        if not _SHARD_RE.match(d1) or not os.path.isdir(p1):
+            continue
+        for d2 in os.listdir(p1):
+            p2 = os.path.join(p1, d2)
+            if not _SHARD_RE.match(d2) or not os.path.isdir(p2):
+                continue
+            for name in os.listdir(p2):
+                m = _FILE_RE.match(name)
+                if m:
+                    yield m.group(1), os.path.join(p2, name)
+
+
+def collect_garbage(conn, grace_seconds: int = GC_GRACE_SECONDS, dry_run: bool = False) -> Dict[str, Any]:
+    """删除没有题目引用、且修改时间早于宽限期的图片文件，并清理对应的 qimg 记录"""
+    files: Dict[str, List[str]] = {}
+    for sha, path in iter_stored_images():
+        files.setdefault(sha, []).append(path)
+    if not files:
+        return {"scanned": 0, "removed": 0, "bytes_freed": 0, "dry_run": dry_run}
+
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT sha256 FROM public.qimg WHERE ref_count > 0 AND sha256 = ANY(%s)",
+            (list(files),),
+        )
+        referenced = {r[0] for r in cur.fetchall()}
+
+    cutoff = time.time() - grace_seconds
+    removed: List[str] = []
+    bytes_freed = 0
+    for sha, paths in files.items():
+        if sha in referenced:
+            continue
+        stale = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if st.st_mtime < cutoff:
+                stale.append((path, st.st_size))
+        if len(stale) != len(paths):
+            continue
+        for path, size in stale:
+            if not dry_run:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    continue
+            bytes_freed += size
+        removed.append(sha)
+
+    if removed and not dry_run:
+        with conn.cursor() as cur:
+            cur.execute(
+                "DELETE FROM public.qimg WHERE ref_count <= 0 AND sha256 = ANY(%s)",
+                (removed,),
+            )
+        conn.commit()
+
+    return {"scanned": len(files), "removed": len(removed), "bytes_freed": bytes_freed, "dry_run": dry_run}
+
+
+def rebuild_refcounts(conn) -> int:
+    """按 question 表现有内容重算全部引用计数（用于修复或首次启用），返回被引用的图片数"""
+    with conn.cursor() as cur:
+        # 阻塞并发的触发器更新，保证重算期间计数不丢失
+        cur.execute("LOCK TABLE public.qimg IN EXCLUSIVE MODE")
+        cur.execute("UPDATE public.qimg SET ref_count = 0, updated_at = now() WHERE ref_count <> 0")
+        cur.execute(
+            """
+            INSERT INTO public.qimg (sha256, ref_count)
+            SELECT r.sha, count(*)
+            FROM public.question q
+            CROSS JOIN LATERAL unnest(public.qimg_refs(
+                concat_ws(' ', q.stem_md, q.options_json::text, q.explanation_md)
+            )) AS r(sha)
+            GROUP BY r.sha
+            ON CONFLICT (sha256) DO UPDATE
+              SET ref_count = EXCLUDED.ref_count, updated_at = now()
+            """
+        )
+        n = cur.rowcount
+    conn.commit()
+    return n
@@ -0,0 +1,107 @@
+"""按蓝图分层随机组卷
+
+每道题在入库时获得一个均匀分布的随机键 rand_key，并在 (qtype, difficulty, rand_key) 上建索引。
+对每个分层（题型 + 难度）由种子生成起点 r0，沿索引取 rand_key ≥ r0 的前 n 题，不足时从头回绕。
+由于 rand_key 彼此独立，任意起点之后的连续 n 题即一个随机样本；整套试卷一次查询完成，无需全表排序。
+蓝图中题型与难度相同的分层会抽到同一批题，去重后靠后的分层需要补足：每个分层多取前面同类分层的
+题数，被占用的题跳过后从剩余题目中顺延补齐；题库中可用题目不足时在 sections 与 shortfall 中报告缺额。
+同一种子在题库不变时得到同一份试卷。
+"""
+import random
+from typing import Any, Dict, List, Optional, Sequence
+
+from db import _query
+
+
+QUESTION_TYPES = {"judge", "single", "multiple", "fill", "proof", "other"}
+MAX_PAPER_QUESTIONS = 200
+
+_PAPER_COLUMNS = "qid, qtype, stem_md, options_json, answer_text, explanation_md, difficulty, tags, source_file"
+
+
+def _stratum_sql(idx: int, part: int, cmp: str, tag_filter: str) -> str:
+    return f"""
+        (SELECT {idx} AS stratum, {part} AS part, rand_key, {_PAPER_COLUMNS}
+         FROM public.question
+         WHERE qtype = %s AND difficulty = %s AND rand_key {cmp} %s
+           AND deleted_at IS NULL AND COALESCE(is_published, true){tag_filter}
+         ORDER BY rand_key
+         LIMIT %s)
+    """
+
+
+def generate_paper(
+    conn,
+    blueprint: Sequence[Dict[str, Any]],
+    tags: Optional[List[str]] = None,
+    seed: Optional[int] = None,
+    include_answers: bool = True,
+) -> Dict[str, Any]:
+    """
+    blueprint 为 [{"qtype": "single", "difficulty": 2, "count": 5}, ...]；
+    tags 非空时只抽取带有任一标签的题目。返回 {"seed", "questions", "sections", "shortfall"}，
+    sections 中给出每个分层的需求数、实际抽到的题数与缺额，shortfall 为全卷缺额。
+    """
+    if not blueprint:
+        raise ValueError("蓝图不能为空")
+    total = 0
+    for item in blueprint:
+        if item.get("qtype") not in QUESTION_TYPES:
+            raise ValueError(f"qtype 仅支持: {', '.join(sorted(QUESTION_TYPES))}")
+        if int(item.get("count") or 0) < 1:
+            raise ValueError("count 必须大于 0")
+        total += int(item["count"])
+    if total > MAX_PAPER_QUESTIONS:
+        raise ValueError(f"单次组卷最多 {MAX_PAPER_QUESTIONS} 题")
+
+    if seed is None:
+        seed = random.SystemRandom().randrange(1 << 31)
+    rng = random.Random(seed)
+
+    tag_filter = " AND tags && %s::text[]" if tags else ""
+    parts: List[str] = []
+    params: List[Any] = []
+    claimed: Dict[tuple, int] = {}
+    for idx, item in enumerate(blueprint):
+        start = rng.random()
+        key = (item["qtype"], int(item["difficulty"]))
+        # 前面同题型同难度的分层最多占用 claimed[key] 题，多取这么多以便去重后补足
+        n = int(item["count"]) + claimed.get(key, 0)
+        claimed[key] = claimed.get(key, 0) + int(item["count"])
+        for part, cmp in ((0, ">="), (1, "<")):
+            parts.append(_stratum_sql(idx, part, cmp, tag_filter))
+            params.extend([item["qtype"], int(item["difficulty"]), start])
+            if tags:
+                params.append(list(tags))
+            params.append(n)
+
+    rows = _query(conn, " UNION ALL ".join(parts) + " ORDER BY stratum, part, rand_key", params)
+
+    # 按分层取前 count 题（先起点之后，再回绕部分）；多个分层重叠时同一题只出现一次，
+    # 已被前面分层选中的题跳过，由多取的题顺延补上
+    picked: Dict[int, List[Dict[str, Any]]] = {i: [] for i in range(len(blueprint))}
+    seen = set()
+    for r in rows:
+        bucket = picked[r["stratum"]]
+        if len(bucket) >= int(blueprint[r["stratum"]]["count"]) or r["qid"] in seen:
+            continue
+        seen.add(r["qid"])
+        for k in ("stratum", "part", "rand_key"):
+            r.pop(k, None)
+        if not include_answers:
+            r.pop("answer_text", None)
+            r.pop("explanation_md", None)
+        bucket.append(r)
+
+    questions: List[Dict[str, Any]] = []
+    sections = []
+    for idx, item in enumerate(blueprint):
+        questions.extend(picked[idx])
+        sections.append({
+            "qtype": item["qtype"],
+            "difficulty": int(item["difficulty"]),
+            "requested": int(item["count"]),
+            "picked": len(picked[idx]),
+            "shortfall": int(item["count"]) - len(picked[idx]),
+        })
+    return {"seed": seed, "questions": questions, "sections": sections, "shortfall": total - len(questions)}
@@ -0,0 +1,220 @@
+"""分片质量评分
+
+对每个分片计算几项廉价信号，加权得到 1–100 的 quality_score（0 表示尚未评分）：
+
+- 长度：过短的碎片与接近切分上限的长段落得分较低；
+- 公式配对：行内 / 行间公式的 $ 必须成对出现；
+- 重复率：分片内重复出现的 8 字片段占比（解析错误常导致段落重复）；
+- 标题：有小节标题（H2）的分片结构更完整；
+- 分类置信度：分类规则命中的 kind 是否一致，未命中任何规则时最低。
+
+评分按批进行：入库时在当前进程内逐批计算；对已有数据补算时，按 chunk_id 分批读取，
+交给进程池并行计算，再用一条 UPDATE ... FROM (VALUES ...) 批量写回有变化的行。
+"""
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from psycopg2.extras import execute_values
+
+from db import get_conn, release_conn, _query
+from utils.aho_corasick import KeywordAutomaton
+
+
+QUALITY_WORKERS = int(os.getenv("QUALITY_WORKERS", str(min(4, os.cpu_count() or 1))))
+QUALITY_BATCH_SIZE = int(os.getenv("QUALITY_BATCH_SIZE", "500"))
+
+# 各信号权重，合计为 1
+QUALITY_WEIGHTS = {
+    "length": 0.30,
+    "formula": 0.20,
+    "duplicate": 0.20,
+    "heading": 0.10,
+    "confidence": 0.20,
+}
+
+# 理想长度区间（content_plain 字符数）；ingest.split_with_overlap 的切分上限为 1200
+_MIN_LEN = 20
+_GOOD_LEN = 80
+_LONG_LEN = 1000
+_MAX_LEN = 1200
+_SHINGLE = 8
+
+_DOLLAR_RE = re.compile(r"(?<!\\)\$")
+
+# (content_md, content_plain, heading_h2)
+QualityInput = Tuple[Optional[str], Optional[str], Optional[str]]
+
+_worker_matcher: Optional[KeywordAutomaton] = None
+
+
+def build_rule_matcher(rules: Sequence[Tuple[str, str, int]]) -> KeywordAutomaton:
+    """在评分子进程中按规则重建分类自动机，附带数据格式与 ingest.build_kind_matcher 一致"""
+    return KeywordAutomaton(
+        (keyword, (priority, -idx, kind)) for idx, (keyword, kind, priority) in enumerate(rules)
+    )
+
+
+def length_signal(n: int) -> float:
+    if n < _MIN_LEN:
+        return 0.0
+    if n < _GOOD_LEN:
+        return (n - _MIN_LEN) / (_GOOD_LEN - _MIN_LEN)
+    if n <= _LONG_LEN:
+        return 1.0
+    return max(0.5, 1.0 - 0.5 * (n - _LONG_LEN) / (_MAX_LEN - _LONG_LEN))
+
+
+def formula_signal(md: str) -> float:
+    """$ 数量为偶数（含 $$ 行间公式）时配对完整"""
+    return 1.0 if len(_DOLLAR_RE.findall(md)) % 2 == 0 else 0.0
+
+
+def duplicate_signal(plain: str) -> float:
+    """1 - 重复片段占比；重复一半以上即为 0"""
+    text = "".join(plain.split())
+    if len(text) <= _SHINGLE:
+        return 1.0
+    shingles = [text[i:i + _SHINGLE] for i in range(len(text) - _SHINGLE + 1)]
+    dup_ratio = 1.0 - len(set(shingles)) / len(shingles)
+    return max(0.0, 1.0 - 2.0 * dup_ratio)
+
+
+def heading_signal(h2: Optional[str]) -> float:
+    h2 = (h2 or "").strip()
+    if not h2:
+        return 0.0
+    # 文档没有 H2 时以“正文”整体入库
+    return 0.5 if h2 == "正文" else 1.0
+
+
+def confidence_signal(md: str, matcher: KeywordAutomaton) -> float:
+    """命中规则中占多数的 kind 所占比例；未命中任何规则（归为默认类）时为 0.3"""
+    counts: Dict[str, int] = {}
+    for _priority, _idx, kind in matcher.iter_matches(md):
+        counts[kind] = counts.get(kind, 0) + 1
+    if not counts:
+        return 0.3
+    return max(counts.values()) / sum(counts.values())
+
+
+def score_batch(items: Sequence[QualityInput], matcher: Optional[KeywordAutomaton] = None) -> List[int]:
+    """对一批分片评分，返回与输入顺序一致的 1–100 分数"""
+    m = matcher or _worker_matcher
+    w = QUALITY_WEIGHTS
+    scores = []
+    for md, plain, h2 in items:
+        md = md or ""
+        plain = plain or ""
+        total = (
+            w["length"] * length_signal(len(plain))
+            + w["formula"] * formula_signal(md)
+            + w["duplicate"] * duplicate_signal(plain)
+            + w["heading"] * heading_signal(h2)
+            + w["confidence"] * (confidence_signal(md, m) if m is not None else 0.3)
+        )
+        scores.append(max(1, min(100, int(round(total * 100)))))
+    return scores
+
+
+def _init_worker(rules: Sequence[Tuple[str, str, int]]) -> None:
+    global _worker_matcher
+    _worker_matcher = build_rule_matcher(rules)
+
+
+def _score_worker(items: Sequence[QualityInput]) -> List[int]:
+    return score_batch(items)
+
+
+def rescore_chunks(
+    rules: Sequence[Tuple[str, str, int]],
+    doc_id: Optional[int] = None,
+    only_unscored: bool = False,
+    batch_size: int = QUALITY_BATCH_SIZE,
+    workers: int = QUALITY_WORKERS,
+    progress=None,
+) -> Dict[str, int]:
+    """
+    为已有分片（重新）评分。每轮读取 workers 个批次，进程池并行评分后批量写回有变化的行并提交。
+    progress 为 JobProgress 时逐轮上报进度。返回 {"scanned", "updated"}。
+    """
+    batch_size = max(1, batch_size)
+    workers = max(1, workers)
+    where = ["chunk_id > %s", "deleted_at IS NULL"]
+    params: List[Any] = []
+    if doc_id is not None:
+        where.append("doc_id = %s")
+        params.append(doc_id)
+    if only_unscored:
+        where.append("COALESCE(quality_score, 0) = 0")
+
+    pool = None
+    if workers > 1:
+        # spawn：不 fork 带有连接池与后台线程的服务进程
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                                   initializer=_init_worker, initargs=(list(rules),))
+    local_matcher = build_rule_matcher(rules)
+    scanned = 0
+    updated = 0
+    last_id = 0
+    conn = get_conn()
+    try:
+        while True:
+            rows = _query(
+                conn,
+                f"""
+                SELECT chunk_id, quality_score, content_md, content_plain, heading_h2
+                FROM public.chunk
+                WHERE {' AND '.join(where)}
+                ORDER BY chunk_id
+                LIMIT %s
+                """,
+                [last_id] + params + [batch_size * workers],
+            )
+            if not rows:
+                break
+            last_id = rows[-1]["chunk_id"]
+            scanned += len(rows)
+
+            batches = [rows[i:i + batch_size] for i in range(0, len(rows), batch_size)]
+            inputs = [[(r["content_md"], r["content_plain"], r["heading_h2"]) for r in b] for b in batches]
+            if pool is not None and len(batches) > 1:
+                results = list(pool.map(_score_worker, inputs))
+            else:
+                results = [score_batch(items, local_matcher) for items in inputs]
+
+            changes = [
+                (r["chunk_id"], score)
+                for b, scores in zip(batches, results)
+                for r, score in zip(b, scores)
+                if score != r["quality_score"]
+            ]
+            batch_updated = 0
+            if changes:
+                with conn.cursor() as cur:
+                    execute_values(
+                        cur,
+                        """
+                        UPDATE public.chunk AS c SET quality_score = v.score
+                        FROM (VALUES %s) AS v(chunk_id, score)
+                        WHERE c.chunk_id = v.chunk_id
+                        """,
+                        changes,
+                        page_size=len(changes),
+                    )
+                    batch_updated = cur.rowcount
+            conn.commit()
+            updated += batch_updated
+            if progress is not None:
+                progress.advance(len(rows), batch_updated)
+
+        return {"scanned": scanned, "updated": updated}
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        release_conn(conn)
+        if pool is not None:
+            pool.shutdown()
@@ -1,6 +1,11 @@
+import time
 from typing import Any, Dict, List, Optional, Tuple
 
 from db import get_conn, release_conn, _query, _query_one
+from dedup import collapse_page
+from utils.tagfilter import chunk_tag_clause
+from utils.categoryfilter import doc_category_clause
+from search_log import record_search
 
 
 ALLOWED_KINDS = {"definition", "theorem", "formula", "example", "property", "remark"}
@@ -14,7 +19,7 @@ def _neighbors(conn, doc_id: int, chunk_id: int) -> Dict[str, Any]:
                c.heading_h2 as h2, c.anchor, c.content_md
         FROM public.chunk c
         JOIN public.doc d ON d.doc_id = c.doc_id
-        WHERE c.doc_id = %s AND c.chunk_id < %s
+        WHERE c.doc_id = %s AND c.chunk_id < %s AND c.deleted_at IS NULL
         ORDER BY c.chunk_id DESC
         LIMIT 1
         """,
@@ -27,7 +32,7 @@ def _neighbors(conn, doc_id: int, chunk_id: int) -> Dict[str, Any]:
                c.heading_h2 as h2, c.anchor, c.content_md
         FROM public.chunk c
         JOIN public.doc d ON d.doc_id = c.doc_id
-        WHERE c.doc_id = %s AND c.chunk_id > %s
+        WHERE c.doc_id = %s AND c.chunk_id > %s AND c.deleted_at IS NULL
         ORDER BY c.chunk_id ASC
         LIMIT 1
         """,
@@ -43,11 +48,13 @@ def _has_trgm(conn) -> bool:
         return False
 
 
-def perform_search(q: Optional[str], kind: Optional[str], section: Optional[int], limit: int, offset: int, neighbor: int, source: Optional[str] = None) -> Tuple[List[Dict[str, Any]], int]:
+def perform_search(q: Optional[str], kind: Optional[str], section: Optional[int], limit: int, offset: int, neighbor: int, source: Optional[str] = None, collapse: bool = True, tags: Optional[List[str]] = None, tag_mode: str = "any", category: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+    started = time.perf_counter()
     conn = get_conn()
     try:
         params: List[Any] = []
-        where = ["1=1"]
+        # 与部分索引的 WHERE deleted_at IS NULL 一致，已软删除的分片与文档不参与检索
+        where = ["c.deleted_at IS NULL", "d.deleted_at IS NULL"]
         use_trgm = _has_trgm(conn)
 
         listing_mode = (q is None) or (str(q).strip() == "")
@@ -83,19 +90,40 @@ def perform_search(q: Optional[str], kind: Optional[str], section: Optional[int]
             where.append("d.source = %s")
             params.append(source)
 
-        order_clause = "ORDER BY score DESC" if not listing_mode else "ORDER BY c.created_at DESC, c.chunk_id DESC"
+        if tags:
+            tag_sql, tag_params = chunk_tag_clause(tags, tag_mode)
+            where.append(tag_sql)
+            params.extend(tag_params)
+
+        if category is not None:
+            cat_sql, cat_params = doc_category_clause(category)
+            where.append(cat_sql)
+            params.extend(cat_params)
+
+        # chunk_id 作为次序键保证分批读取时顺序稳定（折叠分页会分多次读取）
+        order_clause = "ORDER BY score DESC, c.chunk_id" if not listing_mode else "ORDER BY c.created_at DESC, c.chunk_id DESC"
 
         sql = f"""
         SELECT c.chunk_id, d.section_number as section, c.kind,
                c.heading_h1 as h1, c.heading_h2 as h2, c.anchor,
-               c.content_md, {score_sql} as score, c.doc_id
+               c.content_md, {score_sql} as score, c.doc_id, c.simhash
         FROM public.chunk c
         JOIN public.doc d ON d.doc_id = c.doc_id
         WHERE {' AND '.join(where)}
         {order_clause}
         LIMIT %s OFFSET %s
         """
-        rows = _query(conn, sql, params_for_select + params + [limit, offset])
+
+        def fetch(raw_offset: int, n: int) -> List[Dict[str, Any]]:
+            return _query(conn, sql, params_for_select + params + [n, raw_offset])
+
+        # 折叠近重复结果（同一内容出现在多份文档或重叠分片中）：先折叠再分页，
+        # 否则每页会因折叠而少于 limit 条
+        dropped = 0
+        if collapse:
+            rows, dropped = collapse_page(fetch, offset, limit)
+        else:
+            rows = fetch(offset, limit)
 
         # 统计总数（不含打分参数，只用 where 的条件）
         count_sql = f"""
@@ -107,6 +135,14 @@ def perform_search(q: Optional[str], kind: Optional[str], section: Optional[int]
         total_row = _query_one(conn, count_sql, params)
         total = int(total_row["total"]) if total_row and "total" in total_row else 0
 
+        if not listing_mode:
+            record_search(
+                "kb", q,
+                {"kind": kind, "section": section, "source": source, "tags": tags, "tag_mode": tag_mode if tags else None,
+                 "category": category},
+                (time.perf_counter() - started) * 1000, total,
+            )
+
         results: List[Dict[str, Any]] = []
         for r in rows:
             item = {
@@ -124,7 +160,7 @@ def perform_search(q: Optional[str], kind: Optional[str], section: Optional[int]
                 item["neighbors"] = nbs
             results.append(item)
 
-        return results, total
+        return results, max(total - dropped, offset + len(results))
     finally:
         release_conn(conn)
 
@@ -140,7 +176,7 @@ def fetch_chunk_detail(chunk_id: int) -> Optional[Dict[str, Any]]:
                    c.content_md, c.content_plain, c.canonical, c.tokens, c.created_at
             FROM public.chunk c
             JOIN public.doc d ON d.doc_id = c.doc_id
-            WHERE c.chunk_id = %s
+            WHERE c.chunk_id = %s AND c.deleted_at IS NULL AND d.deleted_at IS NULL
             """,
             (chunk_id,),
         )
@@ -159,7 +195,7 @@ def fetch_sections_with_counts(source: Optional[str] = None) -> List[Dict[str, A
                 SELECT COALESCE(d.section_number, 0) AS section, COUNT(1) AS count
                 FROM public.chunk c
                 JOIN public.doc d ON d.doc_id = c.doc_id
-                WHERE d.source = %s
+                WHERE d.source = %s AND c.deleted_at IS NULL AND d.deleted_at IS NULL
                 GROUP BY COALESCE(d.section_number, 0)
                 ORDER BY section
                 """,
@@ -172,6 +208,7 @@ def fetch_sections_with_counts(source: Optional[str] = None) -> List[Dict[str, A
                 SELECT COALESCE(d.section_number, 0) AS section, COUNT(1) AS count
                 FROM public.chunk c
                 JOIN public.doc d ON d.doc_id = c.doc_id
+                WHERE c.deleted_at IS NULL AND d.deleted_at IS NULL
                 GROUP BY COALESCE(d.section_number, 0)
                 ORDER BY section
                 """,
@@ -0,0 +1,139 @@
+"""检索事件日志与按日汇总
+
+每次带关键词的检索在内存队列中追加一条事件（归一化后的查询、过滤条件、耗时、命中数），
+后台线程每隔 SEARCH_LOG_FLUSH_INTERVAL 秒批量写入只追加的 search_event 表；
+另一个后台线程每隔 SEARCH_ROLLUP_INTERVAL 秒把最近两天的事件汇总到 search_daily
+(query, day, count, zero_count, p50_ms, p95_ms)。热门搜索与搜索趋势只查询汇总表。
+"""
+import json
+import os
+import threading
+import unicodedata
+from collections import deque
+from datetime import date, timedelta
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+from db import get_conn, release_conn
+from utils.background import PeriodicWorker
+
+
+SEARCH_LOG_FLUSH_INTERVAL = float(os.getenv("SEARCH_LOG_FLUSH_INTERVAL", "10"))
+SEARCH_ROLLUP_INTERVAL = float(os.getenv("SEARCH_ROLLUP_INTERVAL", "600"))
+# 数据库不可用时最多在内存中保留的事件数，超出后丢弃最旧的
+SEARCH_LOG_MAX_PENDING = 50000
+MAX_QUERY_LENGTH = 200
+
+_Event = Tuple[str, str, Optional[str], float, int, bool]
+
+_pending: Deque[_Event] = deque(maxlen=SEARCH_LOG_MAX_PENDING)
+_pending_lock = threading.Lock()
+
+
+def normalize_query(q: str) -> str:
+    """全角转半角、合并空白、忽略大小写，使同一查询的不同写法汇总到一起"""
+    q = unicodedata.normalize("NFKC", q)
+    return " ".join(q.split()).casefold()[:MAX_QUERY_LENGTH]
+
+
+def record_search(endpoint: str, q: Optional[str], filters: Dict[str, Any], latency_ms: float, result_count: int) -> None:
+    """记录一次检索；空查询（列表模式）不记录"""
+    query = normalize_query(q or "")
+    if not query:
+        return
+    active = {k: v for k, v in filters.items() if v not in (None, "", [])}
+    event = (
+        endpoint,
+        query,
+        json.dumps(active, ensure_ascii=False) if active else None,
+        round(float(latency_ms), 2),
+        int(result_count),
+        result_count == 0,
+    )
+    with _pending_lock:
+        _pending.append(event)
+
+
+def flush_search_events() -> int:
+    """把缓冲的检索事件批量写入 search_event，返回写入条数"""
+    with _pending_lock:
+        events: List[_Event] = list(_pending)
+        _pending.clear()
+    if not events:
+        return 0
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            execute_values(
+                cur,
+                """
+                INSERT INTO public.search_event
+                  (endpoint, query, filters, latency_ms, result_count, zero_result)
+                VALUES %s
+                """,
+                events,
+                template="(%s, %s, %s::jsonb, %s, %s, %s)",
+                page_size=1000,
+            )
+        conn.commit()
+        return len(events)
+    except Exception:
+        conn.rollback()
+        # 放回队首，下个周期重试（放回后超出容量的部分被丢弃）
+        with _pending_lock:
+            _pending.extendleft(reversed(events))
+        raise
+    finally:
+        release_conn(conn)
+
+
+def rollup_search_daily(since: Optional[date] = None) -> int:
+    """
+    按天重算 since（默认昨天）起的 search_daily 汇总，返回写入的 (query, day) 行数。
+    分位数不能增量合并，因此按整天重算；周期任务只重算昨天与今天。
+    """
+    if since is None:
+        since = date.today() - timedelta(days=1)
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO public.search_daily (query, day, count, zero_count, p50_ms, p95_ms)
+                SELECT query,
+                       created_at::date AS day,
+                       COUNT(*),
+                       COUNT(*) FILTER (WHERE zero_result),
+                       percentile_cont(0.5) WITHIN GROUP (ORDER BY latency_ms),
+                       percentile_cont(0.95) WITHIN GROUP (ORDER BY latency_ms)
+                FROM public.search_event
+                WHERE created_at >= %s
+                GROUP BY query, created_at::date
+                ON CONFLICT (query, day) DO UPDATE
+                  SET count = EXCLUDED.count,
+                      zero_count = EXCLUDED.zero_count,
+                      p50_ms = EXCLUDED.p50_ms,
+                      p95_ms = EXCLUDED.p95_ms
+                """,
+                (since,),
+            )
+            rows = cur.rowcount
+        conn.commit()
+        return rows
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        release_conn(conn)
+
+
+search_log_flusher = PeriodicWorker("search-log-flush", SEARCH_LOG_FLUSH_INTERVAL, flush_search_events)
+
+
+def _flush_and_rollup() -> None:
+    flush_search_events()
+    rollup_search_daily()
+
+
+search_rollup_worker = PeriodicWorker("search-rollup", SEARCH_ROLLUP_INTERVAL, _flush_and_rollup)
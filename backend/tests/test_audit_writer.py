@@ -0,0 +1,31 @@
+"""审计日志写入器：入队 / 落盘失败不向路由抛出异常"""
+import logging
+
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from admin.models.audit import AuditLogCreate  # noqa: E402
+from admin.services.audit_writer import AuditBatchWriter  # noqa: E402
+
+
+def test_submit_logs_instead_of_raising_when_spill_fails(tmp_path, monkeypatch, caplog):
+    writer = AuditBatchWriter(maxsize=1, spill_file=str(tmp_path / "missing" / "spill.jsonl"))
+    # 不启动后台线程，让第二条事件因队列已满而落盘
+    monkeypatch.setattr(writer, "start", lambda: None)
+    event = AuditLogCreate(user_id=1, username="admin", action="update", resource_type="chunk")
+    with caplog.at_level(logging.WARNING):
+        writer.submit(event)
+        writer.submit(event)
+    assert "写入溢出文件" in caplog.text
+    assert any(r.levelno == logging.ERROR for r in caplog.records)
+
+
+def test_spill_appends_when_queue_is_full(tmp_path, monkeypatch):
+    spill = tmp_path / "spill.jsonl"
+    writer = AuditBatchWriter(maxsize=1, spill_file=str(spill))
+    monkeypatch.setattr(writer, "start", lambda: None)
+    event = AuditLogCreate(user_id=1, username="admin", action="delete", resource_type="doc", details={"count": 2})
+    for _ in range(3):
+        writer.submit(event)
+    assert len(spill.read_text(encoding="utf-8").splitlines()) == 2
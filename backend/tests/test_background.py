@@ -0,0 +1,21 @@
+import threading
+
+from utils.background import PeriodicWorker
+
+
+def test_first_run_uses_initial_delay():
+    ran = threading.Event()
+    worker = PeriodicWorker("test", 3600, ran.set, initial_delay=0.01)
+    worker.start()
+    try:
+        assert ran.wait(2)
+    finally:
+        worker.stop(run_final=False)
+
+
+def test_default_waits_one_interval():
+    calls = []
+    worker = PeriodicWorker("test", 3600, lambda: calls.append(1))
+    worker.start()
+    worker.stop(run_final=False)
+    assert calls == []
@@ -0,0 +1,70 @@
+"""dedup.py 中纯函数部分的单元测试（不需要数据库）"""
+import random
+
+from dedup import collapse_near_duplicates, collapse_page, hamming, simhash
+
+
+def _rows(sigs):
+    return [{"id": i, "simhash": s} for i, s in enumerate(sigs)]
+
+
+def _fetcher(rows, calls=None):
+    def fetch(raw_offset, n):
+        if calls is not None:
+            calls.append((raw_offset, n))
+        return rows[raw_offset:raw_offset + n]
+    return fetch
+
+
+def test_simhash_near_duplicate_text():
+    a = simhash("设函数 f(x) 在点 x0 的某去心邻域内有定义")
+    b = simhash("设函数 f (x) 在点 x0 的某去心邻域内\n有定义")
+    assert a is not None and hamming(a, b) == 0
+    assert simhash("ab") is None
+
+
+def test_collapse_page_matches_collapse_then_slice():
+    rnd = random.Random(7)
+    base = [rnd.getrandbits(63) for _ in range(40)]
+    # 约三分之一为前面某个签名的近重复（翻转 1 位），部分签名为空
+    sigs = []
+    for i in range(300):
+        r = rnd.random()
+        if r < 0.3 and sigs:
+            prev = rnd.choice([s for s in sigs if s is not None] or [base[0]])
+            sigs.append(prev ^ (1 << rnd.randrange(62)))
+        elif r < 0.35:
+            sigs.append(None)
+        else:
+            sigs.append(rnd.choice(base) ^ (rnd.getrandbits(20) << 30))
+    rows = _rows(sigs)
+    full = collapse_near_duplicates(rows)
+    for offset, limit in [(0, 8), (8, 8), (16, 20), (0, 1), (len(full) - 3, 10), (len(full) + 5, 10)]:
+        page, dropped = collapse_page(_fetcher(rows), offset, limit, max_extra=10_000)
+        assert page == full[offset:offset + limit]
+        assert dropped >= 0
+
+
+def test_collapse_page_pages_are_full_and_disjoint():
+    distinct = [0, (1 << 16) - 1, ((1 << 16) - 1) << 16, ((1 << 16) - 1) << 32, ((1 << 16) - 1) << 47, (1 << 63) - 1]
+    rows = _rows([s for s in distinct for _ in range(2)])
+    p1, _ = collapse_page(_fetcher(rows), 0, 3)
+    p2, _ = collapse_page(_fetcher(rows), 3, 3)
+    assert len(p1) == 3 and len(p2) == 3
+    assert not {r["id"] for r in p1} & {r["id"] for r in p2}
+
+
+def test_collapse_page_total_adjustment_exact_at_end():
+    rows = _rows([5, 5, 5, (1 << 62) - 1])
+    page, dropped = collapse_page(_fetcher(rows), 0, 10)
+    assert [r["id"] for r in page] == [0, 3]
+    assert len(rows) - dropped == 2
+
+
+def test_collapse_page_respects_scan_limit():
+    rows = _rows([9] * 1000)
+    calls = []
+    page, dropped = collapse_page(_fetcher(rows, calls), 0, 5, max_extra=20)
+    assert [r["id"] for r in page] == [0]
+    assert sum(n for _o, n in calls) <= 25
+    assert dropped == 24
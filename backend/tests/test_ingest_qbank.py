@@ -0,0 +1,31 @@
+"""题库 Markdown 解析：字段清洗与 sha256 须与既有入库数据一致"""
+import pytest
+
+pytest.importorskip("docx")
+pytest.importorskip("psycopg2")
+
+from ingest_qbank import _parse_markdown_questions, question_sha256  # noqa: E402
+from utils.textnorm import normalize_inline  # noqa: E402
+
+# normalize_inline 对这些输入不是幂等的：第二次清洗还会再删一份重复
+OPTION = "ab(1,3)(1,3) (1, 3)'''"
+EXPLANATION = "ab$x$3(1,3) (1, 3)3(1, 3)"
+
+
+def _twice(text: str) -> str:
+    return normalize_inline(normalize_inline(text))
+
+
+def test_fields_are_normalized_twice():
+    assert normalize_inline(OPTION) != _twice(OPTION)
+    md = "\n".join([
+        "1. 【单选题】下列说法正确的是",
+        f"A. {OPTION}",
+        "B. 其余选项",
+        "答案：A",
+        f"解析：{EXPLANATION}",
+    ])
+    [q] = _parse_markdown_questions(md)
+    assert q["options_json"]["A"] == _twice(OPTION)
+    assert q["explanation_md"] == _twice(EXPLANATION)
+    assert q["sha256"] == question_sha256(q["stem_md"], q["options_json"], q["answer_text"], q["explanation_md"])
@@ -0,0 +1,197 @@
+"""知识库快照导出 -> 导入往返测试
+
+需要一个可随意清空的 PostgreSQL 数据库：设置 TEST_DATABASE_URL 后运行，未设置或连接失败时跳过。
+"""
+import os
+
+import pytest
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+if not TEST_DATABASE_URL:
+    pytest.skip("未设置 TEST_DATABASE_URL", allow_module_level=True)
+os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+import db  # noqa: E402
+import kb_snapshot  # noqa: E402
+
+_TABLES = "public.chunk_tag, public.tag, public.chunk, public.doc, public.question, public.lsh_bucket"
+
+
+@pytest.fixture(scope="module")
+def schema():
+    try:
+        db.init_db()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"无法连接测试数据库: {e}")
+    from admin.db_init import init_admin_schema
+    init_admin_schema()
+
+
+def _truncate():
+    conn = db.get_conn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"TRUNCATE {_TABLES} RESTART IDENTITY CASCADE")
+        conn.commit()
+    finally:
+        db.release_conn(conn)
+
+
+def _seed():
+    conn = db.get_conn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO public.doc (title, chapter, section_number, source_filename, source, sha256)
+                VALUES ('第一节 极限', 1, 1, 'a.docx', 'kb', 'doc-sha-1') RETURNING doc_id
+                """
+            )
+            doc_id = cur.fetchone()[0]
+            chunk_ids = []
+            for i in range(3):
+                cur.execute(
+                    """
+                    INSERT INTO public.chunk (doc_id, kind, heading_h1, heading_h2, anchor,
+                                              content_md, content_plain, tokens, simhash)
+                    VALUES (%s, 'definition', '第一节 极限', '一、定义', %s, %s, %s, 10, %s)
+                    RETURNING chunk_id
+                    """,
+                    (doc_id, f"a-{i}", f"内容 $x_{i}$", f"内容 x{i}", 1234567 * (i + 1)),
+                )
+                chunk_ids.append(cur.fetchone()[0])
+            cur.execute("INSERT INTO public.tag (name) VALUES ('极限') RETURNING tag_id")
+            tag_id = cur.fetchone()[0]
+            cur.execute("INSERT INTO public.chunk_tag (chunk_id, tag_id) VALUES (%s, %s)", (chunk_ids[1], tag_id))
+            cur.execute(
+                """
+                INSERT INTO public.question (qtype, stem_md, options_json, answer_text, tags, difficulty, sha256)
+                VALUES ('single', '求 $\\lim_{x\\to 0} \\frac{\\sin x}{x}$', '["0","1"]', 'B', ARRAY['极限'], 2, 'q-sha-1')
+                """
+            )
+        conn.commit()
+    finally:
+        db.release_conn(conn)
+
+
+def _dump():
+    """按内容（不含自增 id）读出各表，用于比较导入前后是否一致"""
+    conn = db.get_conn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT title, sha256 FROM public.doc ORDER BY sha256")
+            docs = cur.fetchall()
+            cur.execute(
+                """
+                SELECT d.sha256, c.anchor, c.content_md, c.simhash
+                FROM public.chunk c JOIN public.doc d ON d.doc_id = c.doc_id
+                ORDER BY c.anchor
+                """
+            )
+            chunks = cur.fetchall()
+            cur.execute(
+                """
+                SELECT c.anchor, t.name
+                FROM public.chunk_tag ct
+                JOIN public.chunk c ON c.chunk_id = ct.chunk_id
+                JOIN public.tag t ON t.tag_id = ct.tag_id
+                """
+            )
+            chunk_tags = cur.fetchall()
+            cur.execute("SELECT stem_md, options_json, tags, sha256 FROM public.question ORDER BY sha256")
+            questions = cur.fetchall()
+            cur.execute("SELECT COUNT(*) FROM public.lsh_bucket WHERE item_type = 'chunk'")
+            lsh = cur.fetchone()[0]
+        conn.rollback()
+        return docs, chunks, chunk_tags, questions, lsh
+    finally:
+        db.release_conn(conn)
+
+
+def test_export_import_roundtrip(schema, tmp_path):
+    _truncate()
+    _seed()
+    before = _dump()[:4]
+
+    path = str(tmp_path / "kb.tar.gz")
+    exported = kb_snapshot.export_snapshot(path)
+    assert exported["tables"]["chunk"] == 3
+
+    _truncate()
+    with open(path, "rb") as f:
+        stats = kb_snapshot.import_snapshot(f, rebuild_indexes=True)
+    assert stats["docs_inserted"] == 1
+    assert stats["chunks_inserted"] == 3
+    assert stats["questions_inserted"] == 1
+
+    docs, chunks, chunk_tags, questions, lsh = _dump()
+    assert (docs, chunks, chunk_tags, questions) == before
+    assert lsh > 0
+
+    # 再次导入：按 sha256 去重，不产生新行
+    with open(path, "rb") as f:
+        again = kb_snapshot.import_snapshot(f)
+    assert again["docs_inserted"] == 0
+    assert again["chunks_inserted"] == 0
+    assert again["questions_inserted"] == 0
+    assert _dump()[:4] == before
+
+
+def test_import_restores_soft_deleted_rows(schema, tmp_path):
+    _truncate()
+    _seed()
+    before = _dump()[:4]
+    path = str(tmp_path / "kb.tar.gz")
+    kb_snapshot.export_snapshot(path)
+
+    # 模拟管理端删除：文档及其分片、题目均被软删除
+    conn = db.get_conn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("UPDATE public.doc SET deleted_at = now()")
+            cur.execute("UPDATE public.chunk SET deleted_at = now()")
+            cur.execute("UPDATE public.question SET deleted_at = now()")
+        conn.commit()
+    finally:
+        db.release_conn(conn)
+
+    with open(path, "rb") as f:
+        stats = kb_snapshot.import_snapshot(f)
+    assert stats["docs_inserted"] == 0
+    assert stats["docs_restored"] == 1
+    assert stats["chunks_inserted"] == 3
+    assert stats["questions_restored"] == 1
+
+    conn = db.get_conn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM public.doc WHERE deleted_at IS NULL")
+            assert cur.fetchone()[0] == 1
+            cur.execute("SELECT COUNT(*) FROM public.chunk WHERE deleted_at IS NULL")
+            assert cur.fetchone()[0] == 3
+            cur.execute("SELECT COUNT(*) FROM public.question WHERE deleted_at IS NULL")
+            assert cur.fetchone()[0] == 1
+            # 原分片仍为软删除状态，由清理任务删除；导出的内容与删除前一致
+            cur.execute("DELETE FROM public.chunk WHERE deleted_at IS NOT NULL")
+        conn.commit()
+    finally:
+        db.release_conn(conn)
+    assert _dump()[:4] == before
+
+
+def test_import_leaves_no_staging_tables(schema, tmp_path):
+    path = str(tmp_path / "kb.tar.gz")
+    kb_snapshot.export_snapshot(path)
+    with open(path, "rb") as f:
+        kb_snapshot.import_snapshot(f)
+    conn = db.get_conn()
+    try:
+        assert conn.autocommit is False
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM pg_tables WHERE tablename LIKE 'snap\\_%'")
+            assert cur.fetchone()[0] == 0
+        conn.rollback()
+    finally:
+        db.release_conn(conn)
@@ -0,0 +1,64 @@
+"""paper.generate_paper 的分层抽取与补足（用内存题库模拟 _query，不需要数据库）"""
+import random
+
+import pytest
+
+import paper
+
+
+def _fake_query(pool):
+    """按 _stratum_sql 的参数顺序（qtype, difficulty, start, [tags], limit）在内存题库上执行"""
+    def query(conn, sql, params):
+        per_part = 5 if "tags &&" in sql else 4
+        rows = []
+        for i in range(0, len(params), per_part):
+            qtype, difficulty, start = params[i:i + 3]
+            limit = params[i + per_part - 1]
+            stratum, part = divmod(i // per_part, 2)
+            match = sorted(
+                (q for q in pool if q["qtype"] == qtype and q["difficulty"] == difficulty
+                 and ((q["rand_key"] >= start) if part == 0 else (q["rand_key"] < start))),
+                key=lambda q: q["rand_key"],
+            )[:limit]
+            rows.extend(dict(q, stratum=stratum, part=part) for q in match)
+        rows.sort(key=lambda r: (r["stratum"], r["part"], r["rand_key"]))
+        return rows
+    return query
+
+
+def _pool(n, qtype="single", difficulty=2, seed=1):
+    rnd = random.Random(seed)
+    return [
+        {"qid": i, "qtype": qtype, "difficulty": difficulty, "rand_key": rnd.random(),
+         "stem_md": f"题 {i}", "answer_text": "A", "explanation_md": None}
+        for i in range(n)
+    ]
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_overlapping_strata_are_topped_up(monkeypatch, seed):
+    monkeypatch.setattr(paper, "_query", _fake_query(_pool(40)))
+    blueprint = [{"qtype": "single", "difficulty": 2, "count": c} for c in (10, 10, 10)]
+    result = paper.generate_paper(None, blueprint, seed=seed)
+    qids = [q["qid"] for q in result["questions"]]
+    assert len(qids) == 30 and len(set(qids)) == 30
+    assert result["shortfall"] == 0
+    assert all(s["picked"] == 10 and s["shortfall"] == 0 for s in result["sections"])
+
+
+def test_shortfall_is_reported_when_pool_is_small(monkeypatch):
+    monkeypatch.setattr(paper, "_query", _fake_query(_pool(12)))
+    blueprint = [{"qtype": "single", "difficulty": 2, "count": 10},
+                 {"qtype": "single", "difficulty": 2, "count": 5}]
+    result = paper.generate_paper(None, blueprint, seed=3)
+    assert len({q["qid"] for q in result["questions"]}) == 12
+    assert [s["shortfall"] for s in result["sections"]] == [0, 3]
+    assert result["shortfall"] == 3
+
+
+def test_same_seed_gives_same_paper(monkeypatch):
+    monkeypatch.setattr(paper, "_query", _fake_query(_pool(50)))
+    blueprint = [{"qtype": "single", "difficulty": 2, "count": 8}]
+    first = paper.generate_paper(None, blueprint, seed=42)
+    second = paper.generate_paper(None, blueprint, seed=42)
+    assert [q["qid"] for q in first["questions"]] == [q["qid"] for q in second["questions"]]
@@ -0,0 +1,122 @@
+"""quality.py 各评分信号与 score_batch 的单元测试（不需要数据库）"""
+import pytest
+
+import quality
+from quality import (
+    build_rule_matcher,
+    confidence_signal,
+    duplicate_signal,
+    formula_signal,
+    heading_signal,
+    length_signal,
+    score_batch,
+)
+
+RULES = [("定义", "definition", 50), ("定理", "theorem", 40), ("例", "example", 10)]
+
+
+@pytest.fixture
+def matcher():
+    return build_rule_matcher(RULES)
+
+
+@pytest.mark.parametrize("n, expected", [
+    (0, 0.0),
+    (19, 0.0),
+    (20, 0.0),
+    (50, 0.5),
+    (80, 1.0),
+    (1000, 1.0),
+    (1100, 0.75),
+    (1200, 0.5),
+    (5000, 0.5),
+])
+def test_length_signal(n, expected):
+    assert length_signal(n) == pytest.approx(expected)
+
+
+def test_length_signal_monotonic_in_short_range():
+    values = [length_signal(n) for n in range(0, 81)]
+    assert values == sorted(values)
+
+
+@pytest.mark.parametrize("md, expected", [
+    ("没有公式", 1.0),
+    ("$x$ 与 $y$", 1.0),
+    ("$$\\int_0^1 f$$", 1.0),
+    ("缺少闭合 $x", 0.0),
+    ("转义的 \\$ 不计入 $x$", 1.0),
+    ("$$a$", 0.0),
+])
+def test_formula_signal(md, expected):
+    assert formula_signal(md) == expected
+
+
+def test_duplicate_signal_unique_text():
+    assert duplicate_signal("函数极限的定义与数列极限的定义不同之处在于自变量") == 1.0
+
+
+def test_duplicate_signal_short_text():
+    assert duplicate_signal("短文本") == 1.0
+    assert duplicate_signal("") == 1.0
+
+
+def test_duplicate_signal_ignores_whitespace():
+    text = "设函数在点的某去心邻域内有定义"
+    assert duplicate_signal(text) == duplicate_signal(" ".join(text))
+
+
+def test_duplicate_signal_repeated_paragraph():
+    para = "设函数在点的某去心邻域内有定义，若存在常数使得对任意正数"
+    assert duplicate_signal(para * 2) < 0.5
+    assert duplicate_signal(para * 4) == 0.0
+
+
+@pytest.mark.parametrize("h2, expected", [
+    (None, 0.0),
+    ("", 0.0),
+    ("   ", 0.0),
+    ("正文", 0.5),
+    ("一、函数极限的定义", 1.0),
+])
+def test_heading_signal(h2, expected):
+    assert heading_signal(h2) == expected
+
+
+def test_confidence_signal(matcher):
+    assert confidence_signal("没有任何关键字", matcher) == 0.3
+    assert confidence_signal("定义：……", matcher) == 1.0
+    # 三次命中中 definition 占两次
+    assert confidence_signal("定义 定义 定理", matcher) == pytest.approx(2 / 3)
+
+
+def test_score_batch_range_and_order(matcher):
+    good = ("定义：" + "函数极限的严格叙述需要用到邻域的概念" * 5, None, "一、定义")
+    bad = ("$x", None, None)
+    items = [(md, md, h2) for md, _, h2 in (good, bad)]
+    scores = score_batch(items, matcher)
+    assert len(scores) == 2
+    assert all(1 <= s <= 100 for s in scores)
+    assert scores[0] > scores[1]
+
+
+def test_score_batch_handles_none(matcher):
+    assert score_batch([(None, None, None)], matcher) == [score_batch([("", "", "")], matcher)[0]]
+
+
+def test_score_batch_is_per_item(matcher):
+    """一次评多条与逐条评分结果一致（入库时按节批量评分依赖这一点）"""
+    items = [
+        ("定义：极限 $x$", "定义：极限 x", "一、定义"),
+        ("例1 求极限", "例1 求极限", "正文"),
+        ("", "", None),
+    ]
+    assert score_batch(items, matcher) == [score_batch([it], matcher)[0] for it in items]
+
+
+def test_score_batch_without_matcher_uses_default_confidence(monkeypatch):
+    monkeypatch.setattr(quality, "_worker_matcher", None)
+    md = "定义：" + "函数极限" * 10
+    with_rules = score_batch([(md, md, "一、定义")], build_rule_matcher(RULES))[0]
+    without = score_batch([(md, md, "一、定义")])[0]
+    assert without < with_rules
@@ -0,0 +1,32 @@
+from utils.ratelimit import RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_limit_per_key_and_window_reset():
+    clock = FakeClock()
+    limiter = RateLimiter(3, 60.0, clock=clock)
+    assert [limiter.allow("a") for _ in range(4)] == [True, True, True, False]
+    assert limiter.allow("b")
+    clock.now = 60.0
+    assert limiter.allow("a")
+
+
+def test_key_table_is_bounded():
+    clock = FakeClock()
+    limiter = RateLimiter(1, 10.0, max_keys=2, clock=clock)
+    assert limiter.allow("a") and limiter.allow("b")
+    assert not limiter.allow("c")
+    clock.now = 10.0
+    assert limiter.allow("c")
+
+
+def test_non_positive_limit_disables():
+    limiter = RateLimiter(0, 60.0)
+    assert all(limiter.allow("a") for _ in range(100))
@@ -0,0 +1,92 @@
+"""utils/textnorm.py 的测试：相邻重复片段删除与朴素实现逐字一致"""
+import random
+
+import pytest
+
+from utils.textnorm import remove_text_duplicates
+
+
+def _reference_remove_text_duplicates(s: str) -> str:
+    """最初版本的朴素实现（逐长度、逐位置切片比较），作为行为基准"""
+    for _ in range(10):
+        found = False
+        for length in range(len(s) // 2, 4, -1):
+            for i in range(len(s) - length * 2 + 1):
+                chunk = s[i:i + length]
+                next_chunk = s[i + length:i + length * 2]
+                if chunk.strip() == next_chunk.strip() and len(chunk.strip()) >= 5:
+                    s = s[:i + length] + s[i + length * 2:]
+                    found = True
+                    break
+            if found:
+                break
+        if not found:
+            break
+    return s
+
+
+# 题库中常见的行：Pandoc 重复识别的公式、坐标、中文题干
+REAL_LINES = [
+    "A = {1,2,3,4}A = {1,2,3,4}",
+    "已知函数 f(x)=x^2+1，求 f(2)。已知函数 f(x)=x^2+1，求 f(2)。",
+    "$\\lim_{x\\to 0}\\frac{\\sin x}{x}$ $\\lim_{x\\to 0}\\frac{\\sin x}{x}$ = 1",
+    "点 (1,3) 到直线 y=2x 的距离  点 (1,3) 到直线 y=2x 的距离",
+    "\\int_0^1 x^2 \\mathrm{d}x \\int_0^1 x^2 \\mathrm{d}x = \\frac{1}{3}",
+    "设 \\{a_n\\} 为等差数列，\t设 \\{a_n\\} 为等差数列，a_1 = 1",
+    "A. 充分不必要条件 B. 必要不充分条件 C. 充要条件 D. 既不充分也不必要条件",
+    "\\frac{1}{2}\\frac{1}{2}\\frac{1}{2}\\frac{1}{2}",
+    "ababababababababab",
+    "若  x>0 ，则  x+\\frac{1}{x}\\geq 2    若  x>0 ，则  x+\\frac{1}{x}\\geq 2",
+    "　全角空格　重复内容　全角空格　重复内容　",
+    "",
+    "short",
+]
+
+_TOKENS = [
+    "\\frac{", "}{", "}", "x", "y", "^2", "_{n}", "+", "=", "\\left(", "\\right)",
+    "\\sin ", "(1,3)", "设函数", "。", " ", "  ", "\t", "\n", "　", "a", "b",
+]
+
+
+@pytest.mark.parametrize("line", REAL_LINES)
+def test_matches_reference_on_real_lines(line):
+    assert remove_text_duplicates(line) == _reference_remove_text_duplicates(line)
+
+
+def test_matches_reference_on_small_alphabets():
+    rnd = random.Random(20240601)
+    alphabets = ["ab \t\n", "aab ", "ab", "x  y", "ab　c"]
+    for _ in range(3000):
+        alphabet = rnd.choice(alphabets)
+        s = "".join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 40)))
+        if s and rnd.random() < 0.5:
+            i = rnd.randint(0, len(s))
+            j = rnd.randint(i, len(s))
+            s = s[:j] + rnd.choice(["", " ", "  ", "\t"]) + s[i:j] + s[j:]
+        assert remove_text_duplicates(s) == _reference_remove_text_duplicates(s), repr(s)
+
+
+def test_matches_reference_on_random_latex():
+    rnd = random.Random(7)
+    for _ in range(400):
+        s = "".join(rnd.choice(_TOKENS) for _ in range(rnd.randint(0, 30)))
+        for _ in range(rnd.randint(0, 3)):
+            if s:
+                i = rnd.randint(0, len(s))
+                j = rnd.randint(i, len(s))
+                s = s[:j] + rnd.choice(["", " ", "  ", "\t "]) + s[i:j] + s[j:]
+        assert remove_text_duplicates(s) == _reference_remove_text_duplicates(s), repr(s)
+
+
+def test_long_dense_latex_is_fast():
+    """约 5k 字符的稠密公式行：朴素实现需数十秒，这里应在数秒内完成"""
+    import time
+    rnd = random.Random(3)
+    s = ""
+    while len(s) < 5000:
+        s += rnd.choice(_TOKENS[:12])
+    s = s[:2500] + s[1600:2500] + s[2500:]
+    started = time.perf_counter()
+    out = remove_text_duplicates(s)
+    assert time.perf_counter() - started < 5.0
+    assert len(out) < len(s)
@@ -0,0 +1,91 @@
+"""题目使用计数：内存聚合 + 定期批量落库
+
+查看详情、出现在检索结果、被组卷或作答时只在进程内的计数表上加一（加锁的 dict 操作），
+后台线程每隔 USAGE_FLUSH_INTERVAL 秒把累计值用一条
+    UPDATE question SET usage_count = usage_count + v.n FROM (VALUES …) v
+写入数据库，避免热门题目上的逐次行更新与行锁竞争。进程退出时再落库一次。
+"""
+import os
+import threading
+from typing import Dict, Iterable
+
+from psycopg2.extras import execute_values
+
+from db import get_conn, release_conn
+from utils.background import PeriodicWorker
+
+
+USAGE_FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", "30"))
+
+
+class UsageCounter:
+    """线程安全的 {qid: 增量} 聚合表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[int, int] = {}
+
+    def record(self, qids: Iterable[int], n: int = 1) -> None:
+        with self._lock:
+            pending = self._pending
+            for qid in qids:
+                pending[qid] = pending.get(qid, 0) + n
+
+    def drain(self) -> Dict[int, int]:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def restore(self, counts: Dict[int, int]) -> None:
+        """落库失败时把增量放回，下次一并写入"""
+        with self._lock:
+            for qid, n in counts.items():
+                self._pending[qid] = self._pending.get(qid, 0) + n
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+
+question_usage = UsageCounter()
+
+
+def record_question_usage(qids: Iterable[int], n: int = 1) -> None:
+    """记录题目被使用（查看 / 检索命中 / 组卷 / 作答）"""
+    question_usage.record(qids, n)
+
+
+def flush_question_usage() -> int:
+    """把累计的使用次数批量写入 question.usage_count，返回更新的题目数"""
+    counts = question_usage.drain()
+    if not counts:
+        return 0
+    # 按 qid 排序：各进程以相同顺序锁行，并发刷新重叠的题目时不会互相死锁
+    values = sorted(counts.items())
+    conn = get_conn()
+    try:
+        with conn.cursor() as cur:
+            execute_values(
+                cur,
+                """
+                UPDATE public.question AS q
+                SET usage_count = COALESCE(q.usage_count, 0) + v.n
+                FROM (VALUES %s) AS v(qid, n)
+                WHERE q.qid = v.qid
+                """,
+                values,
+                template="(%s::bigint, %s::int)",
+                page_size=len(values),
+            )
+            updated = cur.rowcount
+        conn.commit()
+        return updated
+    except Exception:
+        # 写入失败时放回计数，下个周期重试
+        conn.rollback()
+        question_usage.restore(counts)
+        raise
+    finally:
+        release_conn(conn)
+
+
+usage_flusher = PeriodicWorker("usage-flush", USAGE_FLUSH_INTERVAL, flush_question_usage)
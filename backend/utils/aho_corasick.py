@@ -0,0 +1,61 @@
+"""Aho–Corasick 多模式匹配（纯 Python 实现）"""
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+
+class KeywordAutomaton:
+    """由 (关键字, 附带数据) 列表一次性编译的多模式匹配自动机。
+
+    编译后对任意文本只需单次扫描即可找出全部命中的关键字。
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, Any]]):
+        # goto 表：每个状态一个 {字符: 下一状态}
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # 每个状态上命中的附带数据（已合并 fail 链上的输出）
+        self._out: List[List[Any]] = [[]]
+
+        for keyword, payload in patterns:
+            if not keyword:
+                continue
+            state = 0
+            for ch in keyword:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][ch] = nxt
+                state = nxt
+            self._out[state].append(payload)
+
+        self._build_fail_links()
+
+    def _build_fail_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+    def iter_matches(self, text: str) -> Iterator[Any]:
+        """单次扫描文本，依次产出每个命中关键字的附带数据"""
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for ch in text or "":
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                yield from out[state]
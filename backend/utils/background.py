@@ -0,0 +1,57 @@
+"""后台周期任务"""
+import threading
+from typing import Callable, Optional
+
+
+class PeriodicWorker:
+    """在守护线程中每隔 interval 秒调用一次 fn；stop() 时可再执行最后一次以落盘缓冲数据。
+
+    initial_delay 为启动后首次执行前的等待秒数，默认等一个 interval；
+    间隔很长的任务（如每天一次）应设一个较小的值，否则每天重启的进程永远等不到首次执行。
+    fn 抛出的异常会被打印后忽略，不会终止线程。
+    """
+
+    def __init__(self, name: str, interval: float, fn: Callable[[], object],
+                 initial_delay: Optional[float] = None):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.initial_delay = interval if initial_delay is None else initial_delay
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _run_once(self) -> None:
+        try:
+            self.fn()
+        except Exception as e:
+            print(f"[{self.name}] 后台任务失败: {e}")
+
+    def _loop(self) -> None:
+        if self._stop.wait(self.initial_delay):
+            return
+        self._run_once()
+        while not self._stop.wait(self.interval):
+            self._run_once()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self, run_final: bool = True, timeout: Optional[float] = 10.0) -> None:
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        self._stop.set()
+        if thread is not None:
+            thread.join(timeout)
+        if run_final:
+            self._run_once()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
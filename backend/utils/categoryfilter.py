@@ -0,0 +1,17 @@
+"""分类子树过滤条件
+
+分类层级物化在 kb_category_closure（祖先, 后代, 深度）中，由触发器随分类增删改维护。
+“某分类及其全部子分类下的文档”先按 closure 主键 (ancestor_id, ...) 取出子树，
+再经 doc_category (category_id, doc_id) 索引取出文档，不需要递归查询。
+"""
+from typing import Any, List, Tuple
+
+
+def doc_category_clause(category_id: int, doc_col: str = "d.doc_id") -> Tuple[str, List[Any]]:
+    """文档属于该分类或其任一子分类"""
+    sql = f"""{doc_col} IN (
+            SELECT dc.doc_id
+            FROM public.kb_category_closure cc
+            JOIN public.doc_category dc ON dc.category_id = cc.descendant_id
+            WHERE cc.ancestor_id = %s)"""
+    return sql, [category_id]
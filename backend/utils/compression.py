@@ -0,0 +1,171 @@
+"""HTTP 响应压缩中间件
+
+直接访问后端（不经 nginx）时按 Accept-Encoding 协商 br / gzip 压缩响应体：
+- 只压缩文本类内容（text/*、JSON、JSON Lines、JS、XML、SVG），图片与已压缩的导出文件 / 快照原样返回；
+- 已带 Content-Encoding、状态码 204 / 206 / 304 的响应不处理；
+- 一次性响应小于 COMPRESSION_MIN_SIZE 字节时不压缩；流式响应（导出等）边产出边压缩。
+
+br 需要安装 brotli，未安装时只协商 gzip。
+"""
+import os
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # 未安装 brotli 时只支持 gzip
+    brotli = None
+
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+}
+# 事件流需要逐条送达，压缩缓冲会造成延迟
+_SKIP_TEXT_TYPES = {"text/event-stream"}
+_SKIP_STATUS = {204, 206, 304}
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """按 q 值选择 br / gzip；同权重时优先 br，都不接受时返回 None"""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if token:
+            weights[token] = q
+    wildcard = weights.get("*", 0.0)
+    candidates = []
+    if brotli is not None:
+        candidates.append(("br", weights.get("br", wildcard)))
+    candidates.append(("gzip", weights.get("gzip", wildcard)))
+    best = max(candidates, key=lambda c: c[1])
+    return best[0] if best[1] > 0 else None
+
+
+def is_compressible(status: int, headers: Headers) -> bool:
+    if status in _SKIP_STATUS or "content-encoding" in headers:
+        return False
+    media_type = headers.get("content-type", "").split(";", 1)[0].strip().lower()
+    if media_type.startswith("text/"):
+        return media_type not in _SKIP_TEXT_TYPES
+    return media_type in COMPRESSIBLE_TYPES
+
+
+class _GzipCompressor:
+    def __init__(self):
+        self._obj = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        return self._obj.flush()
+
+
+class _BrotliCompressor:
+    def __init__(self):
+        self._obj = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.process(data)
+
+    def flush(self) -> bytes:
+        return self._obj.finish()
+
+
+class CompressionMiddleware:
+    """ASGI 中间件：协商并压缩响应体"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressingResponder(self.app, encoding, self.minimum_size)(scope, receive, send)
+
+
+class _CompressingResponder:
+    """暂存响应头，收到第一段响应体后决定是否压缩"""
+
+    def __init__(self, app, encoding: str, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send = None
+        self.start_message = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_wrapper)
+
+    async def send_wrapper(self, message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._flush_start()
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            if (not is_compressible(self.start_message["status"], headers)
+                    or (not more_body and len(body) < self.minimum_size)):
+                self.passthrough = True
+                await self._flush_start()
+                await self.send(message)
+                return
+            self.compressor = _BrotliCompressor() if self.encoding == "br" else _GzipCompressor()
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            data = self.compressor.compress(body)
+            if more_body:
+                if "content-length" in headers:
+                    del headers["Content-Length"]
+            else:
+                data += self.compressor.flush()
+                headers["Content-Length"] = str(len(data))
+            await self._flush_start()
+            await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+            return
+
+        data = self.compressor.compress(body)
+        if not more_body:
+            data += self.compressor.flush()
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    async def _flush_start(self) -> None:
+        if self.start_message is not None:
+            message, self.start_message = self.start_message, None
+            await self.send(message)
@@ -0,0 +1,57 @@
+"""进程内变更事件
+
+数据修改提交后调用 publish(topic, payload) 通知订阅方（进程内缓存、索引等），
+订阅方只需按 payload 中的主键增量刷新对应的一行，无需全量重建。
+
+处理函数在发布线程中同步执行，抛出的异常记录日志后忽略，不影响发布方。
+
+主题：
+- chunk.updated: {"chunk_id", "doc_id", "fields"}，fields 为实际修改的列（含重算的派生列）
+- chunk.deleted: {"chunk_id", "doc_id", "hard_delete"}
+- question.updated: {"qid", "fields"}
+- question.deleted: {"qid", "hard_delete"}
+- <resource>.bulk_changed（resource 为 doc / chunk / question）: {"action", "ids", "value", "hard_delete"}，
+  批量操作每提交一批发布一次，ids 为该批选中的主键（可能含状态未变化的行）
+
+订阅方：统计快照（admin/services/snapshot_service.py）收到上述事件后标记全部快照过期。
+检索没有进程内缓存，不需要订阅。
+"""
+import logging
+import threading
+from typing import Any, Callable, Dict, List
+
+Handler = Callable[[Dict[str, Any]], None]
+
+_handlers: Dict[str, List[Handler]] = {}
+_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def subscribe(topic: str, handler: Handler) -> None:
+    """订阅主题；同一处理函数重复订阅只记一次"""
+    with _lock:
+        handlers = _handlers.setdefault(topic, [])
+        if handler not in handlers:
+            handlers.append(handler)
+
+
+def unsubscribe(topic: str, handler: Handler) -> None:
+    with _lock:
+        handlers = _handlers.get(topic, [])
+        if handler in handlers:
+            handlers.remove(handler)
+
+
+def publish(topic: str, payload: Dict[str, Any]) -> int:
+    """依次调用该主题的处理函数，返回成功处理的个数"""
+    with _lock:
+        handlers = list(_handlers.get(topic, ()))
+    handled = 0
+    for handler in handlers:
+        try:
+            handler(payload)
+            handled += 1
+        except Exception:
+            logger.exception("[events] %s 处理失败", topic)
+    return handled
@@ -1,8 +1,59 @@
-"""数据导出工具"""
+"""数据导出工具
+
+export_to_csv / export_to_json 适合小结果集；整表导出使用下面的流式接口：
+iter_cursor_batches 经服务端命名游标按批取行，encode_* 逐批编码为 CSV / JSONL / Parquet，
+compress_stream 边编码边压缩（gzip / zstd），内存占用只与批大小有关。
+"""
 import csv
 import json
+import zlib
 from io import StringIO
-from typing import List, Dict, Any
+from itertools import count
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Sequence, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # 未安装 pyarrow 时不支持 Parquet 导出
+    pa = None
+    pq = None
+
+try:
+    import zstandard
+except ImportError:  # 未安装 zstandard 时不支持 zstd 压缩
+    zstandard = None
+
+
+EXPORT_FORMATS = {"csv", "jsonl", "parquet"}
+EXPORT_COMPRESSIONS = {"none", "gzip", "zstd"}
+EXPORT_BATCH_SIZE = 2000
+
+_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+_cursor_ids = count(1)
+
+# (列名, 列类型 OID, 行列表)；类型 OID 取自 cursor.description，用于确定 Parquet 列类型
+_Batch = Tuple[List[str], List[int], List[Tuple]]
+
+# PostgreSQL 内置类型 OID
+_BOOL_OIDS = {16}
+_INT_OIDS = {20, 21, 23, 26}
+_FLOAT_OIDS = {700, 701, 1700}
+_DATE_OID = 1082
+_TIME_OID = 1083
+_TIMESTAMP_OID = 1114
+_TIMESTAMPTZ_OID = 1184
+_JSON_OIDS = {114, 3802}
+_ARRAY_ELEMENT_OIDS = {
+    1000: 16,                                   # bool[]
+    1005: 21, 1007: 23, 1016: 20,               # int2[] / int4[] / int8[]
+    1021: 700, 1022: 701, 1231: 1700,           # float4[] / float8[] / numeric[]
+    1009: 25, 1015: 1043, 1014: 1042,           # text[] / varchar[] / bpchar[]
+}
 
 
 def export_to_csv(data: List[Dict[str, Any]], columns: List[str]) -> str:
@@ -18,3 +69,211 @@ def export_to_json(data: List[Dict[str, Any]]) -> str:
     """导出数据为JSON格式"""
     return json.dumps(data, ensure_ascii=False, indent=2, default=str)
 
+
+def check_export_options(fmt: str, compression: str) -> None:
+    """校验导出格式与压缩方式，缺少可选依赖时报错"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"format 仅支持: {', '.join(sorted(EXPORT_FORMATS))}")
+    if compression not in EXPORT_COMPRESSIONS:
+        raise ValueError(f"compression 仅支持: {', '.join(sorted(EXPORT_COMPRESSIONS))}")
+    if fmt == "parquet" and pa is None:
+        raise ValueError("Parquet 导出需要安装 pyarrow")
+    if compression == "zstd" and zstandard is None and fmt != "parquet":
+        raise ValueError("zstd 压缩需要安装 zstandard")
+
+
+def export_filename(name: str, fmt: str, compression: str) -> str:
+    """导出文件名；Parquet 在文件内部压缩，不追加压缩后缀"""
+    filename = f"{name}.{fmt}"
+    if fmt != "parquet" and compression == "gzip":
+        filename += ".gz"
+    elif fmt != "parquet" and compression == "zstd":
+        filename += ".zst"
+    return filename
+
+
+def export_media_type(fmt: str, compression: str) -> str:
+    if fmt != "parquet" and compression == "gzip":
+        return "application/gzip"
+    if fmt != "parquet" and compression == "zstd":
+        return "application/zstd"
+    return _MEDIA_TYPES[fmt]
+
+
+def iter_cursor_batches(
+    conn,
+    sql: str,
+    params: Optional[Sequence[Any]] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> Iterator[_Batch]:
+    """
+    用服务端命名游标执行查询，每次取 batch_size 行，产出 (列名, 列类型 OID, 行列表)。
+    命名游标只能在事务内使用：连接处于自动提交模式时临时关闭，迭代结束后回滚并恢复；
+    否则由调用方在迭代结束后负责 rollback / commit。
+    """
+    restore_autocommit = conn.autocommit
+    if restore_autocommit:
+        conn.autocommit = False
+    try:
+        with conn.cursor(name=f"export_{next(_cursor_ids)}") as cur:
+            cur.itersize = batch_size
+            cur.execute(sql, params or [])
+            rows = cur.fetchmany(batch_size)
+            description = cur.description or []
+            columns = [d[0] for d in description]
+            type_codes = [d[1] for d in description]
+            # 无结果时也产出一个空批，使导出文件带有表头 / 列定义
+            yield columns, type_codes, rows
+            while rows:
+                rows = cur.fetchmany(batch_size)
+                if rows:
+                    yield columns, type_codes, rows
+    finally:
+        if restore_autocommit:
+            conn.rollback()
+            conn.autocommit = True
+
+
+def _to_text(v: Any) -> Any:
+    if isinstance(v, (dict, list)):
+        return json.dumps(v, ensure_ascii=False, default=str)
+    return v
+
+
+def encode_csv(batches: Iterable[_Batch]) -> Iterator[bytes]:
+    """逐批编码为 CSV（UTF-8，带 BOM 以便 Excel 正确识别中文）"""
+    header_written = False
+    for columns, _types, rows in batches:
+        buf = StringIO()
+        writer = csv.writer(buf)
+        if not header_written:
+            buf.write("\ufeff")
+            writer.writerow(columns)
+            header_written = True
+        writer.writerows([_to_text(v) for v in row] for row in rows)
+        yield buf.getvalue().encode("utf-8")
+
+
+def encode_jsonl(batches: Iterable[_Batch]) -> Iterator[bytes]:
+    """逐批编码为 JSON Lines，每行一个对象"""
+    for columns, _types, rows in batches:
+        if not rows:
+            continue
+        lines = [json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=str) for row in rows]
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _arrow_type(oid: int):
+    """按 PostgreSQL 列类型确定 Arrow 类型；未知类型按字符串导出"""
+    if oid in _BOOL_OIDS:
+        return pa.bool_()
+    if oid in _INT_OIDS:
+        return pa.int64()
+    if oid in _FLOAT_OIDS:
+        return pa.float64()
+    if oid == _DATE_OID:
+        return pa.date32()
+    if oid == _TIME_OID:
+        return pa.time64("us")
+    if oid == _TIMESTAMP_OID:
+        return pa.timestamp("us")
+    if oid == _TIMESTAMPTZ_OID:
+        return pa.timestamp("us", tz="UTC")
+    if oid in _ARRAY_ELEMENT_OIDS:
+        return pa.list_(_arrow_type(_ARRAY_ELEMENT_OIDS[oid]))
+    return pa.string()
+
+
+def _arrow_values(values: List[Any], oid: int) -> List[Any]:
+    """把一列 Python 值转换为与 _arrow_type(oid) 相容的值"""
+    if oid in _JSON_OIDS:
+        return [None if v is None else json.dumps(v, ensure_ascii=False, default=str) for v in values]
+    if oid in _FLOAT_OIDS:
+        return [None if v is None else float(v) for v in values]
+    if oid in _ARRAY_ELEMENT_OIDS:
+        elem = _ARRAY_ELEMENT_OIDS[oid]
+        return [None if v is None else _arrow_values(list(v), elem) for v in values]
+    if pa.types.is_string(_arrow_type(oid)):
+        return [v if v is None or isinstance(v, str) else str(v) for v in values]
+    return values
+
+
+class _ChunkSink:
+    """ParquetWriter 的输出目标：写入的字节暂存，由调用方每批取走"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.closed = False
+        self.pos = 0
+
+    def write(self, data) -> int:
+        b = bytes(data)
+        self.chunks.append(b)
+        self.pos += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self.pos
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def encode_parquet(batches: Iterable[_Batch], compression: str = "none") -> Iterator[bytes]:
+    """
+    逐批编码为 Parquet，每批一个 row group。列类型由查询结果的列类型 OID 确定，
+    与数据内容无关（某批整列为空不影响后续批次），compression 作为 Parquet 内部的列压缩编码。
+    """
+    sink = _ChunkSink()
+    writer = None
+    schema = None
+    codec = {"none": "NONE", "gzip": "GZIP", "zstd": "ZSTD"}[compression]
+    try:
+        for columns, type_codes, rows in batches:
+            data = {
+                c: _arrow_values([row[i] for row in rows], type_codes[i])
+                for i, c in enumerate(columns)
+            }
+            if writer is None:
+                schema = pa.schema([(c, _arrow_type(oid)) for c, oid in zip(columns, type_codes)])
+                writer = pq.ParquetWriter(sink, schema, compression=codec)
+            writer.write_table(pa.Table.from_pydict(data, schema=schema))
+            yield sink.drain()
+    finally:
+        if writer is not None:
+            writer.close()
+    tail = sink.drain()
+    if tail:
+        yield tail
+
+
+def compress_stream(chunks: Iterable[bytes], compression: str = "none") -> Iterator[bytes]:
+    """对字节流做 gzip / zstd 流式压缩"""
+    if compression == "none":
+        yield from chunks
+        return
+    if compression == "gzip":
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    else:
+        compressor = zstandard.ZstdCompressor(level=3).compressobj()
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def stream_export(batches: Iterable[_Batch], fmt: str, compression: str = "none") -> Iterator[bytes]:
+    """按格式编码并压缩；Parquet 使用内部列压缩"""
+    if fmt == "parquet":
+        return encode_parquet(batches, compression)
+    encoded = encode_csv(batches) if fmt == "csv" else encode_jsonl(batches)
+    return compress_stream(encoded, compression)
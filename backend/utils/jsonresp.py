@@ -0,0 +1,55 @@
+"""JSON 响应序列化
+
+FastJSONResponse 是应用的默认响应类：安装 orjson 时用其序列化（原生支持 datetime / date / UUID，
+Decimal 转为 float，JSONB 经 psycopg2 已是 dict / list），未安装时回退到标准库 json。
+两种方式都不转义中文（ensure_ascii=False），中文为主的检索结果体积约为转义输出的一半。
+
+路由返回 dict 时 FastAPI 仍会先经 jsonable_encoder 转换一遍；检索等热路径直接返回
+FastJSONResponse(...)，跳过这一步，由本模块一次完成序列化。
+"""
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any
+from uuid import UUID
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # 未安装 orjson 时使用标准库 json
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, memoryview):
+        return obj.tobytes().decode("utf-8", "replace")
+    raise TypeError(f"无法序列化 {type(obj).__name__}")
+
+
+def _stdlib_default(obj: Any) -> Any:
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, UUID):
+        return str(obj)
+    return _default(obj)
+
+
+def dumps(content: Any) -> bytes:
+    """序列化为紧凑的 UTF-8 JSON"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_stdlib_default
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """orjson（可选）序列化的 JSON 响应"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,7 +1,15 @@
-"""JWT Token处理"""
+"""JWT Token处理
+
+已验证的令牌按 sha256(token) 缓存其载荷（有界 LRU，TOKEN_CACHE_SIZE 条），
+缓存项在令牌的 exp 时刻失效；命中时不再做 HMAC 校验与 JSON 解析。
+"""
+import hashlib
 import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 
 import jwt
 from jwt.exceptions import InvalidTokenError
@@ -11,6 +19,48 @@ from jwt.exceptions import InvalidTokenError
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24小时
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "1024"))
+
+
+class TokenCache:
+    """线程安全的 {sha256(token): (载荷, exp 时间戳)} LRU"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            payload, exp = item
+            if exp <= time.time():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+        # 返回副本，调用方修改不影响缓存
+        return dict(payload)
+
+    def put(self, key: str, payload: Dict[str, Any], exp: float) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._items[key] = (dict(payload), exp)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
 
 
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
@@ -27,10 +77,17 @@ def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta]
 
 
 def decode_access_token(token: str) -> Optional[Dict[str, Any]]:
-    """解码JWT令牌"""
+    """解码JWT令牌；验证通过的令牌缓存至其过期，无效令牌不缓存"""
+    key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    payload = token_cache.get(key)
+    if payload is not None:
+        return payload
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except InvalidTokenError:
         return None
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        token_cache.put(key, payload, float(exp))
+    return payload
 
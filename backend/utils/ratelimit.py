@@ -0,0 +1,47 @@
+"""进程内按客户端限流
+
+固定窗口计数：每个键（通常为客户端 IP）在 window 秒内最多放行 limit 次。
+计数表超过 max_keys 时先清掉已过期的窗口，仍然超出则拒绝新键，内存占用有上限。
+多 worker 部署时各进程分别计数，实际上限为 limit × worker 数。
+"""
+import threading
+import time
+from typing import Callable, Dict, Tuple
+
+
+class RateLimiter:
+    """线程安全的固定窗口限流器"""
+
+    def __init__(self, limit: int, window: float, max_keys: int = 10000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._windows: Dict[str, Tuple[float, int]] = {}
+
+    def allow(self, key: str) -> bool:
+        """记一次访问；本窗口内已达上限时返回 False"""
+        if self.limit <= 0:
+            return True
+        now = self._clock()
+        with self._lock:
+            entry = self._windows.get(key)
+            if entry is None or now - entry[0] >= self.window:
+                if entry is None and len(self._windows) >= self.max_keys:
+                    self._prune(now)
+                    if len(self._windows) >= self.max_keys:
+                        return False
+                self._windows[key] = (now, 1)
+                return True
+            started, count = entry
+            if count >= self.limit:
+                return False
+            self._windows[key] = (started, count + 1)
+            return True
+
+    def _prune(self, now: float) -> None:
+        expired = [k for k, (started, _) in self._windows.items() if now - started >= self.window]
+        for k in expired:
+            del self._windows[k]
@@ -0,0 +1,54 @@
+"""标签过滤条件
+
+题目标签存放在 question.tags (TEXT[])，由 GIN 索引支持 && / @> 运算；
+分片标签经 chunk_tag ⋈ tag 关联，先按 tag.name 唯一索引定位标签，
+再由 chunk_tag (tag_id, chunk_id) 索引取出分片，避免扫描整张分片表。
+
+mode 为 "any" 时命中任一标签即可，"all" 时须包含全部标签。
+"""
+from typing import Any, List, Optional, Tuple
+
+
+TAG_MODES = {"any", "all"}
+MAX_FILTER_TAGS = 20
+
+
+def parse_tags(raw: Optional[str]) -> List[str]:
+    """解析逗号分隔的标签参数，去空白、去重并保持顺序"""
+    if not raw:
+        return []
+    seen = []
+    for t in raw.split(","):
+        t = t.strip()
+        if t and t not in seen:
+            seen.append(t)
+    if len(seen) > MAX_FILTER_TAGS:
+        raise ValueError(f"标签过滤最多 {MAX_FILTER_TAGS} 个")
+    return seen
+
+
+def _check_mode(mode: str) -> str:
+    m = (mode or "any").strip().lower()
+    if m not in TAG_MODES:
+        raise ValueError("tag_mode 仅支持 any / all")
+    return m
+
+
+def question_tag_clause(tags: List[str], mode: str = "any", column: str = "tags") -> Tuple[str, List[Any]]:
+    """题目标签条件：any → tags && 列表，all → tags @> 列表"""
+    op = "@>" if _check_mode(mode) == "all" else "&&"
+    return f"{column} {op} %s::text[]", [list(tags)]
+
+
+def chunk_tag_clause(tags: List[str], mode: str = "any", chunk_col: str = "c.chunk_id") -> Tuple[str, List[Any]]:
+    """分片标签条件：经 chunk_tag 半连接；all 模式按分片分组要求命中数等于标签数"""
+    sql = f"""{chunk_col} IN (
+            SELECT ct.chunk_id
+            FROM public.chunk_tag ct
+            JOIN public.tag t ON t.tag_id = ct.tag_id
+            WHERE t.name = ANY(%s)"""
+    params: List[Any] = [list(tags)]
+    if _check_mode(mode) == "all":
+        sql += " GROUP BY ct.chunk_id HAVING COUNT(*) = %s"
+        params.append(len(tags))
+    return sql + ")", params
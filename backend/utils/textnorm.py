@@ -0,0 +1,263 @@
+"""文本归一化：知识库入库（ingest）与题库解析（ingest_qbank）共用
+
+所有正则在模块加载时预编译；题库逐行清洗 normalize_inline 带缓存——
+同一文档中反复出现的行（选项、公式、模板句）只计算一次。
+"""
+import re
+from functools import lru_cache
+from typing import Optional, Tuple
+
+
+# ---------------------------------------------------------------------------
+# 知识库：规范化文本 / 纯文本
+# ---------------------------------------------------------------------------
+
+# 少量替换对时，逐个 str.replace 比 str.translate 更快（后者对非 ASCII 文本逐字符查表）
+_CANON_REPLACEMENTS = (
+    ("→", "->"),
+    ("∞", "inf"),
+    ("（", "("), ("）", ")"),
+    ("／", "/"), ("∕", "/"),
+    ("·", "*"),
+)
+
+_RE_DISPLAY_MATH = re.compile(r"\$\$(.+?)\$\$", re.S)
+_RE_INLINE_MATH = re.compile(r"\$(.+?)\$", re.S)
+
+
+def canonicalize_text(text: str) -> str:
+    """统一箭头、全角括号、斜杠等符号（用于检索匹配）"""
+    if not text:
+        return text
+    t = text
+    for a, b in _CANON_REPLACEMENTS:
+        t = t.replace(a, b)
+    return t
+
+
+def to_plain(text: str) -> str:
+    """移除 $ 和 $$ 包裹，仅保留内部内容"""
+    if not text or "$" not in text:
+        return text
+    return _RE_INLINE_MATH.sub(r"\1", _RE_DISPLAY_MATH.sub(r"\1", text))
+
+
+# ---------------------------------------------------------------------------
+# 题库：逐行去重清洗
+# ---------------------------------------------------------------------------
+
+# 引号包裹的坐标 / 数字：'(1,3)' → (1,3)，'3' → 3
+_RE_QUOTED_PAIR = re.compile(r"(['\"])\s*(\([^)]+\))\s*\1")
+_RE_QUOTED_NUM = re.compile(r"(['\"])\s*(\d+)\s*\1")
+# 连续相同引号
+_RE_QUOTE_RUN = re.compile(r"'{2,}|\"{2,}")
+# 连续重复的括号内容：紧邻 / 空白分隔
+_RE_DUP_PAREN = re.compile(r"(\([^)]+\))\s*\1")
+_RE_DUP_PAREN_WS = re.compile(r"(\(\s*[^)]+\s*\))\s+\1")
+# 坐标格式变体：(1, 3) → (1,3)
+_RE_COORD = re.compile(r"\(\s*(\d+)\s*,\s*(\d+)\s*\)")
+# 数学环境去重：先在 $ 后补空格，去重后再收紧
+_RE_DOLLAR_PAD = re.compile(r"\$(?!\s)")
+_RE_DUP_INLINE_MATH = re.compile(r"(\$\s*[^\$]+?\s*\$)\s*\1")
+_RE_DUP_DISPLAY_MATH = re.compile(r"(\$\$\s*[^\$]+?\s*\$\$)\s*\1")
+_RE_DOLLAR_WS = re.compile(r"\$\s+")
+
+NORMALIZE_CACHE_SIZE = 8192
+
+
+def _sub_until_stable(t: str, *patterns) -> str:
+    """依次应用若干 “重复 → 保留一份” 的替换，直到不再有变化"""
+    while True:
+        changed = 0
+        for pat in patterns:
+            t, n = pat.subn(r"\1", t)
+            changed += n
+        if not changed:
+            return t
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize_inline(text: str) -> str:
+    """
+    去重清洗：删除多余引号与连续重复的括号/坐标对、重复公式及任意连续重复片段。
+    """
+    if not text:
+        return text
+
+    t = text.replace("′", "'")
+
+    if "'" in t or '"' in t:
+        t = _RE_QUOTED_PAIR.sub(r"\2", t)
+        t = _RE_QUOTED_NUM.sub(r"\2", t)
+        t = _RE_QUOTE_RUN.sub(lambda m: m.group(0)[0], t)
+
+    if "(" in t:
+        t = _sub_until_stable(t, _RE_DUP_PAREN, _RE_DUP_PAREN_WS)
+        t = _RE_COORD.sub(r"(\1,\2)", t)
+
+    # Pandoc 常把 Word 公式识别成两份且中间无空格（$x$$x$），补空格后用反向引用去重
+    if "$" in t:
+        t = _RE_DOLLAR_PAD.sub("$ ", t)
+        t = _sub_until_stable(t, _RE_DUP_INLINE_MATH, _RE_DUP_DISPLAY_MATH)
+        t = _RE_DOLLAR_WS.sub("$", t)
+
+    # 通用去重：删除任何连续重复的文本片段（至少5个字符，避免误删）
+    #   例如："A = {1,2,3,4}A = {1,2,3,4}" → "A = {1,2,3,4}"
+    return remove_text_duplicates(t)
+
+
+# 相邻重复片段：核心（strip 后）最短长度与最多删除轮数
+_DUP_MIN_LEN = 5
+_DUP_MAX_ROUNDS = 10
+
+
+class _LCE:
+    """后缀数组 + LCP + 稀疏表：O(n log n) 预处理后 O(1) 求任意两个后缀的最长公共前缀"""
+
+    def __init__(self, s: str):
+        n = len(s)
+        self.n = n
+        # 倍增法构造后缀数组；名次始终压缩在 [0, n) 内，组合键 rank * (n + 1) + 次名次不会冲突
+        alphabet = {ch: r for r, ch in enumerate(sorted(set(s)))}
+        rank = [alphabet[ch] for ch in s]
+        sa = list(range(n))
+        k = 1
+        while n > 1:
+            keys = [rank[i] * (n + 1) + (rank[i + k] + 1 if i + k < n else 0) for i in range(n)]
+            sa.sort(key=keys.__getitem__)
+            new_rank = [0] * n
+            r = 0
+            for x in range(1, n):
+                if keys[sa[x]] != keys[sa[x - 1]]:
+                    r += 1
+                new_rank[sa[x]] = r
+            rank = new_rank
+            if r == n - 1:
+                break
+            k *= 2
+        self.rank = rank
+        # Kasai：lcp[x] 为 sa[x-1] 与 sa[x] 的最长公共前缀
+        lcp = [0] * n
+        h = 0
+        for i in range(n):
+            x = rank[i]
+            if x == 0:
+                h = 0
+                continue
+            j = sa[x - 1]
+            while i + h < n and j + h < n and s[i + h] == s[j + h]:
+                h += 1
+            lcp[x] = h
+            if h:
+                h -= 1
+        table = [lcp]
+        step = 1
+        while 2 * step <= n:
+            prev = table[-1]
+            table.append([a if a < b else b for a, b in zip(prev, prev[step:])])
+            step *= 2
+        self.table = table
+
+    def lcp(self, i: int, j: int) -> int:
+        """s[i:] 与 s[j:] 的最长公共前缀长度（i != j，均 < n）"""
+        a, b = self.rank[i], self.rank[j]
+        if a > b:
+            a, b = b, a
+        a += 1
+        level = (b - a + 1).bit_length() - 1
+        row = self.table[level]
+        x, y = row[a], row[b - (1 << level) + 1]
+        return x if x < y else y
+
+
+def _has_repeated_gram(s: str) -> bool:
+    """是否有某个 5-gram 在相距 ≥ 5 的两处出现（相邻重复片段存在的必要条件）"""
+    first: dict = {}
+    for k in range(len(s) - _DUP_MIN_LEN + 1):
+        p = first.setdefault(s[k:k + _DUP_MIN_LEN], k)
+        if k - p >= _DUP_MIN_LEN:
+            return True
+    return False
+
+
+def _find_repeat(s: str) -> Optional[Tuple[int, int]]:
+    """
+    返回 (L, i)：使 s[i:i+L].strip() == s[i+L:i+2L].strip() 且核心长度 ≥ 5 的最大 L，及该 L 下最左的 i；
+    不存在时返回 None。结果与逐长度、逐位置切片比较的朴素做法完全一致。
+
+    两段 strip 后的核心 X（长度 m，首尾非空白）在 s 中精确重复出现于 p1 与 p2 = p1 + d，
+    两次出现之间（长度 g = d - m）全是空白，且 g 恰为 p2 之前的最长空白串。
+    反过来，给定 (p1, d)，前一段可向左吞入 w1 个空白、在中间空白处切分（前段尾部 t1 个），
+    后一段尾部取 w3 = w1 + 2*t1 - g 个空白，得到 L = m + w1 + t1、i = p1 - w1。
+    因为 |L - d| 不超过最长空白串 S，按 d 从大到小枚举，d + S 小于已知最优 L 时即可停止。
+
+    对每个 d，长度 ≥ max(d - S, 1) 的精确重复必然覆盖间隔为该长度的某个锚点；
+    由锚点处的前后 LCE 得到 s[x] == s[x+d] 的极大区间，全部锚点数为 O(n log n)。
+    """
+    n = len(s)
+    if n < 2 * _DUP_MIN_LEN or not _has_repeated_gram(s):
+        return None
+    # lead[k]：从 k 起的连续空白数；trail[k]：以 k 结尾的连续空白数
+    lead = [0] * (n + 1)
+    for k in range(n - 1, -1, -1):
+        if s[k].isspace():
+            lead[k] = lead[k + 1] + 1
+    trail = [0] * n
+    run = 0
+    for k, ch in enumerate(s):
+        run = run + 1 if ch.isspace() else 0
+        trail[k] = run
+    slack = max(lead)
+    fwd = _LCE(s)
+    bwd = _LCE(s[::-1])
+
+    best_len, best_i = 0, n
+    for d in range(min(n // 2 + slack, n - 1), _DUP_MIN_LEN - 1, -1):
+        if best_len and d + slack < best_len:
+            break
+        step = max(d - slack, 1)
+        min_span = max(d - slack, _DUP_MIN_LEN)
+        covered = 0
+        for q in range(0, n - d, step):
+            if q < covered or s[q] != s[q + d]:
+                continue
+            f = fwd.lcp(q, q + d)
+            b = bwd.lcp(n - q, n - q - d) if q > 0 else 0
+            lo, hi = q - b, q + f
+            covered = hi
+            if hi - lo < min_span:
+                continue
+            for p1 in range(lo, min(hi - _DUP_MIN_LEN, hi - d + slack) + 1):
+                if lead[p1]:
+                    continue
+                g = trail[p1 + d - 1]
+                m = d - g
+                if m < _DUP_MIN_LEN or p1 + m > hi:
+                    continue
+                w_max = trail[p1 - 1] if p1 else 0
+                t_max = lead[p1 + d + m]
+                # 在 0 ≤ w1 ≤ w_max、0 ≤ t1 ≤ g、0 ≤ w1 + 2*t1 - g ≤ t_max 下最大化 w1 + t1（同值取最大 w1）
+                gain, w_best = -1, 0
+                for t1 in range(g + 1):
+                    w1 = min(w_max, t_max + g - 2 * t1)
+                    if w1 < max(0, g - 2 * t1):
+                        continue
+                    if w1 + t1 > gain or (w1 + t1 == gain and w1 > w_best):
+                        gain, w_best = w1 + t1, w1
+                if gain < 0:
+                    continue
+                length, i = m + gain, p1 - w_best
+                if length > best_len or (length == best_len and i < best_i):
+                    best_len, best_i = length, i
+    return (best_len, best_i) if best_len else None
+
+
+def remove_text_duplicates(s: str) -> str:
+    """移除相邻重复片段（strip 后相同、长度 ≥ 5），从最长的开始，最多 10 轮"""
+    for _ in range(_DUP_MAX_ROUNDS):
+        hit = _find_repeat(s)
+        if hit is None:
+            break
+        length, i = hit
+        s = s[:i + length] + s[i + 2 * length:]
+    return s
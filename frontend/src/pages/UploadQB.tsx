@@ -10,7 +10,7 @@ export default function UploadQBPage() {
   const [form] = Form.useForm()
   const [uploading, setUploading] = useState(false)
   const [progress, setProgress] = useState(0)
-  const [result, setResult] = useState<{ questions: number } | null>(null)
+  const [result, setResult] = useState<{ questions: number; skippedExisting: number; skippedDuplicates: number } | null>(null)
 
   const props = {
     name: 'file',
@@ -38,7 +38,11 @@ export default function UploadQBPage() {
         setProgress(10)
         const res = await ingestQBank(file as File, values.tags, values.defaultDifficulty)
         setProgress(90)
-        setResult({ questions: res.questions })
+        setResult({
+          questions: res.questions,
+          skippedExisting: res.skipped_existing ?? 0,
+          skippedDuplicates: res.skipped_duplicates ?? 0,
+        })
         setProgress(100)
         onSuccess(res)
       } catch (e: any) {
@@ -80,7 +84,7 @@ export default function UploadQBPage() {
         </Dragger>
         {uploading && <div className="mt-4"><Progress percent={progress} /></div>}
         {result && (
-          <Alert className="mt-4" type="success" showIcon message={`上传成功：本次题目 ${result.questions} 条`} />
+          <Alert className="mt-4" type="success" showIcon message={`上传成功：新增题目 ${result.questions} 条，已存在 ${result.skippedExisting} 条，近重复跳过 ${result.skippedDuplicates} 条`} />
         )}
       </Card>
     </div>